@@ -46,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'revenue.middleware.RequestMetricsMiddleware',  # First, so its timings cover the whole stack
     'django.middleware.security.SecurityMiddleware',
+    'revenue.middleware.CompressionMiddleware',  # brotli/gzip; before anything that reads the body
     'corsheaders.middleware.CorsMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,6 +130,78 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded images are stored by content hash and thumbnailed in the
+# background (see revenue/images.py)
+IMAGE_PIPELINE = {
+    'MAX_UPLOAD_BYTES': 5 * 1024 * 1024,
+    'QUALITY': 80,  # WebP and JPEG thumbnail quality
+    'MAX_ATTEMPTS': 3,
+    'THREADS': 2,  # In-process render threads; 0 leaves everything to `manage.py process_images`
+}
+
+
+# Caches
+# The 'leaderboard' cache is shared by all worker processes and holds
+# pre-rendered public API responses (see revenue/cache.py)
+import tempfile
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'leaderboard': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'trustmrr_response_cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+RESPONSE_CACHE = {
+    'ALIAS': 'leaderboard',
+    'LOCAL_TTL': 60,  # Seconds an entry stays in the per-process tier
+    'LOCAL_MAX_ENTRIES': 512,
+    'VERSION_TTL': 1,  # Seconds a process may serve a version another process replaced
+}
+
+# Browser/CDN caching of the public read endpoints (see revenue/conditional.py)
+HTTP_CACHING = {
+    'MAX_AGE': 10,  # Seconds a browser reuses a response without revalidating
+    'S_MAXAGE': 30,  # Seconds a CDN does
+    'STALE_WHILE_REVALIDATE': 60,  # Seconds a stale response may be served while it is revalidated
+    'BROTLI_QUALITY': 5,
+}
+
+# Per-view request counts and timings, served at /api/revenue/metrics/ (see revenue/metrics.py)
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', '0.05')),  # Share of requests timed in detail
+    'QUERY_BUDGET': 15,  # SQL statements per request before it is logged as over budget
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),  # Bearer token for scrapers; staff users need none
+}
+
+
+# Ad counters
+AD_COUNTERS = {
+    # Per-process append logs of not-yet-flushed ad impressions/clicks (see
+    # revenue/ad_counters.py); put this on persistent disk in production
+    'LOG_DIR': os.path.join(tempfile.gettempdir(), 'trustmrr_ad_counters'),
+    'FLUSH_INTERVAL': 5,  # Seconds
+    'FLUSH_SIZE': 1000,  # Tracking events
+}
+
+
+# Revenue providers
+# Set REVENUE_PROVIDER_STUB to the address of `manage.py run_stub_providers`
+# to send all Stripe/Razorpay/PayPal calls to the local stubs instead
+REVENUE_PROVIDER_STUB = os.getenv('REVENUE_PROVIDER_STUB')
+if REVENUE_PROVIDER_STUB:
+    REVENUE_PROVIDER_API_BASES = {
+        'stripe': f'{REVENUE_PROVIDER_STUB}/stripe',
+        'razorpay': f'{REVENUE_PROVIDER_STUB}/razorpay',
+        'paypal': f'{REVENUE_PROVIDER_STUB}/paypal',
+    }
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -171,3 +245,13 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # EMAIL_HOST_PASSWORD = 'your-app-password'  # Use app password, not regular password
 
 DEFAULT_FROM_EMAIL = 'noreply@trustmrr.com'
+
+# Emails are queued in the EmailOutbox table and sent by
+# `manage.py send_notifications` (see revenue/outbox.py)
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 100,  # Emails sent per SMTP connection
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 60,  # Seconds before the first retry, doubled after each failure
+    'LEASE': 300,  # Seconds a worker may hold claimed emails before others retry them
+    'EXPIRY_REMINDER_DAYS': 2,
+}
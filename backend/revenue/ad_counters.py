@@ -0,0 +1,321 @@
+# Buffered ad impression/click counters
+#
+# Tracking requests only append a line to a per-process log and bump an
+# in-memory delta per ad and hour; the deltas reach the database in batched
+# `F('impressions') + n` UPDATEs (one per distinct delta, not one per ad or per
+# request) once FLUSH_SIZE events have piled up or FLUSH_INTERVAL seconds have
+# passed. The same flush adds them to the hourly and daily stats tables
+# (AdStatHourly/AdStatDaily) with INSERT ... ON CONFLICT DO UPDATE, which
+# creates or increments each row in one statement (SQLite and PostgreSQL
+# both have it). Increments can't be lost to read-modify-write races, or to
+# another process creating the same stats row first.
+#
+# Crash safety: every event is written to the log before it is counted, and a
+# log segment is only deleted once its deltas are committed. Its writer holds
+# an exclusive flock() on it until then, which the kernel releases when the
+# process dies, so a segment nobody holds is an orphan: the next process to
+# start (or `manage.py flush_ad_counters`) locks, replays and deletes it. No
+# pids are compared, so recycled pids (common in containers) don't matter,
+# and segment names carry a random per-process token so a new process never
+# appends to an orphan. Replay is at-least-once: a crash between the commit
+# and the delete counts that segment twice.
+
+import atexit
+import fcntl
+import glob
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import AdStatDaily, AdStatHourly, Advertisement
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'AD_COUNTERS', {})
+LOG_DIR = _config.get('LOG_DIR', os.path.join(tempfile.gettempdir(), 'ad_counters'))
+FLUSH_INTERVAL = _config.get('FLUSH_INTERVAL', 5)  # Seconds
+FLUSH_SIZE = _config.get('FLUSH_SIZE', 1000)  # Tracking events
+BACKGROUND_FLUSH = _config.get('BACKGROUND_FLUSH', True)  # Flush idle buffers from a timer thread
+
+IMPRESSION = 'i'
+CLICK = 'c'
+UPDATE_BATCH_SIZE = 500
+
+
+def _chunks(items, size=UPDATE_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _changes(impressions, clicks):
+    changes = {}
+    if impressions:
+        changes['impressions'] = F('impressions') + impressions
+    if clicks:
+        changes['clicks'] = F('clicks') + clicks
+    return changes
+
+
+def _increment_stats(model, field, deltas, owners):
+    """
+    Add {(ad_id, bucket): [impressions, clicks]} to a stats table: one upsert
+    per batch of rows, inserting the rows that don't exist yet and
+    incrementing the ones that do
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    bucket_field = model._meta.get_field(field)
+    columns = ['ad_id', 'owner_id', bucket_field.column, 'impressions', 'clicks']
+    rows = [
+        (ad_id, owners[ad_id], bucket_field.get_db_prep_value(bucket, connection), impressions, clicks)
+        for (ad_id, bucket), (impressions, clicks) in deltas.items()
+        if impressions or clicks
+    ]
+    batch_size = min(UPDATE_BATCH_SIZE, connection.ops.bulk_batch_size(columns, rows) or UPDATE_BATCH_SIZE)
+    statements = 0
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows, batch_size):
+            placeholders = ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) VALUES {placeholders} "
+                f"ON CONFLICT ({quote('ad_id')}, {quote(bucket_field.column)}) DO UPDATE SET "
+                f"{quote('impressions')} = {table}.{quote('impressions')} + excluded.{quote('impressions')}, "
+                f"{quote('clicks')} = {table}.{quote('clicks')} + excluded.{quote('clicks')}",
+                [value for row in chunk for value in row],
+            )
+            statements += 1
+    return statements
+
+
+def apply_deltas(deltas):
+    """
+    Add {(ad_id, hour): [impressions, clicks]} (hour as a UTC epoch second) to
+    the lifetime counters and the hourly and daily stats. Ads that share the
+    same delta (e.g. every ad on a page view) are updated by a single
+    statement. Returns the number of statements run.
+    """
+    owners = dict(
+        Advertisement.objects.filter(id__in={ad_id for ad_id, _ in deltas}).values_list('id', 'owner_id')
+    )
+    totals = defaultdict(lambda: [0, 0])
+    hourly = defaultdict(lambda: [0, 0])
+    daily = defaultdict(lambda: [0, 0])
+    for (ad_id, hour), (impressions, clicks) in deltas.items():
+        if ad_id not in owners:
+            continue  # Unknown or deleted ad
+        start = datetime.fromtimestamp(hour, timezone.utc)
+        for target, key in ((totals, ad_id), (hourly, (ad_id, start)), (daily, (ad_id, start.date()))):
+            target[key][0] += impressions
+            target[key][1] += clicks
+
+    groups = defaultdict(list)
+    for ad_id, (impressions, clicks) in totals.items():
+        if impressions or clicks:
+            groups[(impressions, clicks)].append(ad_id)
+    statements = 1
+    with transaction.atomic():
+        for (impressions, clicks), ad_ids in groups.items():
+            for chunk in _chunks(ad_ids):
+                Advertisement.objects.filter(id__in=chunk).update(**_changes(impressions, clicks))
+                statements += 1
+        statements += _increment_stats(AdStatHourly, 'hour', hourly, owners)
+        statements += _increment_stats(AdStatDaily, 'day', daily, owners)
+    return statements
+
+
+def read_segment(path):
+    """Deltas recorded in a log segment; a torn last line (from a crash) is ignored"""
+    deltas = defaultdict(lambda: [0, 0])
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Torn write
+            try:
+                kind, timestamp, ids = line.decode().split()
+                hour = int(timestamp) // 3600 * 3600
+                index = 0 if kind == IMPRESSION else 1
+                for ad_id in ids.split(','):
+                    deltas[(int(ad_id), hour)][index] += 1
+            except ValueError:
+                continue
+    return deltas
+
+
+def _lock_segment(path):
+    """
+    Open `path` and take its exclusive lock; None if another process (its
+    writer, or another replayer) holds it, or it is already gone
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    if os.fstat(fd).st_nlink == 0:
+        # Deleted between our open and our lock: its deltas are committed
+        os.close(fd)
+        return None
+    return fd
+
+
+def replay_segment(path):
+    """Apply and delete a segment nobody holds. False if it is locked or gone."""
+    fd = _lock_segment(path)
+    if fd is None:
+        return False
+    try:
+        apply_deltas(read_segment(path))
+        os.unlink(path)
+    finally:
+        os.close(fd)
+    return True
+
+
+def replay_orphans(log_dir=LOG_DIR):
+    """Replay the segments no live process holds. Returns how many were replayed."""
+    return sum(replay_segment(path) for path in sorted(glob.glob(os.path.join(log_dir, 'ads-*.log'))))
+
+
+class AdCounterBuffer:
+    def __init__(self, log_dir=LOG_DIR, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.lock = threading.Lock()  # Guards the deltas and the open segment
+        self.flush_lock = threading.Lock()  # One flush at a time
+        self.deltas = defaultdict(lambda: [0, 0])
+        self.events = 0
+        self.last_flush = time.monotonic()
+        self.segment = None
+        self.fd = None
+        self.token = secrets.token_hex(4)
+        self.sequence = 0
+        self.failed = []  # (segment, locked fd) of failed flushes, retried on the next flush
+        os.makedirs(log_dir, exist_ok=True)
+
+    def _open_segment(self):
+        self.sequence += 1
+        name = f'ads-{os.getpid()}-{self.token}-{self.sequence}.log'
+        # Locked under a name replay_orphans() doesn't look at, then moved
+        # into place: the lock follows the file, so it's never seen unlocked
+        pending = os.path.join(self.log_dir, f'new-{name}')
+        self.fd = os.open(pending, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        self.segment = os.path.join(self.log_dir, name)
+        os.rename(pending, self.segment)
+
+    def record(self, kind, ad_ids):
+        if not ad_ids:
+            return
+        index = 0 if kind == IMPRESSION else 1
+        now = int(time.time())
+        hour = now // 3600 * 3600
+        line = f"{kind} {now} {','.join(str(ad_id) for ad_id in ad_ids)}\n".encode()
+        with self.lock:
+            if self.fd is None:
+                self._open_segment()
+            os.write(self.fd, line)  # A single O_APPEND write is never interleaved
+            for ad_id in ad_ids:
+                self.deltas[(ad_id, hour)][index] += 1
+            self.events += 1
+            due = self.events >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def pending(self, ad_id):
+        """(impressions, clicks) recorded for an ad but not flushed yet"""
+        with self.lock:
+            counts = [delta for (pending_id, _), delta in self.deltas.items() if pending_id == ad_id]
+        return sum(delta[0] for delta in counts), sum(delta[1] for delta in counts)
+
+    def flush(self):
+        """Write the buffered deltas to the database. Returns the number of UPDATEs run."""
+        with self.flush_lock:
+            with self.lock:
+                self.last_flush = time.monotonic()
+                deltas, self.deltas = self.deltas, defaultdict(lambda: [0, 0])
+                segment, fd = self.segment, self.fd
+                self.events, self.segment, self.fd = 0, None, None
+            statements = 0
+            if deltas:
+                try:
+                    statements = apply_deltas(deltas)
+                except Exception:
+                    # The segment stays on disk, still locked, for a later flush
+                    logger.exception("Ad counter flush failed; %s kept for replay", segment)
+                    self.failed.append((segment, fd))
+                    return 0
+            if segment:
+                os.unlink(segment)  # Before the lock goes, so nobody replays it
+                os.close(fd)
+            while self.failed:
+                segment, fd = self.failed[0]
+                try:
+                    apply_deltas(read_segment(segment))
+                except Exception:
+                    logger.exception("Replaying %s failed", segment)
+                    break
+                os.unlink(segment)
+                os.close(fd)
+                self.failed.pop(0)
+            return statements
+
+    def flush_if_idle(self):
+        """Flush deltas that have waited longer than the interval (for the timer thread)"""
+        with self.lock:
+            due = self.events and time.monotonic() - self.last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _flush_periodically(buffer):
+    while True:
+        time.sleep(buffer.flush_interval)
+        try:
+            buffer.flush_if_idle()
+        except Exception:
+            logger.exception("Periodic ad counter flush failed")
+        finally:
+            connection.close()  # This thread's own connection; don't hold it while sleeping
+
+
+def get_buffer():
+    """This process's buffer, created on first use (which also replays orphaned segments)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            buffer = AdCounterBuffer()
+            try:
+                replay_orphans(buffer.log_dir)
+            except Exception:
+                logger.exception("Replaying orphaned ad counter segments failed")
+            atexit.register(buffer.flush)
+            if BACKGROUND_FLUSH:
+                threading.Thread(target=_flush_periodically, args=(buffer,), daemon=True).start()
+            _buffer = buffer
+        return _buffer
+
+
+def record_impressions(ad_ids):
+    get_buffer().record(IMPRESSION, ad_ids)
+
+
+def record_click(ad_id):
+    get_buffer().record(CLICK, [ad_id])
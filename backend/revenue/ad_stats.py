@@ -0,0 +1,82 @@
+# Ad performance time series from the hourly/daily stats tables
+#
+# The tables are filled by the ad counter flush (see ad_counters.py). Every
+# series here is a single aggregate query over either (ad, bucket) or
+# (owner, bucket), both of which are indexed.
+
+from datetime import datetime, time, timedelta, timezone
+
+from django.db.models import Sum
+
+from .models import AdStatDaily, AdStatHourly
+
+GRANULARITIES = ('hour', 'day')
+STEP = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+DEFAULT_SPAN = {'hour': timedelta(hours=48), 'day': timedelta(days=30)}
+MAX_SPAN = {'hour': timedelta(days=31), 'day': timedelta(days=3 * 366)}
+
+
+def ctr(impressions, clicks):
+    """Click-through rate in percent"""
+    return round(clicks / impressions * 100, 2) if impressions else 0
+
+
+def _buckets(granularity, start, end):
+    current = start
+    while current <= end:
+        yield current
+        current += STEP[granularity]
+
+
+def _point(period, counts):
+    impressions, clicks = counts
+    return {'period': period.isoformat(), 'impressions': impressions, 'clicks': clicks, 'ctr': ctr(impressions, clicks)}
+
+
+def default_range(granularity, now=None):
+    """The last DEFAULT_SPAN worth of buckets, ending with the current one"""
+    now = now or datetime.now(timezone.utc)
+    end = now.replace(minute=0, second=0, microsecond=0) if granularity == 'hour' else now.date()
+    return end - DEFAULT_SPAN[granularity] + STEP[granularity], end
+
+
+def day_range(granularity, start_day, end_day):
+    """Bucket range covering whole days from start_day to end_day"""
+    if granularity == 'day':
+        return start_day, end_day
+    return (
+        datetime.combine(start_day, time.min, tzinfo=timezone.utc),
+        datetime.combine(end_day, time(23), tzinfo=timezone.utc),
+    )
+
+
+def series(granularity, start, end, ad=None, owner=None):
+    """
+    Impressions, clicks and CTR per bucket from `start` to `end` (inclusive),
+    for one ad or summed over an owner's ads. Buckets without traffic are
+    included as zeros.
+    """
+    model, field = (AdStatHourly, 'hour') if granularity == 'hour' else (AdStatDaily, 'day')
+    rows = model.objects.filter(**{f'{field}__range': (start, end)})
+    rows = rows.filter(ad=ad) if ad is not None else rows.filter(owner=owner)
+    totals = {
+        row[field]: (row['impressions'], row['clicks'])
+        for row in rows.values(field).annotate(impressions=Sum('impressions'), clicks=Sum('clicks')).order_by(field)
+    }
+    return [_point(bucket, totals.get(bucket, (0, 0))) for bucket in _buckets(granularity, start, end)]
+
+
+def daily_trends(owner, days=14, today=None):
+    """{ad_id: [clicks/impressions/ctr per day for the last `days` days]} for all of an owner's ads"""
+    today = today or datetime.now(timezone.utc).date()
+    start = today - timedelta(days=days - 1)
+    rows = AdStatDaily.objects.filter(owner=owner, day__range=(start, today))
+    totals = {
+        (ad_id, day): (impressions, clicks)
+        for ad_id, day, impressions, clicks in rows.values_list('ad_id', 'day', 'impressions', 'clicks')
+    }
+    ad_ids = {ad_id for ad_id, _ in totals}
+    return {
+        ad_id: [_point(day, totals.get((ad_id, day), (0, 0))) for day in _buckets('day', start, today)]
+        for ad_id in ad_ids
+    }
@@ -4,10 +4,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import models
+from . import ad_counters, ad_stats, availability
+from .conditional import public_json_response
 from .models import Advertisement
 from .serializers import AdvertisementSerializer
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
+
+MAX_TRACKED_ADS = 50  # Far more than a page ever shows
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -15,7 +18,7 @@ def my_ads(request):
     """
     Get all ads for the logged-in user with analytics
     """
-    ads = Advertisement.objects.filter(owner=request.user).order_by('-created_at')
+    ads = Advertisement.objects.filter(owner=request.user).select_related('image_asset').order_by('-created_at')
     
     # Categorize ads
     active_ads = []
@@ -23,12 +26,14 @@ def my_ads(request):
     expired_ads = []
     
     today = date.today()
+    trends = ad_stats.daily_trends(request.user)
     
     for ad in ads:
         ad_data = AdvertisementSerializer(ad).data
         ad_data['is_live'] = ad.is_live
         ad_data['days_remaining'] = ad.days_remaining
         ad_data['ctr'] = round(ad.ctr, 2)
+        ad_data['trend'] = trends.get(ad.id, [])  # Last 14 days
         
         if ad.is_live:
             active_ads.append(ad_data)
@@ -45,20 +50,66 @@ def my_ads(request):
         'total_spent': sum(ad.amount_paid for ad in ads),
         'total_clicks': sum(ad.clicks for ad in ads),
         'total_impressions': sum(ad.impressions for ad in ads),
+        'daily': ad_stats.series('day', *ad_stats.default_range('day'), owner=request.user),
     })
 
+def _stats_range(request):
+    """(granularity, start, end) from ?granularity=hour|day&from=YYYY-MM-DD&to=YYYY-MM-DD, or an error Response"""
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in ad_stats.GRANULARITIES:
+        return Response({'error': 'granularity must be hour or day'}, status=400)
+    if not request.GET.get('from') and not request.GET.get('to'):
+        return (granularity, *ad_stats.default_range(granularity))
+    try:
+        end_day = date.fromisoformat(request.GET['to']) if request.GET.get('to') else date.today()
+        start_day = date.fromisoformat(request.GET['from']) if request.GET.get('from') else end_day
+    except ValueError:
+        return Response({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    start, end = ad_stats.day_range(granularity, start_day, end_day)
+    if end < start or end - start > ad_stats.MAX_SPAN[granularity]:
+        return Response({'error': f'Range must be positive and at most {ad_stats.MAX_SPAN[granularity].days} days'}, status=400)
+    return granularity, start, end
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def ad_analytics(request, ad_id):
+    """
+    Impressions, clicks and CTR over time for one of the user's ads
+    ?granularity=hour|day, optional ?from= and ?to= (YYYY-MM-DD)
+    """
+    if not Advertisement.objects.filter(id=ad_id, owner=request.user).exists():
+        return Response({'error': 'Ad not found'}, status=404)
+    parsed = _stats_range(request)
+    if isinstance(parsed, Response):
+        return parsed
+    granularity, start, end = parsed
+    return Response({'ad_id': ad_id, 'granularity': granularity, 'series': ad_stats.series(granularity, start, end, ad=ad_id)})
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def my_ads_analytics(request):
+    """
+    Impressions, clicks and CTR over time summed over all of the user's ads
+    ?granularity=hour|day, optional ?from= and ?to= (YYYY-MM-DD)
+    """
+    parsed = _stats_range(request)
+    if isinstance(parsed, Response):
+        return parsed
+    granularity, start, end = parsed
+    return Response({'granularity': granularity, 'series': ad_stats.series(granularity, start, end, owner=request.user)})
+
 @api_view(["POST"])
 def track_ad_click(request, ad_id):
     """
     Track a click on an advertisement
     """
     try:
-        ad = Advertisement.objects.get(id=ad_id)
-        ad.clicks += 1
-        ad.save(update_fields=['clicks'])
-        return Response({'success': True, 'total_clicks': ad.clicks})
+        clicks = Advertisement.objects.values_list('clicks', flat=True).get(id=ad_id)
     except Advertisement.DoesNotExist:
         return Response({'error': 'Ad not found'}, status=404)
+    # Counted in the buffer and written in batches, see ad_counters.py
+    ad_counters.record_click(ad_id)
+    return Response({'success': True, 'total_clicks': clicks + ad_counters.get_buffer().pending(ad_id)[1]})
 
 @api_view(["POST"])
 def track_ad_impression(request):
@@ -67,57 +118,31 @@ def track_ad_impression(request):
     Expects: {ad_ids: [1, 2, 3]}
     """
     ad_ids = request.data.get('ad_ids', [])
-    Advertisement.objects.filter(id__in=ad_ids).update(impressions=models.F('impressions') + 1)
+    if not isinstance(ad_ids, list) or len(ad_ids) > MAX_TRACKED_ADS:
+        return Response({'error': f'ad_ids must be a list of at most {MAX_TRACKED_ADS} ids'}, status=400)
+    try:
+        ad_ids = sorted({int(ad_id) for ad_id in ad_ids})
+    except (TypeError, ValueError):
+        return Response({'error': 'ad_ids must be integers'}, status=400)
+    # Unknown ids are dropped by the batched UPDATE when the buffer is flushed
+    ad_counters.record_impressions(ad_ids)
     return Response({'success': True, 'tracked': len(ad_ids)})
 
 @api_view(["GET"])
 def ad_availability_calendar(request):
     """
-    Get availability calendar for next 90 days for all slots
+    Get the availability calendar of all slots, from today for ?days= days (default 90)
     """
-    from collections import defaultdict
-    
+    try:
+        days = int(request.query_params.get('days', availability.DEFAULT_HORIZON))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= availability.MAX_HORIZON:
+        return Response({'error': f'days must be between 1 and {availability.MAX_HORIZON}'}, status=400)
     today = date.today()
-    end_date = today + timedelta(days=90)
-    
-    # Get all bookings in the range
-    bookings = Advertisement.objects.filter(
-        is_active=True,
-        end_date__gte=today,
-        start_date__lte=end_date
+    return public_json_response(
+        request, f"ad_calendar:{today.isoformat()}:{days}", lambda: availability.calendar(today, days), 'ads', as_of=today
     )
-    
-    # Build calendar
-    calendar = {}
-    all_slots = ['left_1', 'left_2', 'left_3', 'left_4', 'left_5',
-                 'right_1', 'right_2', 'right_3', 'right_4', 'right_5']
-    
-    for slot in all_slots:
-        slot_bookings = bookings.filter(slot_id=slot)
-        booked_dates = []
-        
-        for booking in slot_bookings:
-            current = booking.start_date
-            while current <= booking.end_date:
-                booked_dates.append(current.isoformat())
-                current += timedelta(days=1)
-        
-        # Find next available date
-        next_available = None
-        check_date = today
-        while check_date < end_date:
-            if check_date.isoformat() not in booked_dates:
-                next_available = check_date.isoformat()
-                break
-            check_date += timedelta(days=1)
-        
-        calendar[slot] = {
-            'booked_dates': booked_dates,
-            'next_available': next_available,
-            'availability_percent': ((90 - len(set(booked_dates))) / 90) * 100
-        }
-    
-    return Response(calendar)
 
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
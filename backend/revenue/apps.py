@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class RevenueConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'revenue'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import restore_index
+
+        # SQLite migrations that rebuild revenue_company drop the search triggers
+        post_migrate.connect(restore_index, sender=self)
@@ -0,0 +1,113 @@
+# Ad slot availability
+#
+# All active bookings that overlap a window are loaded with one query and kept
+# per slot as sorted, merged, non-overlapping day intervals. Each interval is
+# half-open [start, end) in date ordinals, and a running total of booked days
+# sits alongside it, so "is this day free", "next free day" and "booked days
+# in a range" are all a bisect plus a little arithmetic, whatever the number
+# of bookings or the horizon.
+
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from .models import Advertisement
+
+SLOT_IDS = [slot for slot, _ in Advertisement.SLOT_CHOICES]
+DEFAULT_HORIZON = 90  # Days
+MAX_HORIZON = 730
+
+
+class SlotIntervals:
+    def __init__(self, ranges=()):
+        """`ranges` are inclusive (start_date, end_date) pairs in any order, possibly overlapping"""
+        merged = []
+        for start, end in sorted((start.toordinal(), end.toordinal() + 1) for start, end in ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+        self.cumulative = [0]  # Booked days in intervals[:i]
+        for start, end in merged:
+            self.cumulative.append(self.cumulative[-1] + end - start)
+
+    def _containing(self, ordinal):
+        """Index of the interval containing `ordinal`, or None"""
+        i = bisect_right(self.starts, ordinal) - 1
+        return i if i >= 0 and ordinal < self.ends[i] else None
+
+    def is_free(self, day):
+        return self._containing(day.toordinal()) is None
+
+    def next_available(self, day, until=None):
+        """First free day on or after `day` (and before `until`, if given)"""
+        i = self._containing(day.toordinal())
+        # Merged intervals never touch, so the day an interval ends is free
+        free = day if i is None else date.fromordinal(self.ends[i])
+        return free if until is None or free < until else None
+
+    def _booked_before(self, ordinal):
+        """Booked days strictly before `ordinal`"""
+        i = bisect_right(self.starts, ordinal) - 1
+        if i < 0:
+            return 0
+        return self.cumulative[i] + min(ordinal, self.ends[i]) - self.starts[i]
+
+    def booked_days(self, start, end):
+        """Booked days in [start, end)"""
+        return self._booked_before(end.toordinal()) - self._booked_before(start.toordinal())
+
+    def booked_ranges(self, start, end):
+        """Booked (first, last) inclusive date pairs clipped to [start, end)"""
+        lo, hi = start.toordinal(), end.toordinal()
+        first = bisect_right(self.ends, lo)  # First interval ending after `start`
+        ranges = []
+        for i in range(first, len(self.starts)):
+            if self.starts[i] >= hi:
+                break
+            ranges.append((date.fromordinal(max(self.starts[i], lo)), date.fromordinal(min(self.ends[i], hi) - 1)))
+        return ranges
+
+    def free_ranges(self, start, end):
+        """Free (first, last) inclusive date pairs within [start, end)"""
+        free = []
+        cursor = start
+        for first, last in self.booked_ranges(start, end):
+            if first > cursor:
+                free.append((cursor, first - timedelta(days=1)))
+            cursor = last + timedelta(days=1)
+        if cursor < end:
+            free.append((cursor, end - timedelta(days=1)))
+        return free
+
+
+def load(start, end):
+    """{slot_id: SlotIntervals} of active bookings overlapping [start, end), in one query"""
+    ranges = {slot: [] for slot in SLOT_IDS}
+    bookings = Advertisement.objects.filter(is_active=True, start_date__lt=end, end_date__gte=start)
+    for slot, first, last in bookings.values_list('slot_id', 'start_date', 'end_date'):
+        ranges.setdefault(slot, []).append((first, last))
+    return {slot: SlotIntervals(slot_ranges) for slot, slot_ranges in ranges.items()}
+
+
+def calendar(start, days=DEFAULT_HORIZON):
+    """Availability of every slot over the `days` days from `start`"""
+    end = start + timedelta(days=days)
+    result = {}
+    for slot, intervals in load(start, end).items():
+        booked = intervals.booked_ranges(start, end)
+        next_free = intervals.next_available(start, end)
+        result[slot] = {
+            'booked_dates': [
+                (first + timedelta(days=offset)).isoformat()
+                for first, last in booked for offset in range((last - first).days + 1)
+            ],
+            'booked_ranges': [{'start': first.isoformat(), 'end': last.isoformat()} for first, last in booked],
+            'free_ranges': [
+                {'start': first.isoformat(), 'end': last.isoformat()} for first, last in intervals.free_ranges(start, end)
+            ],
+            'next_available': next_free.isoformat() if next_free else None,
+            'availability_percent': (days - intervals.booked_days(start, end)) / days * 100,
+        }
+    return result
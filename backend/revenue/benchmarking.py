@@ -0,0 +1,161 @@
+# Helpers shared by the bench_* management commands
+#
+# Benchmarks run against a throwaway test database (the same one `manage.py
+# test` would create), so they never touch real data and always start from
+# the same synthetic dataset.
+
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from . import projection
+from .models import Advertisement, Company
+
+CATEGORIES = [key for key, _ in Company.CATEGORY_CHOICES]
+COUNTRIES = ['IN', 'US', 'GB', 'DE', 'SG', 'BR', None]
+SLOTS = [slot for slot, _ in Advertisement.SLOT_CHOICES]
+
+
+@contextmanager
+def benchmark_database(on_disk=False):
+    """
+    Create a fresh test database for the duration of the block. SQLite test
+    databases live in memory unless `on_disk` is set, which benchmarks that
+    use several threads need: threads sharing an in-memory database fail on
+    each other's locks instead of waiting for them.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite' and not old_test_name:
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'trustmrr_benchmark.sqlite3')
+    try:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+def create_owners(count=50):
+    users = [User(username=f'bench_owner_{i}', email=f'owner{i}@example.com') for i in range(count)]
+    User.objects.bulk_create(users)
+    return list(User.objects.filter(username__startswith='bench_owner_'))
+
+
+def create_companies(count, owners=(), start=0, seed=0, batch_size=5000):
+    """
+    Bulk-insert `count` synthetic companies with realistic field coverage,
+    numbered from `start` so repeated calls don't collide
+    """
+    rnd = random.Random(seed)
+    now = timezone.now()
+    batch = []
+    for i in range(start, start + count):
+        verified = rnd.random() < 0.7
+        batch.append(Company(
+            name=f'Startup {i}',
+            slug=f'startup-{i}',
+            website=f'https://startup{i}.example.com',
+            founder_name=f'@founder{i}',
+            monthly_revenue=Decimal(rnd.randint(0, 5_000_000)) / 100,
+            mom_growth=Decimal(rnd.randint(-5000, 9999)) / 100,
+            logo=f'logos/startup-{i}.png' if rnd.random() < 0.5 else None,
+            category=rnd.choice(CATEGORIES),
+            is_verified=verified,
+            last_verified_at=now - timedelta(minutes=rnd.randint(0, 60 * 24 * 30)) if verified else None,
+            show_in_leaderboard=rnd.random() < 0.95,
+            is_anonymous=rnd.random() < 0.1,
+            added_by=rnd.choice(owners) if owners and rnd.random() < 0.9 else None,
+            description=f'Synthetic company number {i}',
+            twitter_handle=f'startup{i}',
+            tagline='Benchmark data',
+            country=rnd.choice(COUNTRIES),
+            follower_count=rnd.randint(0, 100_000),
+        ))
+        if batch[-1].is_anonymous:
+            batch[-1].slug = f'company-{i:06x}'  # Generic, as Company.save() would make it
+        if len(batch) >= batch_size:
+            _insert_companies(batch)
+            batch = []
+    if batch:
+        _insert_companies(batch)
+
+
+def _insert_companies(batch):
+    created = Company.objects.bulk_create(batch)
+    # bulk_create sends no signals
+    projection.refresh(Company.objects.filter(pk__in=[company.pk for company in created]))
+
+
+def create_ads(count, owners, companies=(), seed=0, batch_size=5000):
+    """
+    Bulk-insert `count` synthetic ads spread over every slot, running one to
+    four weeks and starting between 60 days ago and 120 days ahead, so the
+    slot views and the availability calendar see past, live and future
+    bookings (overlaps included)
+    """
+    rnd = random.Random(seed)
+    today = timezone.localdate()
+    batch = []
+    for i in range(count):
+        start = today + timedelta(days=rnd.randint(-60, 120))
+        batch.append(Advertisement(
+            owner=rnd.choice(owners),
+            company_id=rnd.choice(companies) if companies and rnd.random() < 0.5 else None,
+            title=f'Ad {i}',
+            description='Benchmark ad',
+            target_url=f'https://advertiser{i}.example.com',
+            slot_id=rnd.choice(SLOTS),
+            start_date=start,
+            end_date=start + timedelta(days=7 * rnd.randint(1, 4) - 1),
+            is_active=rnd.random() < 0.9,
+            amount_paid=Decimal(rnd.randint(1, 4) * 5000),
+            impressions=rnd.randint(0, 50_000),
+            clicks=rnd.randint(0, 500),
+        ))
+        if len(batch) >= batch_size:
+            Advertisement.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Advertisement.objects.bulk_create(batch)
+
+
+class QueryCounter:
+    """Counts every SQL statement run while installed (unlike connection.queries, not capped)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def timed(fn, repeat=1):
+    """Run fn `repeat` times; return (last result, list of durations in seconds)"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return result, durations
+
@@ -0,0 +1,67 @@
+# Ad slot booking
+#
+# "Is the slot free?" and "insert the ad" have to happen atomically, or two
+# simultaneous bookings of the same dates both pass the check. Each slot has
+# a lock row (AdSlotLock); a booking's transaction starts by UPDATEing that
+# row, which takes a row lock on PostgreSQL (and the database write lock on
+# SQLite) that is held until commit. Bookings of the same slot therefore run
+# one after another, while bookings of different slots don't wait for each
+# other. The lock is taken before anything is read so SQLite never has to
+# upgrade a read transaction into a write one, which fails instead of waiting.
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import AdSlotLock, Advertisement
+
+SLOT_IDS = {slot for slot, _ in Advertisement.SLOT_CHOICES}
+
+
+class BookingError(Exception):
+    pass
+
+
+class UnknownSlot(BookingError):
+    pass
+
+
+class SlotUnavailable(BookingError):
+    pass
+
+
+def lock_slot(slot_id):
+    """Lock a slot's row until the end of the current transaction"""
+    if not AdSlotLock.objects.filter(slot_id=slot_id).update(bookings=F('bookings') + 1):
+        # A slot added after the lock rows were created
+        AdSlotLock.objects.get_or_create(slot_id=slot_id)
+        AdSlotLock.objects.filter(slot_id=slot_id).update(bookings=F('bookings') + 1)
+
+
+def overlapping(slot_id, start_date, end_date):
+    return Advertisement.objects.filter(
+        slot_id=slot_id,
+        is_active=True,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+    )
+
+
+def book_ad(owner, slot_id, start_date, end_date, **fields):
+    """
+    Create an active ad in `slot_id` from `start_date` to `end_date`
+    (inclusive). Raises SlotUnavailable if an active ad overlaps those dates.
+    """
+    if slot_id not in SLOT_IDS:
+        raise UnknownSlot(f"Unknown ad slot: {slot_id}")
+    with transaction.atomic():
+        lock_slot(slot_id)
+        if overlapping(slot_id, start_date, end_date).exists():
+            raise SlotUnavailable("Slot already booked for these dates")
+        return Advertisement.objects.create(
+            owner=owner,
+            slot_id=slot_id,
+            start_date=start_date,
+            end_date=end_date,
+            is_active=True,
+            **fields,
+        )
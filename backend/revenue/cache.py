@@ -0,0 +1,167 @@
+# Versioned response cache for the public read endpoints
+#
+# Responses are stored as pre-rendered JSON bytes, so a hit skips both the ORM
+# query and DRF serialization. Every key embeds the current data version, which
+# is replaced whenever a Company or Advertisement is saved or deleted (see
+# signals.py); old entries are never read again and simply expire.
+#
+# Two tiers: a small per-process LRU in front of a shared Django cache backend
+# (file-based by default, see CACHES['leaderboard'] in settings), so gunicorn
+# workers share each other's work.
+#
+# Each entry also carries the validators for conditional GETs: an ETag hashed
+# from the body (so it changes exactly when the bytes do) and, optionally, a
+# Last-Modified timestamp (see conditional.py). Revalidating a cached response
+# therefore costs one cache lookup and no query.
+
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+# Entries are (body, etag, last_modified) tuples; the suffix changed when they
+# stopped being bare bytes, so old entries are never read
+VERSION_KEY = 'response-cache:version:2'
+
+_config = getattr(settings, 'RESPONSE_CACHE', {})
+CACHE_ALIAS = _config.get('ALIAS', 'default')
+LOCAL_TTL = _config.get('LOCAL_TTL', 60)  # Seconds an entry stays in the per-process tier
+LOCAL_MAX_ENTRIES = _config.get('LOCAL_MAX_ENTRIES', 512)
+VERSION_TTL = _config.get('VERSION_TTL', 1)  # Seconds a process trusts its copy of the version
+
+_lock = threading.Lock()
+_local = OrderedDict()  # key -> (expires_at, entry)
+_version = {'value': None, 'checked_at': 0.0}
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _shared():
+    return caches[CACHE_ALIAS]
+
+
+def current_version():
+    now = time.monotonic()
+    if _version['value'] is not None and now - _version['checked_at'] < VERSION_TTL:
+        return _version['value']
+    version = _shared().get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # Another process may have set it first; use whichever won
+        if not _shared().add(VERSION_KEY, version, timeout=None):
+            version = _shared().get(VERSION_KEY, version)
+    _version.update(value=version, checked_at=now)
+    return version
+
+
+def bump_version():
+    """
+    Invalidate every cached response. A fresh random token is used rather than
+    incrementing a counter, so concurrent bumps can never collapse into one.
+    """
+    version = uuid.uuid4().hex
+    _shared().set(VERSION_KEY, version, timeout=None)
+    _version.update(value=version, checked_at=time.monotonic())
+    with _lock:
+        _local.clear()
+
+
+def _local_get(key):
+    with _lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return entry[1]
+
+
+def _local_set(key, entry):
+    with _lock:
+        _local[key] = (time.monotonic() + LOCAL_TTL, entry)
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def get_entry(key, build, last_modified=None):
+    """
+    Return (entry, status) for `key`, where entry is a (body, etag,
+    last_modified) tuple of rendered JSON bytes, its strong ETag and an epoch
+    timestamp or None, and status is 'local', 'shared' or 'miss'. On a miss
+    build() is called and must return JSON-serializable data, or bytes that
+    are already rendered JSON; exceptions it raises are not cached.
+    last_modified(), if given, is called just before build().
+    """
+    versioned_key = f"{current_version()}:{key}"
+
+    entry = _local_get(versioned_key)
+    if entry is not None:
+        _count('local_hits')
+        return entry, 'local'
+
+    entry = _shared().get(versioned_key)
+    if entry is not None:
+        _count('shared_hits')
+        _local_set(versioned_key, entry)
+        return entry, 'shared'
+
+    _count('misses')
+    modified = last_modified() if last_modified else None
+    body = build()
+    if not isinstance(body, bytes):
+        body = JSONRenderer().render(body)
+    entry = (body, f'"{hashlib.sha1(body).hexdigest()[:20]}"', modified)
+    _shared().set(versioned_key, entry)
+    _local_set(versioned_key, entry)
+    return entry, 'miss'
+
+
+def get_or_build(key, build):
+    """(body, status) of get_entry()"""
+    entry, status = get_entry(key, build)
+    return entry[0], status
+
+
+def cached_json_response(key, build, request=None, last_modified=None):
+    """
+    HttpResponse for get_entry(), with its ETag (and Last-Modified) and an
+    X-Cache header saying where it came from. Given the request, a client
+    that already has this body gets a 304 instead.
+    """
+    (body, etag, modified), status = get_entry(key, build, last_modified)
+    response = None
+    if request is not None:
+        response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    response['X-Cache'] = status.upper()
+    return response
+
+
+def stats():
+    """Hit/miss counters of this process"""
+    lookups = sum(_stats.values())
+    hits = _stats['local_hits'] + _stats['shared_hits']
+    return {
+        **_stats,
+        'hit_ratio': round(hits / lookups, 4) if lookups else 0,
+        'local_entries': len(_local),
+    }
@@ -0,0 +1,134 @@
+# Per-category leaderboard statistics
+#
+# One CategoryStats row per category holds running totals over the companies
+# it shows in the leaderboard: how many, how many verified, their total MRR
+# and the sum of their mom_growth. Every save or delete of a company is
+# applied as a delta (its old contribution out, its new one in) with F()
+# updates, so concurrent changes can't lose each other's increments. A median
+# can't be kept as a running total; it is read from the materialized ranks
+# instead, which already order each category (LeaderboardRank.category_rank),
+# so it costs two index lookups. revenue.ranking refreshes the medians of the
+# categories whose ranks it changed. Writes that bypass signals (bulk_update,
+# queryset.update) call rebuild(), which recomputes everything exactly.
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import CategoryStats, Company, LeaderboardRank
+
+_TWO_PLACES = Decimal('0.01')
+
+
+def contribution(company):
+    """(category, monthly_revenue, mom_growth, is_verified) a company adds to the totals, or None"""
+    if not company.show_in_leaderboard:
+        return None
+    return (
+        company.category,
+        Decimal(str(company.monthly_revenue)),
+        Decimal(str(company.mom_growth)),
+        bool(company.is_verified),
+    )
+
+
+def stored_contribution(company_id):
+    """contribution() of the company as it is in the database"""
+    company = (
+        Company.objects.filter(pk=company_id)
+        .only('category', 'monthly_revenue', 'mom_growth', 'is_verified', 'show_in_leaderboard')
+        .first()
+    )
+    return contribution(company) if company else None
+
+
+def _median(category):
+    """Median MRR of the category's ranked companies (the middle category_rank or two)"""
+    ranks = LeaderboardRank.objects.filter(category=category)
+    count = ranks.order_by('-category_rank').values_list('category_rank', flat=True).first()
+    if not count:
+        return Decimal('0.00')
+    middle = list(
+        ranks.filter(category_rank__in={(count + 1) // 2, count // 2 + 1}).values_list('monthly_revenue', flat=True)
+    )
+    return (sum(middle) / len(middle)).quantize(_TWO_PLACES)
+
+
+def refresh_medians(categories=None):
+    """Recompute the median of `categories` (default: all) after their ranks changed"""
+    rows = CategoryStats.objects.all()
+    if categories is not None:
+        rows = rows.filter(category__in=categories)
+    for category in rows.values_list('category', flat=True):
+        CategoryStats.objects.filter(category=category).update(median_mrr=_median(category))
+
+
+def _add(entry, sign):
+    """Add (sign=1) or remove (sign=-1) a contribution. False if its category has no row."""
+    category, revenue, growth, verified = entry
+    return bool(CategoryStats.objects.filter(category=category).update(
+        companies=F('companies') + sign,
+        verified=F('verified') + (sign if verified else 0),
+        total_mrr=F('total_mrr') + sign * revenue,
+        growth_sum=F('growth_sum') + sign * growth,
+    ))
+
+
+@transaction.atomic
+def apply(old, new):
+    """
+    Replace a company's `old` contribution to the totals with `new` (either
+    may be None). Called once the change is in the database.
+    """
+    if old == new:
+        return
+    rebuilt = set()
+    for entry, sign in ((old, -1), (new, 1)):
+        if entry is None or entry[0] in rebuilt:
+            continue
+        if not _add(entry, sign):
+            # Category without a row yet (not in CATEGORY_CHOICES); counting it
+            # from the companies table already includes this change
+            rebuild([entry[0]])
+            rebuilt.add(entry[0])
+
+
+@transaction.atomic
+def rebuild(categories=None):
+    """
+    Recompute the stats of `categories` (default: every category) from the
+    companies table, and their medians from the current ranks. Returns the
+    number of categories written.
+    """
+    companies = Company.objects.filter(show_in_leaderboard=True)
+    if categories is None:
+        categories = {key for key, _ in Company.CATEGORY_CHOICES}
+        categories.update(companies.values_list('category', flat=True).distinct())
+    else:
+        companies = companies.filter(category__in=categories)
+    totals = {
+        row['category']: row
+        for row in companies.values('category').order_by().annotate(
+            count=Count('id'),
+            verified_count=Count('id', filter=Q(is_verified=True)),
+            revenue=Sum('monthly_revenue'),
+            growth=Sum('mom_growth'),
+        )
+    }
+    for category in categories:
+        row = totals.get(category, {})
+        CategoryStats.objects.update_or_create(category=category, defaults={
+            'companies': row.get('count', 0),
+            'verified': row.get('verified_count', 0),
+            'total_mrr': row.get('revenue') or 0,
+            'growth_sum': row.get('growth') or 0,
+            'median_mrr': _median(category),
+        })
+    return len(categories)
+
+
+def all_stats():
+    """CategoryStats of every category in CATEGORY_CHOICES order (zeros for missing rows), in one query"""
+    rows = {stats.category: stats for stats in CategoryStats.objects.all()}
+    return [rows.get(key) or CategoryStats(category=key) for key, _ in Company.CATEGORY_CHOICES]
@@ -0,0 +1,71 @@
+# HTTP caching for the public read endpoints
+#
+# Responses come from the response cache (cache.py) with a strong ETag hashed
+# from the body, plus a Last-Modified taken from the data behind them: the
+# latest `updated_at` of their scope (companies or ads). A delete leaves no
+# timestamp behind, so each scope's row count is remembered too and a drop in
+# it counts as a change. Cache-Control lets browsers and a CDN reuse responses
+# briefly and keep serving them while they revalidate in the background.
+
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+
+from . import cache
+from .models import Advertisement, Company
+
+_config = getattr(settings, 'HTTP_CACHING', {})
+MAX_AGE = _config.get('MAX_AGE', 10)  # Seconds a browser reuses a response without asking
+S_MAXAGE = _config.get('S_MAXAGE', 30)  # Same for shared caches (a CDN)
+STALE_WHILE_REVALIDATE = _config.get('STALE_WHILE_REVALIDATE', 60)
+
+SCOPES = {
+    'companies': Company,
+    'ads': Advertisement,
+}
+EPOCH = timezone.make_aware(datetime(2000, 1, 1))  # Last-Modified of an empty scope
+
+
+def data_version(scope):
+    """When the rows of `scope` last changed, as a datetime"""
+    figures = SCOPES[scope].objects.aggregate(last=Max('updated_at'), count=Count('id'))
+    last = figures['last'] or EPOCH
+    key = f'http-validators:{scope}'
+    shared = caches[cache.CACHE_ALIAS]
+    seen = shared.get(key)
+    if seen and seen['last'] == last and seen['count'] == figures['count']:
+        return seen['modified']
+    if seen and seen['last'] == last and figures['count'] < seen['count']:
+        modified = timezone.now()  # Rows were deleted since we last looked
+    else:
+        modified = last
+    shared.set(key, {'last': last, 'count': figures['count'], 'modified': modified}, timeout=None)
+    return modified
+
+
+def public_json_response(request, key, build, scope, as_of=None, public=True):
+    """
+    cached_json_response() answering conditional GETs, with Last-Modified
+    from `scope`'s data. `as_of` is the day a "today" response was built
+    for; its Last-Modified is never earlier than that day's midnight.
+    Responses only their owner can see pass public=False.
+    """
+    def last_modified():
+        modified = data_version(scope)
+        if as_of is not None:
+            modified = max(modified, timezone.make_aware(datetime.combine(as_of, time.min)))
+        return int(modified.timestamp())
+
+    response = cache.cached_json_response(key, build, request=request, last_modified=last_modified)
+    if public:
+        patch_cache_control(
+            response, public=True, max_age=MAX_AGE, s_maxage=S_MAXAGE,
+            stale_while_revalidate=STALE_WHILE_REVALIDATE,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,80 @@
+# Streaming exports of the public leaderboard and its MRR history
+#
+# Rows are read with .iterator(), so the database hands them over a chunk at
+# a time (a server-side cursor on PostgreSQL), and written out as CSV or JSON
+# Lines a chunk at a time: memory use is the same for ten companies or a
+# million. Only companies shown in the leaderboard are exported, from their
+# public records (see projection.py), so anonymous ones stay masked.
+
+import csv
+import io
+import json
+
+from .models import Company, RevenueRollup
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+
+COMPANY_COLUMNS = [
+    'rank', 'id', 'slug', 'name', 'founder_name', 'website', 'twitter_handle', 'category', 'country',
+    'monthly_revenue', 'mom_growth', 'is_verified', 'last_verified_at', 'is_anonymous', 'tagline',
+    'founding_date', 'follower_count',
+]
+HISTORY_COLUMNS = ['company_id', 'slug', 'period', 'mrr', 'mrr_min', 'mrr_max']
+
+
+def company_rows(category=None, chunk_size=CHUNK_SIZE):
+    """Public fields of every leaderboard company, highest MRR first"""
+    companies = Company.objects.filter(show_in_leaderboard=True)
+    if category and category != 'all':
+        companies = companies.filter(category=category)
+    rows = companies.order_by('-monthly_revenue', '-id').values_list('public_data', 'leaderboard_rank__overall_rank')
+    for data, rank in rows.iterator(chunk_size=chunk_size):
+        yield {'rank': rank, **data}
+
+
+def history_rows(granularity='month', category=None, chunk_size=CHUNK_SIZE):
+    """MRR rollups of every leaderboard company, by company and then period"""
+    rollups = RevenueRollup.objects.filter(granularity=granularity, company__show_in_leaderboard=True)
+    if category and category != 'all':
+        rollups = rollups.filter(company__category=category)
+    rows = rollups.order_by('company_id', 'period_start').values_list(
+        'company_id', 'company__slug', 'period_start', 'mrr', 'mrr_min', 'mrr_max',
+    )
+    for company_id, slug, period, mrr, mrr_min, mrr_max in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'company_id': company_id,
+            'slug': slug,
+            'period': period.isoformat(),
+            'mrr': str(mrr),
+            'mrr_min': str(mrr_min),
+            'mrr_max': str(mrr_max),
+        }
+
+
+def stream(rows, columns, fmt, chunk_size=CHUNK_SIZE):
+    """Yield `rows` encoded as CSV (with a header) or JSON Lines, one string per `chunk_size` rows"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False))
+            buffer.write('\n')
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,170 @@
+# Revenue history: append-only snapshots plus day/week/month rollups
+#
+# record_revenue() appends a RevenueSnapshot and folds it into the three
+# RevenueRollup rows covering its timestamp, so charts never aggregate raw
+# snapshots: a multi-year history is one range scan over
+# (company, granularity, period_start). Only verified snapshots are rolled up:
+# self-reported figures stay in the snapshot log, but never reach the charts,
+# the exports or the month-over-month growth, which all read the rollups.
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RevenueRollup, RevenueSnapshot
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Company.mom_growth is a DecimalField(max_digits=5, decimal_places=2)
+MAX_GROWTH = Decimal('999.99')
+
+
+def period_start(moment, granularity):
+    """First day of the (UTC) day, week or month containing a datetime or date"""
+    day = moment.astimezone(dt_timezone.utc).date() if isinstance(moment, datetime) else moment
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _fold(rollup, snapshot):
+    rollup.mrr_min = min(rollup.mrr_min, snapshot.mrr)
+    rollup.mrr_max = max(rollup.mrr_max, snapshot.mrr)
+    rollup.samples += 1
+    # Snapshots can arrive out of order; the period's figure is the latest one
+    if snapshot.recorded_at >= rollup.last_recorded_at:
+        rollup.mrr = snapshot.mrr
+        rollup.last_recorded_at = snapshot.recorded_at
+
+
+def _apply(snapshots):
+    """Fold saved snapshots into their rollups with one read and at most two writes"""
+    snapshots = [snapshot for snapshot in snapshots if snapshot.is_verified]
+    if not snapshots:
+        return
+    keys = {
+        (snapshot.company_id, granularity, period_start(snapshot.recorded_at, granularity))
+        for snapshot in snapshots for granularity in GRANULARITIES
+    }
+    existing = {
+        (rollup.company_id, rollup.granularity, rollup.period_start): rollup
+        for rollup in RevenueRollup.objects.select_for_update().filter(
+            company_id__in={key[0] for key in keys},
+            period_start__in={key[2] for key in keys},
+        )
+    }
+    created = {}
+    changed = {}
+    for snapshot in snapshots:
+        for granularity in GRANULARITIES:
+            key = (snapshot.company_id, granularity, period_start(snapshot.recorded_at, granularity))
+            rollup = existing.get(key) or created.get(key)
+            if rollup is None:
+                created[key] = RevenueRollup(
+                    company_id=snapshot.company_id, granularity=granularity, period_start=key[2],
+                    mrr=snapshot.mrr, mrr_min=snapshot.mrr, mrr_max=snapshot.mrr,
+                    samples=1, last_recorded_at=snapshot.recorded_at,
+                )
+                continue
+            _fold(rollup, snapshot)
+            if key in existing:
+                changed[key] = rollup
+
+    RevenueRollup.objects.bulk_create(created.values())
+    RevenueRollup.objects.bulk_update(changed.values(), ['mrr', 'mrr_min', 'mrr_max', 'samples', 'last_recorded_at'])
+
+
+def record_revenue(company, mrr, source, added_by=None, verified=True, recorded_at=None):
+    """Append a snapshot of `company`'s MRR and update its rollups"""
+    return record_revenue_many([(company, mrr)], source, added_by, verified, recorded_at)[0]
+
+
+def record_revenue_many(entries, source, added_by=None, verified=True, recorded_at=None):
+    """
+    record_revenue() for many (company, mrr) pairs at once, as the batch
+    re-verification does. `source` may also be a callable taking the company.
+    """
+    recorded_at = recorded_at or timezone.now()
+    snapshots = [
+        RevenueSnapshot(
+            company_id=company.pk,
+            mrr=Decimal(str(mrr)).quantize(Decimal('0.01')),
+            source=source(company) if callable(source) else source,
+            is_verified=verified,
+            recorded_at=recorded_at,
+            added_by=added_by,
+        )
+        for company, mrr in entries
+    ]
+    with transaction.atomic():
+        RevenueSnapshot.objects.bulk_create(snapshots)
+        _apply(snapshots)
+    return snapshots
+
+
+def rebuild_rollups(company_ids=None):
+    """Recompute rollups from the snapshots, e.g. after snapshots were imported"""
+    snapshots = RevenueSnapshot.objects.filter(is_verified=True).order_by('recorded_at', 'id')
+    rollups = RevenueRollup.objects.all()
+    if company_ids is not None:
+        snapshots = snapshots.filter(company_id__in=company_ids)
+        rollups = rollups.filter(company_id__in=company_ids)
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for snapshot in snapshots.iterator(chunk_size=2000):
+            batch.append(snapshot)
+            if len(batch) >= 2000:
+                _apply(batch)
+                batch = []
+        if batch:
+            _apply(batch)
+
+
+def history(company, granularity='month', start=None, end=None):
+    """Rollups for `company` as (period_start, mrr, mrr_min, mrr_max) tuples, oldest first"""
+    rollups = RevenueRollup.objects.filter(company=company, granularity=granularity)
+    if start:
+        rollups = rollups.filter(period_start__gte=period_start(start, granularity))
+    if end:
+        rollups = rollups.filter(period_start__lte=end)
+    return rollups.order_by('period_start').values_list('period_start', 'mrr', 'mrr_min', 'mrr_max')
+
+
+def baselines(company_ids, today=None):
+    """
+    Each company's MRR 30 days ago, from the daily rollups: {company_id: mrr}.
+    The latest day on or before that mark counts, if it is no older than
+    another 30 days; companies without one are left out.
+    """
+    today = today or datetime.now(dt_timezone.utc).date()
+    mark = today - timedelta(days=30)
+    rows = (
+        RevenueRollup.objects
+        .filter(company_id__in=company_ids, granularity='day', period_start__range=(mark - timedelta(days=30), mark))
+        .order_by('period_start')
+        .values_list('company_id', 'mrr')
+    )
+    return dict(rows)  # Later days overwrite earlier ones
+
+
+def growth(mrr, baseline, fallback=0):
+    """
+    Month-over-month growth in percent against `baseline`. `fallback` (e.g.
+    the provider's own figure) is used while there is no month of history.
+    """
+    if baseline is None:
+        value = Decimal(str(fallback))
+    elif baseline > 0:
+        value = (Decimal(str(mrr)) - baseline) / baseline * 100
+    else:
+        value = Decimal(0)
+    return max(-MAX_GROWTH, min(MAX_GROWTH, value.quantize(Decimal('0.01'))))
+
+
+def month_over_month(company, mrr, fallback=0):
+    return growth(mrr, baselines([company.pk]).get(company.pk), fallback)
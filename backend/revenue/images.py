@@ -0,0 +1,223 @@
+# Image pipeline for logos, founder photos and ad images
+#
+# Uploads are stored once per distinct content: the file is named after its
+# SHA-256, so the same image uploaded twice (or shared by two companies) is
+# one file with one set of thumbnails. Each (content, preset) pair is an
+# ImageAsset. Its thumbnails, one WebP and one JPEG per width, are rendered
+# after the request commits on a small in-process thread pool, and
+# `manage.py process_images` picks up whatever that missed (restarts,
+# failures, images uploaded before the pipeline existed). Until an asset is
+# ready the serializers report no thumbnails and clients show the original.
+
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import cache, projection
+from .models import Advertisement, Company, ImageAsset
+
+_config = getattr(settings, 'IMAGE_PIPELINE', {})
+MAX_UPLOAD_BYTES = _config.get('MAX_UPLOAD_BYTES', 5 * 1024 * 1024)
+QUALITY = _config.get('QUALITY', 80)
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 3)
+THREADS = _config.get('THREADS', 2)  # 0 leaves all rendering to `manage.py process_images`
+
+# Thumbnail widths and aspect ratio (width, height) of each preset
+PRESETS = {
+    'square': {'widths': (40, 80, 160, 320), 'aspect': (1, 1)},
+    'banner': {'widths': (320, 640), 'aspect': (16, 9)},  # Ad slots show images at 16:9
+}
+# Preset of every image field; the field's asset is `<field>_asset`
+FIELD_PRESETS = {
+    'logo': 'square',
+    'founder_photo': 'square',
+    'image': 'banner',
+}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+JPEG_BACKGROUND = (26, 26, 26)  # JPEG has no alpha; transparent logos sit on the dark cards
+
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='images') if THREADS else None
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _read(upload):
+    """The upload's bytes and file extension. Raises InvalidImage."""
+    if upload.size > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"Image must be smaller than {MAX_UPLOAD_BYTES // (1024 * 1024)}MB")
+    data = upload.read()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImage("Unreadable image")
+    if image_format not in EXTENSIONS:
+        raise InvalidImage("Image must be a JPG, PNG, GIF or WebP")
+    return data, EXTENSIONS[image_format]
+
+
+def store(upload, preset):
+    """
+    Save an uploaded image under its content hash and return its ImageAsset
+    for `preset`; new assets are rendered once the transaction commits.
+    Raises InvalidImage.
+    """
+    data, extension = _read(upload)
+    digest = hashlib.sha256(data).hexdigest()
+    asset = ImageAsset.objects.filter(sha256=digest, preset=preset).first()
+    if asset:
+        return asset
+
+    name = f'images/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    asset, created = ImageAsset.objects.get_or_create(sha256=digest, preset=preset, defaults={'original': name})
+    if created:
+        enqueue(asset)
+    return asset
+
+
+def attach(instance, field, upload):
+    """Store `upload` as `instance.<field>` and point `<field>_asset` at it (doesn't save `instance`)"""
+    asset = store(upload, FIELD_PRESETS[field])
+    setattr(instance, field, asset.original)
+    setattr(instance, f'{field}_asset', asset)
+    return asset
+
+
+def enqueue(asset):
+    if _executor is not None:
+        transaction.on_commit(lambda: _executor.submit(_process_in_background, asset.id))
+
+
+def _process_in_background(asset_id):
+    try:
+        asset = ImageAsset.objects.filter(id=asset_id, status='pending').first()
+        if asset:
+            process(asset)
+    finally:
+        connection.close()  # This worker thread's own connection
+
+
+def thumbnail_name(asset, width, height, extension):
+    return f'thumbs/{asset.preset}/{asset.sha256[:2]}/{asset.sha256}-{width}x{height}.{extension}'
+
+
+def _encode(image, extension):
+    buffer = io.BytesIO()
+    if extension == 'webp':
+        image.save(buffer, 'WEBP', quality=QUALITY, method=4)
+    else:
+        if image.mode == 'RGBA':
+            background = Image.new('RGB', image.size, JPEG_BACKGROUND)
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.save(buffer, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render(asset):
+    """
+    Write the thumbnails of `asset` that aren't in storage yet. Returns the
+    original's (width, height) and the {width: {format: name}} thumbnails.
+    Sizes larger than the original are skipped, except the smallest one.
+    """
+    with default_storage.open(asset.original) as file, Image.open(file) as source:
+        image = ImageOps.exif_transpose(source)  # First frame of animations, upright
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    aspect_width, aspect_height = PRESETS[asset.preset]['aspect']
+    thumbnails = {}
+    for width in PRESETS[asset.preset]['widths']:
+        height = round(width * aspect_height / aspect_width)
+        if thumbnails and (width > image.width or height > image.height):
+            break
+        thumbnail = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        names = {}
+        for kind, extension in (('webp', 'webp'), ('jpeg', 'jpg')):
+            name = thumbnail_name(asset, width, height, extension)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(_encode(thumbnail, extension)))
+            names[kind] = name
+        thumbnails[str(width)] = names
+    return image.size, thumbnails
+
+
+def process(asset):
+    """Render `asset`, recording success or the failure (retried until MAX_ATTEMPTS)"""
+    asset.attempts += 1
+    try:
+        (asset.width, asset.height), asset.thumbnails = render(asset)
+    except Exception as e:
+        asset.last_error = str(e) or e.__class__.__name__
+        if asset.attempts >= MAX_ATTEMPTS:
+            asset.status = 'failed'
+    else:
+        asset.status = 'ready'
+        asset.last_error = ''
+    asset.save(update_fields=['width', 'height', 'thumbnails', 'status', 'attempts', 'last_error'])
+    if asset.status == 'ready':
+        # Responses were rendered without these thumbnails: move Last-Modified
+        # of the rows showing them and drop cached copies
+        now = timezone.now()
+        companies = Company.objects.filter(Q(logo_asset=asset) | Q(founder_photo_asset=asset))
+        companies.update(updated_at=now)
+        projection.refresh(companies)
+        Advertisement.objects.filter(image_asset=asset).update(updated_at=now)
+        cache.bump_version()
+    return asset
+
+
+def adopt_existing():
+    """
+    Give every image field that has no asset yet (uploads from before the
+    pipeline) one, keeping the file where it is. Returns the number of
+    fields updated; their assets still need rendering.
+    """
+    adopted = 0
+    for model, field in ((Company, 'logo'), (Company, 'founder_photo'), (Advertisement, 'image')):
+        rows = model.objects.filter(**{f'{field}_asset__isnull': True}).exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+        for row_id, name in rows.values_list('id', field):
+            digest = hashlib.sha256()
+            try:
+                with default_storage.open(name) as file:
+                    for chunk in file.chunks():
+                        digest.update(chunk)
+            except OSError:
+                continue  # File is gone
+            asset, _ = ImageAsset.objects.get_or_create(
+                sha256=digest.hexdigest(), preset=FIELD_PRESETS[field], defaults={'original': name}
+            )
+            model.objects.filter(id=row_id).update(
+                **{field: asset.original, f'{field}_asset': asset}, updated_at=timezone.now()
+            )
+            if model is Company:
+                projection.refresh(Company.objects.filter(id=row_id))
+            adopted += 1
+    if adopted:
+        cache.bump_version()
+    return adopted
+
+
+def thumbnail_urls(thumbnails):
+    """{width: {format: URL}} for an asset's `thumbnails`, or None if there are none (yet)"""
+    if not thumbnails:
+        return None
+    media_base = default_storage.url('')
+    return {
+        width: {kind: media_base + filepath_to_uri(name) for kind, name in names.items()}
+        for width, names in thumbnails.items()
+    }
@@ -0,0 +1,273 @@
+# Bulk company import
+#
+# Companies are read from CSV or JSON Lines one row at a time, validated, and
+# written in batches: one SELECT to find the rows already imported, then a
+# bulk INSERT of the new ones and a bulk UPDATE of the others, so memory use
+# doesn't grow with the file.
+#
+# Rows are matched on Company.import_key, which only the importer sets: the
+# row's import_key column, else its slug, else slugify(name). Re-importing a
+# file updates the rows it created instead of duplicating them, and never
+# touches companies created any other way, even if their slug is the same
+# (the new row gets a free slug instead). Once a company has a provider
+# integration its revenue and verification come from the provider, and an
+# import no longer overwrites them.
+#
+# Anonymous companies get random generic slugs (company-xxxxxx): nothing in
+# their URL can be traced back to their name. A row replaces every other
+# importable field, so columns missing from the file are reset to their
+# defaults; owners (added_by) are only set on new rows.
+#
+# bulk_create sends no signals: each batch refreshes its public records, and
+# once everything is written finish() rebuilds the leaderboard ranks and
+# category stats and invalidates cached responses.
+# The SQLite search index follows on its own (its triggers fire on upserts
+# too).
+
+import csv
+import gzip
+import io
+import json
+import secrets
+import sys
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import cache, category_stats, projection, ranking
+from .models import GENERIC_SLUG, RESERVED_SLUGS, Company, IntegrationKey
+
+CATEGORIES = {key for key, _ in Company.CATEGORY_CHOICES}
+# Labels ("E-commerce", "YouTuber - Gamer") are accepted as well as keys
+CATEGORY_LABELS = {label.lower(): key for key, label in Company.CATEGORY_CHOICES}
+
+TEXT_FIELDS = {
+    'name': 255, 'website': 200, 'founder_name': 255, 'logo_url': 200, 'description': 500,
+    'twitter_handle': 100, 'tagline': 200, 'country': 100,
+}
+BOOLEAN_FIELDS = ['is_verified', 'show_in_leaderboard', 'is_anonymous']
+DECIMAL_FIELDS = {'monthly_revenue': 15, 'mom_growth': 5, 'estimated_mrr': 15}  # max_digits; all 2 decimal places
+# Written on insert and on update; everything an import file can carry
+UPDATE_FIELDS = [
+    *TEXT_FIELDS, *BOOLEAN_FIELDS, *DECIMAL_FIELDS, 'category', 'founding_date', 'follower_count', 'slug', 'updated_at',
+]
+# Owned by the provider sync once a company has an integration
+PROVIDER_FIELDS = {'monthly_revenue', 'mom_growth', 'is_verified'}
+
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_FALSE = {'0', 'false', 'no', 'n', 'f', ''}
+_TWO_PLACES = Decimal('0.01')
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def open_source(path):
+    """Text stream of `path` ('-' for stdin); .gz files are decompressed on the fly"""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) from a CSV (with a header row) or JSON Lines stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, InvalidRow(f"not JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else InvalidRow("not a JSON object")
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _boolean(field, value, default):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if value is None or text == '':
+        return default
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise InvalidRow(f"{field}: not a boolean: {value!r}")
+
+
+def _decimal(field, value, max_digits):
+    try:
+        number = Decimal(_text(value)).quantize(_TWO_PLACES)
+    except InvalidOperation:
+        raise InvalidRow(f"{field}: not a number: {value!r}")
+    if not number.is_finite() or abs(number) >= Decimal(10) ** (max_digits - 2):
+        raise InvalidRow(f"{field}: out of range: {value!r}")
+    return number
+
+
+def category_key(value):
+    """The CATEGORY_CHOICES key for a key or label, or None"""
+    text = _text(value)
+    if text in CATEGORIES:
+        return text
+    return CATEGORY_LABELS.get(text.lower())
+
+
+def default_slug(name, anonymous):
+    """
+    Slug for a row without one. Anonymous companies get a random generic
+    one, as Company.generate_slug() does: derived from the name, it could be
+    matched against a list of candidate names.
+    """
+    if anonymous:
+        return f"company-{secrets.token_hex(3)}"
+    base = slugify(name)[:70] or 'company'
+    return f'company-{base}' if base.isdigit() or base in RESERVED_SLUGS else base
+
+
+def parse_row(row):
+    """Company (unsaved) from one import row; raises InvalidRow"""
+    fields = {}
+    for field, max_length in TEXT_FIELDS.items():
+        text = _text(row.get(field))
+        if len(text) > max_length:
+            raise InvalidRow(f"{field}: longer than {max_length} characters")
+        fields[field] = text or None
+    if not fields['name']:
+        raise InvalidRow("name: required")
+
+    category = category_key(row.get('category') or 'other')
+    if category is None:
+        raise InvalidRow(f"category: unknown: {row.get('category')!r}")
+    fields['category'] = category
+
+    fields['is_verified'] = _boolean('is_verified', row.get('is_verified'), False)
+    fields['show_in_leaderboard'] = _boolean('show_in_leaderboard', row.get('show_in_leaderboard'), True)
+    fields['is_anonymous'] = _boolean('is_anonymous', row.get('is_anonymous'), False)
+
+    for field, max_digits in DECIMAL_FIELDS.items():
+        value = row.get(field)
+        if value is None or _text(value) == '':
+            fields[field] = None if field == 'estimated_mrr' else Decimal('0.00')
+        else:
+            fields[field] = _decimal(field, value, max_digits)
+
+    founding_date = _text(row.get('founding_date'))
+    try:
+        fields['founding_date'] = date.fromisoformat(founding_date) if founding_date else None
+    except ValueError:
+        raise InvalidRow(f"founding_date: not YYYY-MM-DD: {founding_date!r}")
+    follower_count = _text(row.get('follower_count')) or '0'
+    try:
+        fields['follower_count'] = int(follower_count)
+    except ValueError:
+        raise InvalidRow(f"follower_count: not an integer: {follower_count!r}")
+
+    slug = _text(row.get('slug'))
+    if slug:
+        if len(slug) > 80 or slug != slugify(slug) or slug.isdigit() or slug in RESERVED_SLUGS:
+            raise InvalidRow(f"slug: not a valid slug: {slug!r}")
+        if fields['is_anonymous'] and not GENERIC_SLUG.fullmatch(slug):
+            raise InvalidRow(f"slug: anonymous companies take a generic slug (company-xxxxxx) or none: {slug!r}")
+    import_key = _text(row.get('import_key')) or slug or slugify(fields['name']) or fields['name']
+    if len(import_key) > 255:
+        raise InvalidRow("import_key: longer than 255 characters")
+    return Company(
+        import_key=import_key, slug=slug or default_slug(fields['name'], fields['is_anonymous']), **fields,
+    )
+
+
+def _free_slugs(companies):
+    """Give new companies whose slug is taken (in the table or the batch) a random suffix"""
+    taken = set(Company.objects.filter(slug__in=[company.slug for company in companies]).values_list('slug', flat=True))
+    for company in companies:
+        while company.slug in taken:
+            base = 'company' if company.is_anonymous else company.slug[:73]
+            company.slug = f'{base}-{secrets.token_hex(3)}'
+        taken.add(company.slug)
+
+
+def upsert(companies, owner=None):
+    """Insert or update (by import key) a batch of companies"""
+    # The last row of an import key wins
+    by_key = {company.import_key: company for company in companies}
+    existing = {
+        key: (pk, slug, integrated)
+        for key, pk, slug, integrated in Company.objects.filter(import_key__in=by_key).annotate(
+            integrated=Exists(IntegrationKey.objects.filter(company=OuterRef('pk'))),
+        ).values_list('import_key', 'pk', 'slug', 'integrated')
+    }
+    now = timezone.now()  # auto_now isn't applied by bulk_update
+    new, updated, integrated = [], [], []
+    for key, company in by_key.items():
+        company.updated_at = now
+        if key not in existing:
+            company.added_by = owner
+            new.append(company)
+            continue
+        company.pk, slug, has_integration = existing[key]
+        # Keep the company's URL, unless it has just turned anonymous
+        if not company.is_anonymous or GENERIC_SLUG.fullmatch(slug or ''):
+            company.slug = slug
+        (integrated if has_integration else updated).append(company)
+
+    renamed = [company for company in updated + integrated if company.slug != existing[company.import_key][1]]
+    _free_slugs(new + renamed)
+    Company.objects.bulk_create(new)
+    Company.objects.bulk_update(updated, UPDATE_FIELDS)
+    Company.objects.bulk_update(integrated, [field for field in UPDATE_FIELDS if field not in PROVIDER_FIELDS])
+    projection.refresh(Company.objects.filter(import_key__in=by_key))
+    return len(by_key)
+
+
+def import_companies(rows, owner=None, batch_size=2000, dry_run=False, on_error=None):
+    """
+    Validate and upsert (line number, row) pairs as read_rows() yields them.
+    Invalid rows are skipped and passed to on_error(line number, message).
+    Returns (rows written, rows skipped). Call finish() afterwards.
+    """
+    written = skipped = 0
+    batch = []
+    for line_number, row in rows:
+        try:
+            if isinstance(row, InvalidRow):
+                raise row
+            batch.append(parse_row(row))
+        except InvalidRow as e:
+            skipped += 1
+            if on_error:
+                on_error(line_number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            written += len(batch) if dry_run else upsert(batch, owner)
+            batch = []
+    if batch:
+        written += len(batch) if dry_run else upsert(batch, owner)
+    return written, skipped
+
+
+@transaction.atomic
+def finish():
+    """Bring everything bulk writes bypass up to date with the companies table"""
+    ranked = ranking.rebuild_ranks()
+    category_stats.rebuild()
+    transaction.on_commit(cache.bump_version)
+    return ranked
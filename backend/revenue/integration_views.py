@@ -0,0 +1,281 @@
+# Integration Views - verify revenue provider credentials (async)
+#
+# Verifying a key means several slow calls to Stripe/Razorpay/PayPal. These
+# views are async so that, served over ASGI, a worker keeps handling other
+# requests while the calls are in flight, and the provider calls themselves
+# run concurrently (see RevenueProvider.sync_async). Database work is plain
+# sync code run through sync_to_async. DRF has no async views, so
+# authentication and parsing are done here; responses match the DRF ones.
+
+import json
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import images
+from .history import month_over_month, record_revenue
+from .models import Company, IntegrationKey
+from .providers import InvalidCredentials, ProviderError, sync_revenue_async
+
+INTEGRATIONS = {
+    'stripe': {
+        'credentials': ('api_key',),
+        'missing': "Missing Stripe API key",
+        'verified': "Stripe API key validated & revenue verified!",
+        'failed': "Error validating Stripe key",
+    },
+    'razorpay': {
+        'credentials': ('api_key', 'api_secret'),
+        'missing': "Missing Razorpay API key/secret",
+        'verified': "Razorpay credentials validated & revenue verified!",
+        'failed': "Error validating Razorpay credentials",
+    },
+    'paypal': {
+        'credentials': ('client_id', 'client_secret'),
+        'missing': "Missing PayPal client ID/secret",
+        'verified': "PayPal credentials validated & revenue verified!",
+        'failed': "Error validating PayPal credentials",
+    },
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _authenticate(request):
+    result = JWTAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+def async_api_view(methods):
+    """
+    For async views what @api_view + IsAuthenticated is for sync ones:
+    method check, JWT authentication and CSRF exemption.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                user = await sync_to_async(_authenticate)(request)
+            except AuthenticationFailed as e:
+                return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+            if user is None:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED
+                )
+            request.user = user
+            try:
+                return await view(request, *args, **kwargs)
+            except BadRequest as e:
+                return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        wrapper.csrf_exempt = True  # Token-authenticated, like the DRF views
+        return wrapper
+    return decorator
+
+
+def request_data(request):
+    """The JSON or form body, like DRF's request.data"""
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            raise BadRequest("Invalid JSON body")
+    return request.POST
+
+
+def save_verified_integration(user, data, files, integration, figures):
+    """
+    Store a freshly verified integration: create its company (or use
+    `company_id`), save the key with its sync state and record the verified
+    revenue. Returns (response body, status).
+    """
+    monthly_revenue = figures.monthly_revenue
+    company_id = data.get("company_id")
+    if company_id:
+        company = Company.objects.filter(id=company_id).first()
+        if not company:
+            return {"error": "Invalid company"}, status.HTTP_400_BAD_REQUEST
+    else:
+        try:
+            logo = images.store(files['logo'], images.FIELD_PRESETS['logo']) if 'logo' in files else None
+        except images.InvalidImage as e:
+            return {"error": str(e)}, status.HTTP_400_BAD_REQUEST
+        company = Company.objects.create(
+            name=data.get("company_name", "New Startup"),
+            founder_name=user.username,
+            category=data.get("category", "saas"),
+            show_in_leaderboard=data.get("show_in_leaderboard", True),
+            is_anonymous=data.get("is_anonymous", False),
+            added_by=user,
+            description=data.get("description", ""),
+            website=data.get("website", ""),
+            twitter_handle=data.get("twitter_handle", ""),
+            logo=logo.original if logo else None,
+            logo_asset=logo,
+        )
+
+    # Save integration key
+    credentials = INTEGRATIONS[integration.provider]['credentials']
+    IntegrationKey.objects.update_or_create(
+        company=company,
+        provider=integration.provider,
+        defaults={
+            **{field: getattr(integration, field) for field in credentials},
+            "added_by": user,
+            "sync_cursor": integration.sync_cursor,
+            "daily_revenue": integration.daily_revenue,
+        }
+    )
+
+    # Update company with verified revenue
+    company.monthly_revenue = Decimal(str(monthly_revenue))
+    company.mom_growth = month_over_month(company, monthly_revenue, fallback=figures.growth)
+    company.is_verified = True
+    company.last_verified_at = timezone.now()
+    company.save()
+    record_revenue(company, monthly_revenue, integration.provider, added_by=user)
+
+    return {
+        "company_id": company.id,
+        "revenue": monthly_revenue,
+        "growth": round(float(company.mom_growth), 2),
+        "verified": True
+    }, status.HTTP_200_OK
+
+
+async def verify_integration(request, provider):
+    spec = INTEGRATIONS[provider]
+    data = await sync_to_async(request_data)(request)
+    credentials = {field: data.get(field) for field in spec['credentials']}
+    if not all(credentials.values()):
+        return JsonResponse({"error": spec['missing']}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validate credentials and fetch revenue
+    try:
+        integration = IntegrationKey(provider=provider, **credentials)
+        figures = await sync_revenue_async(integration)
+    except InvalidCredentials as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    except ProviderError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return JsonResponse({"error": f"{spec['failed']}: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    body, code = await sync_to_async(save_verified_integration)(request.user, data, request.FILES, integration, figures)
+    if code == status.HTTP_200_OK:
+        body = {"message": spec['verified'], **body}
+    return JsonResponse(body, status=code)
+
+
+@async_api_view(["POST"])
+async def stripe_integration(request):
+    """
+    Validate Stripe API key and fetch real revenue data
+    """
+    return await verify_integration(request, 'stripe')
+
+
+@async_api_view(["POST"])
+async def razorpay_integration(request):
+    """
+    Validate Razorpay API credentials and fetch real revenue data
+    """
+    return await verify_integration(request, 'razorpay')
+
+
+@async_api_view(["POST"])
+async def paypal_integration(request):
+    """
+    Validate PayPal API credentials and fetch real revenue data
+    """
+    return await verify_integration(request, 'paypal')
+
+
+def prepare_refresh(user, company_id, data):
+    """
+    Check ownership and put the new credentials on the company's integration.
+    Returns (company, integration, None) or (None, None, (error body, status)).
+    """
+    try:
+        company = Company.objects.get(id=company_id)
+        if company.added_by != user:
+            if company.added_by is None and company.founder_name == user.username:
+                company.added_by = user
+                company.save()
+            else:
+                return None, None, ({"error": "Unauthorized"}, status.HTTP_403_FORBIDDEN)
+    except Company.DoesNotExist:
+        return None, None, ({"error": "Unauthorized"}, status.HTTP_403_FORBIDDEN)
+
+    # Get integration key
+    integration = IntegrationKey.objects.filter(company=company).first()
+    if not integration:
+        return None, None, ({"error": "No integration found"}, status.HTTP_404_NOT_FOUND)
+
+    # Get new API key from request
+    new_api_key = data.get('api_key')
+    if not new_api_key:
+        return None, None, ({"error": "API key required"}, status.HTTP_400_BAD_REQUEST)
+
+    # Update the integration key
+    integration.api_key = new_api_key
+    if 'api_secret' in data:
+        integration.api_secret = data['api_secret']
+    if 'client_id' in data:
+        integration.client_id = data['client_id']
+    if 'client_secret' in data:
+        integration.client_secret = data['client_secret']
+    # New credentials may belong to another account, so sync from scratch
+    integration.sync_cursor = None
+    integration.daily_revenue = {}
+    integration.save()
+    return company, integration, None
+
+
+def save_refreshed_revenue(user, company, integration, monthly_revenue):
+    integration.save(update_fields=['sync_cursor', 'daily_revenue'])
+
+    # Update company revenue
+    company.monthly_revenue = Decimal(str(monthly_revenue))
+    company.mom_growth = month_over_month(company, monthly_revenue, fallback=company.mom_growth)
+    company.last_verified_at = timezone.now()
+    company.save()
+    record_revenue(company, monthly_revenue, integration.provider, added_by=user)
+
+
+@async_api_view(["POST"])
+async def refresh_api_key(request, company_id):
+    """
+    Refresh API key and re-verify revenue.
+    """
+    data = await sync_to_async(request_data)(request)
+    company, integration, error = await sync_to_async(prepare_refresh)(request.user, company_id, data)
+    if error:
+        return JsonResponse(error[0], status=error[1])
+
+    # Re-verify revenue based on provider
+    try:
+        monthly_revenue = (await sync_revenue_async(integration)).monthly_revenue
+    except InvalidCredentials as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    except ProviderError as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return JsonResponse({"error": f"Failed to refresh revenue: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    await sync_to_async(save_refreshed_revenue)(request.user, company, integration, monthly_revenue)
+
+    return JsonResponse({
+        "message": "Revenue refreshed successfully",
+        "revenue": monthly_revenue,
+        "last_verified_at": company.last_verified_at
+    })
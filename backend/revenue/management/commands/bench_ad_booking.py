@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from revenue.benchmarking import benchmark_database, create_owners
+from revenue.metrics import percentiles
+from revenue.booking import SlotUnavailable, book_ad, overlapping
+from revenue.models import Advertisement
+
+SLOT_IDS = [slot for slot, _ in Advertisement.SLOT_CHOICES]
+
+
+def check_then_insert(owner, slot_id, start_date, end_date, **fields):
+    """What book_ad did before: the check and the insert are separate statements"""
+    if overlapping(slot_id, start_date, end_date).exists():
+        raise SlotUnavailable("Slot already booked for these dates")
+    return Advertisement.objects.create(
+        owner=owner, slot_id=slot_id, start_date=start_date, end_date=end_date, is_active=True, **fields
+    )
+
+
+def double_bookings():
+    """Active ads that overlap an earlier ad in the same slot"""
+    count = 0
+    ads = Advertisement.objects.filter(is_active=True).order_by('slot_id', 'start_date', 'id')
+    last_end = {}
+    for slot_id, start_date, end_date in ads.values_list('slot_id', 'start_date', 'end_date'):
+        if slot_id in last_end and start_date <= last_end[slot_id]:
+            count += 1
+        last_end[slot_id] = max(end_date, last_end.get(slot_id, end_date))
+    return count
+
+
+class Command(BaseCommand):
+    help = "Fire concurrent ad bookings at the booking service and check that no slot gets double-booked"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=500, help="Booking attempts per run")
+        parser.add_argument('--concurrency', type=int, default=100, help="Threads booking at the same time")
+        parser.add_argument('--slots', type=int, default=len(SLOT_IDS), help="Number of slots the bookings target")
+        parser.add_argument('--horizon', type=int, default=60, help="Days ahead the bookings start within")
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        today = date.today()
+        slots = SLOT_IDS[:max(1, min(options['slots'], len(SLOT_IDS)))]
+        requests = []
+        for _ in range(options['bookings']):
+            start = today + timedelta(days=rnd.randrange(options['horizon']))
+            requests.append((rnd.choice(slots), start, start + timedelta(days=7 * rnd.randint(1, 4) - 1)))
+
+        with benchmark_database(on_disk=True):
+            owner = create_owners(1)[0]
+            for name, book in (('check-then-insert', check_then_insert), ('slot lock', book_ad)):
+                Advertisement.objects.all().delete()
+                outcomes, durations, elapsed = self.run(book, owner, requests, options['concurrency'])
+                self.stdout.write(
+                    f"{name:<18} {len(requests) / elapsed:>8,.0f} bookings/sec  "
+                    f"booked {outcomes['booked']:>4}  rejected {outcomes['rejected']:>4}  "
+                    f"errors {outcomes['error']:>3}  double-booked {double_bookings():>4}  "
+                    f"p50 {percentiles(durations)['p50_ms']:.1f} ms  p99 {percentiles(durations)['p99_ms']:.1f} ms"
+                )
+
+    def run(self, book, owner, requests, concurrency):
+        chunks = [requests[i::concurrency] for i in range(concurrency)]
+        start = threading.Barrier(len(chunks))
+        outcomes = Counter()
+        durations = []
+        lock = threading.Lock()
+
+        def worker(chunk):
+            start.wait()  # Everyone starts together to maximise contention
+            try:
+                for slot_id, start_date, end_date in chunk:
+                    began = time.perf_counter()
+                    try:
+                        book(owner, slot_id, start_date, end_date, title='Bench', description='Benchmark',
+                             target_url='https://example.com')
+                        outcome = 'booked'
+                    except SlotUnavailable:
+                        outcome = 'rejected'
+                    except Exception as e:
+                        self.stderr.write(f"Booking failed: {e}")
+                        outcome = 'error'
+                    with lock:
+                        outcomes[outcome] += 1
+                        durations.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            list(pool.map(worker, chunks))
+        return outcomes, durations, time.perf_counter() - began
@@ -0,0 +1,70 @@
+import random
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+
+from revenue.ad_counters import CLICK, IMPRESSION, AdCounterBuffer
+from revenue.benchmarking import benchmark_database, count_queries, create_owners, timed
+from revenue.models import Advertisement
+
+
+class Command(BaseCommand):
+    help = "Compare per-request ad counter writes with the buffered counters (events/sec, SQL writes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000, help="Tracking requests to simulate")
+        parser.add_argument('--click-ratio', type=float, default=0.05, help="Share of requests that are clicks")
+        parser.add_argument('--flush-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        events = [
+            (CLICK, [rnd.randint(1, 10)]) if rnd.random() < options['click_ratio'] else (IMPRESSION, list(range(1, 11)))
+            for _ in range(options['events'])
+        ]
+        expected_impressions = sum(len(ids) for kind, ids in events if kind == IMPRESSION)
+        expected_clicks = sum(1 for kind, _ in events if kind == CLICK)
+
+        with benchmark_database():
+            owner = create_owners(1)[0]
+            today = date.today()
+            Advertisement.objects.bulk_create([
+                Advertisement(id=i, owner=owner, title=f'Ad {i}', description='Benchmark', target_url='https://example.com',
+                              slot_id=slot, start_date=today, end_date=today + timedelta(days=30))
+                for i, (slot, _) in enumerate(Advertisement.SLOT_CHOICES, start=1)
+            ])
+
+            def per_request():
+                # What track_ad_click / track_ad_impression did before
+                for kind, ad_ids in events:
+                    if kind == CLICK:
+                        ad = Advertisement.objects.get(id=ad_ids[0])
+                        ad.clicks += 1
+                        ad.save(update_fields=['clicks'])
+                    else:
+                        Advertisement.objects.filter(id__in=ad_ids).update(impressions=F('impressions') + 1)
+
+            log_dir = tempfile.mkdtemp(prefix='bench_ad_counters_')
+
+            def buffered():
+                buffer = AdCounterBuffer(log_dir=log_dir, flush_interval=3600, flush_size=options['flush_size'])
+                for kind, ad_ids in events:
+                    buffer.record(kind, ad_ids)
+                buffer.flush()
+
+            try:
+                for name, fn in (('per-request writes', per_request), ('buffered', buffered)):
+                    Advertisement.objects.update(impressions=0, clicks=0)
+                    with count_queries() as queries:
+                        _, durations = timed(fn)
+                    totals = Advertisement.objects.aggregate(impressions=Sum('impressions'), clicks=Sum('clicks'))
+                    correct = totals == {'impressions': expected_impressions, 'clicks': expected_clicks}
+                    self.stdout.write(
+                        f"{name:<20} {len(events) / durations[0]:>12,.0f} events/sec  "
+                        f"{queries.count:>7} SQL statements  counts {'match' if correct else 'WRONG'}"
+                    )
+            finally:
+                shutil.rmtree(log_dir, ignore_errors=True)
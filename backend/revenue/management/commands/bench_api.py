@@ -0,0 +1,264 @@
+import json
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from revenue import ad_counters, cache, category_stats, ranking
+from revenue.benchmarking import benchmark_database, count_queries, create_ads, create_companies, create_owners
+from revenue.metrics import percentiles
+from revenue.models import Advertisement, Company
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+HEADERS = {'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'}  # What a browser sends
+
+
+def endpoints(rnd, company_ids, ad_ids):
+    """
+    name -> fn(client) making one request. Parameters are drawn from `rnd`
+    out of small sets (popular profiles, common searches), so a warm cache
+    can actually hold them.
+    """
+    today = timezone.localdate()
+    profiles = rnd.sample(company_ids, min(20, len(company_ids)))
+
+    def get(path):
+        return lambda client: client.get(path(), **HEADERS)
+
+    return {
+        'list_companies': get(lambda: '/api/revenue/companies/'),
+        'list_companies_category': get(lambda: '/api/revenue/companies/?category=saas'),
+        'company_details': get(lambda: f'/api/revenue/companies/{rnd.choice(profiles)}/'),
+        'search_companies': get(lambda: f'/api/revenue/companies/search/?q=startup {rnd.randint(1, 10)}'),
+        'category_stats': get(lambda: '/api/revenue/categories/stats/'),
+        'ad_slots': get(lambda: '/api/revenue/ads/slots/'),
+        'ad_slots_range': get(lambda: f'/api/revenue/ads/slots/?from={today}&to={today + timedelta(days=27)}'),
+        'ad_calendar': get(lambda: '/api/revenue/ads/calendar/'),
+        'track_ad_impression': lambda client: client.post(
+            '/api/revenue/ads/impressions/', {'ad_ids': rnd.sample(ad_ids, min(10, len(ad_ids)))},
+            content_type='application/json', **HEADERS,
+        ),
+    }
+
+
+UNCACHED = {'track_ad_impression'}  # Writes: only measured as is
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the public API end to end (URL routing, middleware, views, serialization) over synthetic "
+        "datasets: per-endpoint p50/p95/p99 latency with a cold and a warm response cache, SQL queries per "
+        "request, and throughput with concurrent clients. Runs against the configured database engine (for "
+        "PostgreSQL: --settings core.production with DATABASE_URL set) in a throwaway test database. "
+        "--output writes a JSON report; --compare diffs this run against an earlier one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['1k', '10k'])
+        parser.add_argument('--ads', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=100, help="Timed requests per endpoint and cache mode")
+        parser.add_argument('--endpoints', nargs='+', help="Only these endpoints")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help="Client threads")
+        parser.add_argument('--throughput-requests', type=int, default=2000, help="Requests per concurrency level")
+        parser.add_argument('--output', help="Write the JSON report here")
+        parser.add_argument('--compare', help="Earlier JSON report to diff p50/p95 against")
+        parser.add_argument('--tolerance', type=float, default=10.0, help="Percent slower that counts as a regression")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read {options['compare']}: {e}")
+
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'started_at': timezone.now().isoformat(timespec='seconds'),
+                'options': {
+                    key: options[key] for key in ('scales', 'ads', 'requests', 'concurrency', 'throughput_requests')
+                },
+            },
+            'scales': {},
+        }
+
+        # Keep benchmark responses out of the shared cache real servers read,
+        # and the tracked impressions out of the real counter logs
+        saved_alias, saved_buffer = cache.CACHE_ALIAS, ad_counters._buffer
+        log_dir = tempfile.mkdtemp(prefix='bench_api_counters_')
+        cache.CACHE_ALIAS = 'default'
+        ad_counters._buffer = ad_counters.AdCounterBuffer(log_dir=log_dir, flush_interval=3600)
+        try:
+            for scale in options['scales']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{scale} companies, {options['ads']} ads"))
+                # On disk, so the client threads can share the database
+                with benchmark_database(on_disk=True):
+                    report['scales'][scale] = self.run_scale(SCALES[scale], options)
+                    ad_counters._buffer.flush()
+        finally:
+            cache.CACHE_ALIAS = saved_alias
+            ad_counters._buffer = saved_buffer
+            shutil.rmtree(log_dir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f"Report written to {options['output']}")
+        if baseline:
+            self.compare(baseline, report, options['tolerance'])
+
+    def run_scale(self, companies, options):
+        started = time.perf_counter()
+        owners = create_owners()
+        create_companies(companies, owners=owners)
+        company_ids = list(Company.objects.filter(show_in_leaderboard=True).values_list('id', flat=True))
+        create_ads(options['ads'], owners, companies=company_ids)
+        ad_ids = list(Advertisement.objects.values_list('id', flat=True))
+        # bulk_create sends no signals
+        ranking.rebuild_ranks()
+        category_stats.rebuild()
+        result = {
+            'dataset': {'companies': companies, 'ads': len(ad_ids), 'seconds': round(time.perf_counter() - started, 2)},
+            'endpoints': {},
+            'throughput': {},
+        }
+
+        rnd = random.Random(0)
+        calls = endpoints(rnd, company_ids, ad_ids)
+        names = options['endpoints'] or list(calls)
+        unknown = set(names) - set(calls)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        client = Client()
+        for name in names:
+            result['endpoints'][name] = entry = {}
+            for mode in (('as_is',) if name in UNCACHED else ('cold', 'warm')):
+                entry[mode] = self.measure(client, calls[name], mode, options['requests'])
+                self.stdout.write(
+                    f"{name:<24} {mode:<5} p50 {entry[mode]['p50_ms']:>8.2f} ms  p95 {entry[mode]['p95_ms']:>8.2f} ms  "
+                    f"p99 {entry[mode]['p99_ms']:>8.2f} ms  {entry[mode]['queries']:>5.1f} queries  "
+                    f"{entry[mode]['bytes']:>7} bytes"
+                )
+
+        mix = [calls[name] for name in names]
+        for concurrency in options['concurrency']:
+            result['throughput'][str(concurrency)] = stats = self.throughput(mix, concurrency, options['throughput_requests'])
+            self.stdout.write(
+                f"{concurrency:>3} clients  {stats['requests_per_second']:>8.1f} req/s  "
+                f"p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}"
+            )
+        return result
+
+    def measure(self, client, call, mode, requests):
+        """Latency of `requests` calls; cold ones start from an empty response cache"""
+        if mode == 'warm':
+            for _ in range(requests):
+                call(client)
+        durations = []
+        size = 0
+        with count_queries() as queries:
+            for _ in range(requests):
+                if mode == 'cold':
+                    cache.bump_version()
+                began = time.perf_counter()
+                response = call(client)
+                durations.append(time.perf_counter() - began)
+                if response.status_code >= 400:
+                    raise CommandError(f"{response.status_code} from {response.request['PATH_INFO']}: {response.content[:200]}")
+                size = len(response.content)
+        return {**percentiles(durations), 'queries': round(queries.count / requests, 2), 'bytes': size}
+
+    def throughput(self, mix, concurrency, requests):
+        """Requests/sec of `concurrency` client threads cycling through `mix` with a warm cache"""
+        per_thread = max(1, requests // concurrency)
+        barrier = threading.Barrier(concurrency + 1)
+        durations = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(offset):
+            client = Client()
+            mine = []
+            failed = 0
+            barrier.wait()
+            try:
+                for i in range(per_thread):
+                    began = time.perf_counter()
+                    try:
+                        if mix[(offset + i) % len(mix)](client).status_code >= 400:
+                            failed += 1
+                    except Exception:
+                        failed += 1
+                    mine.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+            with lock:
+                durations.extend(mine)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            **percentiles(durations),
+            'requests_per_second': round(len(durations) / elapsed, 1),
+            'errors': sum(errors),
+        }
+
+    def compare(self, baseline, report, tolerance):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {baseline['meta'].get('revision') or 'baseline'} ({baseline['meta'].get('database')})"
+        ))
+        regressions = 0
+        for scale, result in report['scales'].items():
+            before = baseline.get('scales', {}).get(scale, {}).get('endpoints', {})
+            for name, modes in result['endpoints'].items():
+                for mode, stats in modes.items():
+                    old = before.get(name, {}).get(mode)
+                    if not old:
+                        continue
+                    changes = []
+                    slower = False
+                    for key in ('p50_ms', 'p95_ms'):
+                        change = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0
+                        slower = slower or change > tolerance
+                        changes.append(f"{key[:3]} {old[key]:>8.2f} -> {stats[key]:>8.2f} ms ({change:+6.1f}%)")
+                    if stats['queries'] != old['queries']:
+                        changes.append(f"queries {old['queries']} -> {stats['queries']}")
+                    line = f"{scale:<5} {name:<24} {mode:<5} " + '  '.join(changes)
+                    if slower or stats['queries'] > old['queries']:
+                        regressions += 1
+                        line = self.style.ERROR(line)
+                    self.stdout.write(line)
+        self.stdout.write(f"{regressions} regression(s) beyond {tolerance:g}%")
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from revenue import providers
+from revenue.benchmarking import benchmark_database, create_owners
+from revenue.integration_views import save_verified_integration
+from revenue.metrics import percentiles
+from revenue.models import IntegrationKey
+from revenue.stub_providers import StubConfig, serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Stripe verifications per worker: a sync worker making the provider calls one after another "
+        "vs the async view handling many requests at once (against the local provider stubs)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verifications', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once on the async worker")
+        parser.add_argument('--latency-ms', type=int, default=150, help="Stub provider response time")
+        parser.add_argument('--items', type=int, default=300, help="Transactions per stub account")
+
+    def handle(self, *args, **options):
+        server = serve(0, StubConfig(latency_ms=options['latency_ms'], items=options['items']))
+        stub = f'http://127.0.0.1:{server.server_address[1]}'
+        saved_bases = dict(providers.API_BASES)
+        providers.API_BASES.update(stripe=f'{stub}/stripe', razorpay=f'{stub}/razorpay', paypal=f'{stub}/paypal')
+        try:
+            with benchmark_database(on_disk=True):
+                user = create_owners(1)[0]
+                for name, run in (('sync worker', self.run_sync), ('async worker', self.run_async)):
+                    durations, elapsed = run(user, options)
+                    stats = percentiles(durations)
+                    self.stdout.write(
+                        f"{name:<13} {len(durations) / elapsed:>7.1f} verifications/sec  "
+                        f"p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms"
+                    )
+        finally:
+            providers.API_BASES.clear()
+            providers.API_BASES.update(saved_bases)
+            server.shutdown()
+
+    def run_sync(self, user, options):
+        """What a sync worker did: one request at a time, provider calls in series"""
+        durations = []
+        started = time.perf_counter()
+        for i in range(options['verifications']):
+            began = time.perf_counter()
+            integration = IntegrationKey(provider='stripe', api_key=f'sk_sync_{i}')
+            figures = providers.sync_revenue(integration)
+            save_verified_integration(user, {'company_name': f'Sync {i}'}, {}, integration, figures)
+            durations.append(time.perf_counter() - began)
+        return durations, time.perf_counter() - started
+
+    def run_async(self, user, options):
+        token = str(RefreshToken.for_user(user).access_token)
+
+        async def verify_all():
+            client = AsyncClient()
+            gate = asyncio.Semaphore(options['concurrency'])
+            durations = []
+
+            async def verify(i):
+                async with gate:
+                    began = time.perf_counter()
+                    response = await client.post(
+                        '/api/revenue/integrations/stripe/',
+                        {'api_key': f'sk_async_{i}', 'company_name': f'Async {i}'},
+                        content_type='application/json',
+                        headers={'Authorization': f'Bearer {token}'},
+                    )
+                    if response.status_code != 200:
+                        self.stderr.write(f"Verification failed: {response.content[:200]}")
+                    durations.append(time.perf_counter() - began)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(verify(i) for i in range(options['verifications'])))
+            return durations, time.perf_counter() - started
+
+        return asyncio.run(verify_all())
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Q, Sum
+
+from revenue import category_stats, ranking
+from revenue.benchmarking import benchmark_database, count_queries, create_companies, create_owners, timed
+from revenue.metrics import percentiles
+from revenue.models import Company
+
+
+def on_demand():
+    """What the stats cost without the table: one grouped scan plus a median lookup per category"""
+    companies = Company.objects.filter(show_in_leaderboard=True)
+    rows = list(companies.values('category').order_by().annotate(
+        count=Count('id'), verified=Count('id', filter=Q(is_verified=True)),
+        total=Sum('monthly_revenue'), growth=Avg('mom_growth'),
+    ))
+    for row in rows:
+        middle = list(
+            companies.filter(category=row['category']).order_by('monthly_revenue')
+            .values_list('monthly_revenue', flat=True)[(row['count'] - 1) // 2:row['count'] // 2 + 1]
+        )
+        row['median'] = sum(middle) / len(middle)
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Compare per-category stats computed on demand with reading the incrementally kept table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--updates', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            create_companies(options['companies'], owners=create_owners())
+            # bulk_create sends no signals
+            ranking.rebuild_ranks()
+            category_stats.rebuild()
+
+            for name, fn in (('on demand', on_demand), ('stats table', lambda: list(category_stats.all_stats()))):
+                with count_queries() as queries:
+                    _, durations = timed(fn, options['repeat'])
+                stats = percentiles(durations)
+                self.stdout.write(
+                    f"{name:<12} p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+                    f"{queries.count // options['repeat']} queries"
+                )
+
+            # What an update costs with the table kept up to date (the save's signals sync the rank too)
+            companies = list(Company.objects.order_by('?')[:options['updates']])
+            for company in companies:
+                company.monthly_revenue += Decimal('1.00')
+
+            def update():
+                company = companies.pop()
+                company.save()
+
+            with count_queries() as queries:
+                _, durations = timed(update, options['updates'])
+            stats = percentiles(durations)
+            self.stdout.write(
+                f"company update p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+                f"{queries.count // options['updates']} queries"
+            )
+
+            incremental = [(s.category, s.companies, s.total_mrr, s.median_mrr) for s in category_stats.all_stats()]
+            category_stats.rebuild()
+            exact = [(s.category, s.companies, s.total_mrr, s.median_mrr) for s in category_stats.all_stats()]
+            self.stdout.write(f"incremental stats match a rebuild: {incremental == exact}")
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from revenue.benchmarking import benchmark_database, count_queries, create_companies, create_owners, timed
+from revenue.models import Company
+from revenue.projection import public_projection, public_rows
+from revenue.serializers import CompanySerializer, company_list_rows, render_json
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare CompanySerializer with company_list_rows (how public records are built) and with "
+        "the stored public records the list endpoints serve (rows/sec) on synthetic companies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000', help="Comma-separated company counts")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is reported)")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with benchmark_database():
+            owners = create_owners()
+            created = 0
+            for size in sizes:
+                create_companies(size - created, owners=owners, start=created, seed=size)
+                created = size
+                self.run(size, options['repeat'])
+
+    def run(self, size, repeat):
+        queryset = Company.objects.order_by('-monthly_revenue', '-id')
+
+        def serializer():
+            return JSONRenderer().render(CompanySerializer(queryset, many=True).data)
+
+        def list_rows():
+            return render_json(list(company_list_rows(queryset)))
+
+        def stored_records():
+            return render_json(list(public_rows(queryset)))
+
+        results = {}
+        for name, fn in (('CompanySerializer', serializer), ('company_list_rows', list_rows),
+                         ('stored records', stored_records)):
+            with count_queries() as queries:
+                body, durations = timed(fn, repeat)
+            best = min(durations)
+            results[name] = body
+            self.stdout.write(
+                f"{size:>7} rows  {name:<18} {best:8.3f}s  {size / best:>12,.0f} rows/sec  "
+                f"{queries.count // repeat:>6} queries/run"
+            )
+
+        expected = render_json([public_projection(row) for row in company_list_rows(queryset)])
+        if results['CompanySerializer'] != results['company_list_rows']:
+            self.stderr.write(self.style.ERROR("company_list_rows output differs from CompanySerializer"))
+        elif results['stored records'] != expected:
+            self.stderr.write(self.style.ERROR("Stored records are stale; run rebuild_public_projections"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{size:>7} rows  outputs identical"))
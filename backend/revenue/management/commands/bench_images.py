@@ -0,0 +1,74 @@
+import io
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image, ImageDraw, ImageFilter
+
+from revenue import images
+from revenue.benchmarking import benchmark_database
+from revenue.metrics import percentiles
+
+
+def synthetic_logo(rnd, size, image_format):
+    """A logo-like upload: gradient background, a few shapes, some camera-ish noise"""
+    image = Image.linear_gradient('L').resize((size, size)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x, y = rnd.randrange(size), rnd.randrange(size)
+        radius = rnd.randrange(size // 10, size // 3)
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    noise = Image.effect_noise((size, size), 24).convert('RGB')
+    image = Image.blend(image, noise, 0.15).filter(ImageFilter.SMOOTH)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **({'quality': 92} if image_format == 'JPEG' else {}))
+    return SimpleUploadedFile(f'logo.{image_format.lower()}', buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = "Image bytes a leaderboard page downloads: original uploads vs the 40px avatars' thumbnails"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logos', type=int, default=50, help="Logos on the page")
+        parser.add_argument('--size', type=int, default=1024, help="Upload width/height in pixels")
+        parser.add_argument('--width', default='80', help="Thumbnail width served for a 40px avatar (2x for HiDPI)")
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        media = tempfile.mkdtemp(prefix='trustmrr_bench_media_')
+        executor, images._executor = images._executor, None  # Render inline, to time it
+        try:
+            with override_settings(MEDIA_ROOT=media), benchmark_database():
+                original_bytes = 0
+                thumbnail_bytes = {'webp': 0, 'jpeg': 0}
+                durations = []
+                for i in range(options['logos']):
+                    upload = synthetic_logo(rnd, options['size'], 'PNG' if i % 2 else 'JPEG')
+                    asset = images.store(upload, 'square')
+                    started = time.perf_counter()
+                    images.process(asset)
+                    durations.append(time.perf_counter() - started)
+                    original_bytes += default_storage.size(asset.original)
+                    for kind in thumbnail_bytes:
+                        thumbnail_bytes[kind] += default_storage.size(asset.thumbnails[options['width']][kind])
+
+                stats = percentiles(durations)
+                self.stdout.write(
+                    f"{options['logos']} logos of {options['size']}px, rendered in "
+                    f"p50 {stats['p50_ms']:.0f} ms / p95 {stats['p95_ms']:.0f} ms each"
+                )
+                for kind in ('webp', 'jpeg'):
+                    self.stdout.write(
+                        f"{options['width']}px {kind:<4}  {original_bytes / 1024:>9,.0f} KiB originals -> "
+                        f"{thumbnail_bytes[kind] / 1024:>6,.0f} KiB thumbnails  "
+                        f"({original_bytes / thumbnail_bytes[kind]:,.0f}x smaller)"
+                    )
+        finally:
+            images._executor = executor
+            shutil.rmtree(media, ignore_errors=True)
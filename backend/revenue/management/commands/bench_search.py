@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from revenue.benchmarking import benchmark_database, count_queries, create_companies, create_owners, timed
+from revenue.metrics import percentiles
+from revenue.search import parse_filters, search
+
+QUERIES = [
+    ('one company', {'q': 'startup12345'}),
+    ('prefix, ~110 hits', {'q': 'startup 123'}),
+    ('prefix + facets', {'q': 'startup 123', 'category': 'saas,agency', 'verified': 'true'}),
+    ('revenue range', {'min_revenue': '1000', 'max_revenue': '2000', 'country': 'IN'}),
+    ('every company', {'q': 'benchmark'}),
+]
+
+
+class Command(BaseCommand):
+    help = "Time company searches (one page plus total and facet counts) over synthetic companies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            create_companies(options['companies'], owners=create_owners())
+            for name, params in QUERIES:
+                filters = parse_filters(params)
+                with count_queries() as queries:
+                    results, durations = timed(lambda: search(params.get('q', ''), filters, options['limit']), options['repeat'])
+                stats = percentiles(durations)
+                self.stdout.write(
+                    f"{name:<18} {results['total']:>7} hits  p50 {stats['p50_ms']:>8.2f} ms  "
+                    f"p95 {stats['p95_ms']:>8.2f} ms  {queries.count // options['repeat']} queries"
+                )
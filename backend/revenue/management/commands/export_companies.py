@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from revenue import export
+from revenue.history import GRANULARITIES
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the public leaderboard (or its MRR history, --history) as CSV or JSON Lines, streamed a chunk at "
+        "a time. Same rows as /api/revenue/export/: leaderboard companies only, anonymous ones masked."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(export.FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write (default: stdout)")
+        parser.add_argument('--category', help="Only this category")
+        parser.add_argument('--history', choices=GRANULARITIES, help="Export MRR rollups of this granularity instead")
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help="Rows fetched and written at a time")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['history']:
+            rows = export.history_rows(options['history'], options['category'], chunk_size=chunk_size)
+            columns = export.HISTORY_COLUMNS
+        else:
+            rows = export.company_rows(options['category'], chunk_size=chunk_size)
+            columns = export.COMPANY_COLUMNS
+
+        chunks = export.stream(rows, columns, options['format'], chunk_size=chunk_size)
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        except OSError as e:
+            raise CommandError(f"Can't write {options['output']}: {e}")
+        self.stderr.write(f"Wrote {options['output']}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from revenue.ad_counters import LOG_DIR, replay_orphans
+
+
+class Command(BaseCommand):
+    help = "Replay ad impression/click logs left behind by processes that exited without flushing"
+
+    def handle(self, *args, **options):
+        replayed = replay_orphans()
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} segment(s) from {LOG_DIR}"))
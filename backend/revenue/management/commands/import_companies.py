@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from revenue import importing
+
+
+class Command(BaseCommand):
+    help = (
+        "Import companies from a CSV (header row) or JSON Lines file in batches, updating the rows an earlier "
+        "import created (matched by the import_key column, else slug, else name). Columns are Company field "
+        "names; category takes a key or label from Company.CATEGORY_CHOICES. Invalid rows are reported and "
+        "skipped. Use '-' to read stdin; .gz files are decompressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows written at a time")
+        parser.add_argument('--owner', help="Username set as added_by of new companies")
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the file")
+        parser.add_argument('--max-errors', type=int, default=20, help="Invalid rows to print before going quiet")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.removesuffix('.gz').endswith(('.jsonl', '.ndjson')) else 'csv')
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"No user named {options['owner']!r}")
+
+        errors = []
+
+        def report_error(line_number, message):
+            errors.append(line_number)
+            if len(errors) <= options['max_errors']:
+                self.stderr.write(f"line {line_number}: {message}")
+
+        started = time.perf_counter()
+        try:
+            with importing.open_source(path) as stream:
+                written, skipped = importing.import_companies(
+                    importing.read_rows(stream, fmt),
+                    owner=owner,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    on_error=report_error,
+                )
+        except OSError as e:
+            raise CommandError(f"Can't read {path}: {e}")
+        if options['dry_run']:
+            self.stdout.write(f"{written} valid rows, {skipped} invalid")
+            return
+        ranked = importing.finish() if written else None
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {written} companies in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f} rows/sec), "
+            f"skipped {skipped} invalid rows"
+        ))
+        if ranked is not None:
+            self.stdout.write(f"Leaderboard rebuilt: {ranked} ranked companies")
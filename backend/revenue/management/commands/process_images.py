@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from revenue.images import MAX_ATTEMPTS, adopt_existing, process
+from revenue.models import ImageAsset
+
+
+class Command(BaseCommand):
+    help = "Render the thumbnails of uploaded images that are still waiting for them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--adopt', action='store_true', help="First give images uploaded before the pipeline existed an asset"
+        )
+        parser.add_argument('--limit', type=int, default=None, help="Render at most this many images")
+
+    def handle(self, *args, **options):
+        if options['adopt']:
+            self.stdout.write(f"Adopted {adopt_existing()} existing image(s)")
+
+        pending = ImageAsset.objects.filter(status='pending', attempts__lt=MAX_ATTEMPTS).order_by('id')
+        totals = {'ready': 0, 'pending': 0, 'failed': 0}
+        for asset in pending[:options['limit']]:
+            process(asset)
+            totals[asset.status] += 1
+            if asset.status != 'ready':
+                self.stderr.write(f"{asset.original}: {asset.last_error}")
+        self.stdout.write(
+            f"Rendered {totals['ready']} image(s), {totals['pending']} will be retried, {totals['failed']} gave up"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from revenue.category_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-category leaderboard stats from scratch"
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats of {total} categories"))
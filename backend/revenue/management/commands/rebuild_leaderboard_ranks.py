@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from revenue.ranking import rebuild_ranks
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized leaderboard ranks from scratch"
+
+    def handle(self, *args, **options):
+        total = rebuild_ranks()
+        self.stdout.write(self.style.SUCCESS(f"Ranked {total} companies"))
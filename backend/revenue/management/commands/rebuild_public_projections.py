@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from revenue import cache
+from revenue.models import Company
+from revenue.projection import refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute the public record of every company (e.g. after changing MEDIA_URL or the masking rules)"
+
+    def handle(self, *args, **options):
+        total = refresh(Company.objects.all())
+        cache.bump_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the public records of {total} companies"))
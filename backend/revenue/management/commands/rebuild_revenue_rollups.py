@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from revenue.history import rebuild_rollups
+from revenue.models import RevenueRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the day/week/month revenue rollups from the revenue snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, action='append', help="Only this company id (repeatable)")
+
+    def handle(self, *args, **options):
+        rebuild_rollups(options['company'])
+        rollups = RevenueRollup.objects.all()
+        if options['company']:
+            rollups = rollups.filter(company_id__in=options['company'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rollups.count()} rollups"))
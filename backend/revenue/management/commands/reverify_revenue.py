@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from revenue.reverify import DEFAULT_PROVIDER_CONCURRENCY, Reverifier
+
+
+class Command(BaseCommand):
+    help = "Re-fetch revenue from the payment providers for every integrated company"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Companies fetched and written per batch")
+        parser.add_argument('--workers', type=int, default=16, help="Provider calls in flight across all providers")
+        for provider, limit in DEFAULT_PROVIDER_CONCURRENCY.items():
+            parser.add_argument(f'--{provider}-concurrency', type=int, default=limit,
+                                help=f"Concurrent calls to {provider.title()}")
+        parser.add_argument('--max-retries', type=int, default=4, help="Retries per call when rate limited")
+        parser.add_argument('--backoff', type=float, default=1.0, help="Base backoff in seconds (doubles per retry)")
+        parser.add_argument('--provider', action='append', choices=sorted(DEFAULT_PROVIDER_CONCURRENCY),
+                            help="Only re-verify this provider (repeatable)")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        verbose = options['verbosity'] > 1
+        reverifier = Reverifier(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            provider_concurrency={
+                provider: options[f'{provider}_concurrency'] for provider in DEFAULT_PROVIDER_CONCURRENCY
+            },
+            max_retries=options['max_retries'],
+            backoff_base=options['backoff'],
+            providers=options['provider'],
+            log=self.stderr.write if verbose else None,
+        )
+        report = reverifier.run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-verified {report['companies']} companies ({report['integrations']} integrations) "
+            f"in {report['seconds']}s, {report['integrations_per_second']} integrations/sec, "
+            f"{report['revenue_changed']} revenue changes"
+        ))
+        for provider, stats in report['providers'].items():
+            latency = (
+                f"p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms"
+                if stats['calls'] else "no successful calls"
+            )
+            self.stdout.write(
+                f"  {provider:<9} {stats['calls']:>6} calls  {stats['errors']:>4} errors  "
+                f"{stats['retries']:>4} retries  {latency}"
+            )
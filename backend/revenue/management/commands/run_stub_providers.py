@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from revenue.stub_providers import StubConfig, make_server
+
+
+class Command(BaseCommand):
+    help = "Serve local Stripe/Razorpay/PayPal stand-ins for testing the revenue integrations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=int, default=0, help="Delay added to every response")
+        parser.add_argument('--rate-limit', type=float, default=0.0, help="Share of requests answered with 429")
+        parser.add_argument('--items', type=int, default=250, help="Transactions per credential over the last 90 days")
+        parser.add_argument('--subscriptions', type=int, default=0, help="Active subscriptions per credential")
+
+    def handle(self, *args, **options):
+        config = StubConfig(
+            latency_ms=options['latency_ms'],
+            rate_limit=options['rate_limit'],
+            items=options['items'],
+            subscriptions=options['subscriptions'],
+        )
+        server = make_server(options['port'], config)
+        address = f"http://127.0.0.1:{options['port']}"
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub providers listening on {address}\n"
+            f"Run the app or reverify_revenue with REVENUE_PROVIDER_STUB={address}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
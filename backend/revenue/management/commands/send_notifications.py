@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from revenue.notifications import schedule_ad_notifications
+from revenue.outbox import BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = "Queue due ad go-live/expiry emails and send everything waiting in the email outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Emails sent per SMTP connection")
+        parser.add_argument('--no-schedule', action='store_true', help="Only send queued emails")
+        parser.add_argument('--loop', action='store_true', help="Keep running instead of exiting once the outbox is empty")
+        parser.add_argument('--interval', type=float, default=30, help="Seconds between passes with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            connection.close()  # Don't hold a connection while sleeping
+            time.sleep(options['interval'])
+
+    def run_once(self, options):
+        if not options['no_schedule']:
+            live, reminders = schedule_ad_notifications()
+            if live or reminders:
+                self.stdout.write(f"Queued {live} go-live email(s) and {reminders} expiry reminder(s)")
+        totals = {'sent': 0, 'retrying': 0, 'failed': 0}
+        while True:
+            results = drain(options['batch_size'])
+            for key, count in results.items():
+                totals[key] += count
+            # Emails that failed are not due again this pass, so a short batch means we're done
+            if sum(results.values()) < options['batch_size']:
+                break
+        if any(totals.values()):
+            self.stdout.write(
+                f"Sent {totals['sent']}, {totals['retrying']} will be retried, {totals['failed']} gave up"
+            )
@@ -0,0 +1,183 @@
+# Per-request metrics
+#
+# RequestMetricsMiddleware (see middleware.py) counts every request and its
+# total time per view. A sample of requests (SAMPLE_RATE) is also measured in
+# detail: SQL statement count and time, and the time spent rendering the
+# response body. Sampled responses carry the figures in a Server-Timing
+# header, so they show up in the browser's network panel, and a sampled
+# request running more queries than QUERY_BUDGET is logged with its view.
+#
+# Everything is aggregated in process memory, like cache.stats(), and
+# exposed in the Prometheus text format by the metrics view. Each worker
+# process reports its own figures. percentiles() summarizes other latency
+# samples the same way (re-verification reports, the bench_* commands).
+
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'REQUEST_METRICS', {})
+ENABLED = _config.get('ENABLED', True)
+SAMPLE_RATE = _config.get('SAMPLE_RATE', 0.05)  # Share of requests measured in detail
+QUERY_BUDGET = _config.get('QUERY_BUDGET', 15)  # SQL statements per request before a request is flagged
+TOKEN = _config.get('TOKEN', '')  # Bearer token that may read the metrics endpoint
+
+# Upper bounds (seconds) of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = 'trustmrr'
+
+_lock = threading.Lock()
+_requests = defaultdict(int)  # (view, method, status class) -> count
+_durations = defaultdict(lambda: [[0] * len(BUCKETS), 0, 0.0])  # view -> [bucket counts, count, sum]
+_sampled = defaultdict(lambda: {'requests': 0, 'queries': 0, 'sql_seconds': 0.0, 'render_seconds': 0.0, 'over_budget': 0})
+
+
+def percentiles(durations):
+    """p50/p95/p99 and mean of a list of durations, in milliseconds"""
+    ordered = sorted(durations)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'p50_ms': round(pick(50), 3),
+        'p95_ms': round(pick(95), 3),
+        'p99_ms': round(pick(99), 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def should_sample():
+    return ENABLED and random.random() < SAMPLE_RATE
+
+
+class RequestTimer:
+    """SQL and render timings of one sampled request; install with connection.execute_wrapper()"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self._render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - started
+
+    def render_started(self):
+        self._render_started = time.perf_counter()
+
+    def render_finished(self, response):
+        if self._render_started is not None:
+            self.render_seconds += time.perf_counter() - self._render_started
+            self._render_started = None
+        return response
+
+    def server_timing(self, total):
+        """Server-Timing header value; `total` is the request's wall time in seconds"""
+        return ', '.join([
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render_seconds * 1000:.1f}',
+            f'app;dur={max(0.0, total - self.sql_seconds - self.render_seconds) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def record(view, method, status_code, seconds, timer=None):
+    """Add one finished request to the aggregates; `timer` is its RequestTimer if it was sampled"""
+    with _lock:
+        _requests[(view, method, f'{status_code // 100}xx')] += 1
+        histogram = _durations[view]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += 1
+        histogram[2] += seconds
+        if timer is not None:
+            sampled = _sampled[view]
+            sampled['requests'] += 1
+            sampled['queries'] += timer.queries
+            sampled['sql_seconds'] += timer.sql_seconds
+            sampled['render_seconds'] += timer.render_seconds
+            if timer.queries > QUERY_BUDGET:
+                sampled['over_budget'] += 1
+    if timer is not None and timer.queries > QUERY_BUDGET:
+        logger.warning(
+            "%s %s ran %d SQL queries (budget %d) in %.1f ms", method, view, timer.queries, QUERY_BUDGET,
+            timer.sql_seconds * 1000,
+        )
+
+
+def _labels(**labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render_prometheus():
+    """Every aggregate in the Prometheus text exposition format"""
+    with _lock:
+        requests = dict(_requests)
+        durations = {view: (list(buckets), count, total) for view, (buckets, count, total) in _durations.items()}
+        sampled = {view: dict(figures) for view, figures in _sampled.items()}
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+        for suffix, labels, value in samples:
+            lines.append(f'{PREFIX}_{name}{suffix}{_labels(**labels)} {value}')
+
+    metric('http_requests_total', 'counter', 'Requests by view, method and status class', [
+        ('', {'view': view, 'method': method, 'status': status}, count)
+        for (view, method, status), count in sorted(requests.items())
+    ])
+
+    histogram = []
+    for view, (buckets, count, total) in sorted(durations.items()):
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            histogram.append(('_bucket', {'view': view, 'le': bound}, cumulative))
+        histogram.append(('_bucket', {'view': view, 'le': '+Inf'}, count))
+        histogram.append(('_sum', {'view': view}, round(total, 6)))
+        histogram.append(('_count', {'view': view}, count))
+    metric('http_request_duration_seconds', 'histogram', 'Wall time of requests by view', histogram)
+
+    for name, key, help_text in (
+        ('sampled_requests_total', 'requests', 'Requests measured in detail (the SQL and render figures cover these)'),
+        ('sql_queries_total', 'queries', 'SQL statements run by sampled requests'),
+        ('sql_duration_seconds_total', 'sql_seconds', 'Time sampled requests spent in SQL'),
+        ('render_duration_seconds_total', 'render_seconds', 'Time sampled requests spent rendering response bodies'),
+        ('query_budget_exceeded_total', 'over_budget', f'Sampled requests running more than {QUERY_BUDGET} SQL statements'),
+    ):
+        metric(name, 'counter', help_text, [
+            ('', {'view': view}, round(figures[key], 6)) for view, figures in sorted(sampled.items())
+        ])
+
+    cache_stats = cache.stats()
+    metric('response_cache_lookups_total', 'counter', 'Response cache lookups by outcome', [
+        ('', {'result': result}, cache_stats[key])
+        for result, key in (('local_hit', 'local_hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses'))
+    ])
+    metric('response_cache_local_entries', 'gauge', 'Entries in the per-process response cache tier', [
+        ('', {}, cache_stats['local_entries']),
+    ])
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0010_advertisement_clicks_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['show_in_leaderboard', 'category', '-monthly_revenue', '-id'], name='company_leaderboard_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['show_in_leaderboard', '-monthly_revenue', '-id'], name='company_leaderboard_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_ranks(apps, schema_editor):
+    Company = apps.get_model('revenue', 'Company')
+    LeaderboardRank = apps.get_model('revenue', 'LeaderboardRank')
+    rows = list(
+        Company.objects.filter(show_in_leaderboard=True)
+        .order_by('-monthly_revenue', '-id')
+        .values_list('id', 'monthly_revenue', 'category')
+    )
+    total = len(rows)
+    category_counts = {}
+    entries = []
+    for overall_rank, (company_id, revenue, category) in enumerate(rows, start=1):
+        category_counts[category] = category_counts.get(category, 0) + 1
+        entries.append(LeaderboardRank(
+            company_id=company_id,
+            monthly_revenue=revenue,
+            category=category,
+            overall_rank=overall_rank,
+            category_rank=category_counts[category],
+            percentile=round((total - overall_rank) * 100 / total, 2),
+        ))
+    LeaderboardRank.objects.bulk_create(entries, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0011_company_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRank',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_rank', serialize=False, to='revenue.company')),
+                ('monthly_revenue', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('category', models.CharField(max_length=100)),
+                ('overall_rank', models.PositiveIntegerField()),
+                ('category_rank', models.PositiveIntegerField()),
+                ('percentile', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['overall_rank'], name='rank_overall_idx'), models.Index(fields=['category', 'category_rank'], name='rank_category_idx'), models.Index(fields=['monthly_revenue', 'company'], name='rank_key_idx'), models.Index(fields=['category', 'monthly_revenue', 'company'], name='rank_category_key_idx')],
+            },
+        ),
+        migrations.RunPython(populate_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+import secrets
+
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+def populate_slugs(apps, schema_editor):
+    Company = apps.get_model('revenue', 'Company')
+    taken = set()
+    for company in Company.objects.order_by('id').only('id', 'name', 'is_anonymous').iterator():
+        base = 'company' if company.is_anonymous else (slugify(company.name or '')[:70] or 'company')
+        if base.isdigit():
+            base = f'company-{base}'
+        slug = base
+        while slug in taken:
+            slug = f'{base}-{secrets.token_hex(3)}'
+        taken.add(slug)
+        Company.objects.filter(pk=company.pk).update(slug=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0012_leaderboardrank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=80, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0013_company_slug_company_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='integrationkey',
+            name='daily_revenue',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='integrationkey',
+            name='sync_cursor',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
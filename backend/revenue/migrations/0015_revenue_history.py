@@ -0,0 +1,81 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timedelta, timezone
+
+
+def seed_history(apps, schema_editor):
+    """Start every verified company's history with its current figure"""
+    Company = apps.get_model('revenue', 'Company')
+    IntegrationKey = apps.get_model('revenue', 'IntegrationKey')
+    RevenueSnapshot = apps.get_model('revenue', 'RevenueSnapshot')
+    RevenueRollup = apps.get_model('revenue', 'RevenueRollup')
+
+    providers = {}
+    for company_id, provider in IntegrationKey.objects.values_list('company_id', 'provider'):
+        providers.setdefault(company_id, set()).add(provider)
+
+    snapshots = []
+    rollups = []
+    companies = Company.objects.filter(is_verified=True, last_verified_at__isnull=False)
+    for company_id, mrr, verified_at in companies.values_list('id', 'monthly_revenue', 'last_verified_at'):
+        found = providers.get(company_id, set())
+        snapshots.append(RevenueSnapshot(
+            company_id=company_id, mrr=mrr, source=found.pop() if len(found) == 1 else 'combined',
+            recorded_at=verified_at,
+        ))
+        day = verified_at.astimezone(timezone.utc).date()
+        for granularity, start in (('day', day), ('week', day - timedelta(days=day.weekday())), ('month', day.replace(day=1))):
+            rollups.append(RevenueRollup(
+                company_id=company_id, granularity=granularity, period_start=start,
+                mrr=mrr, mrr_min=mrr, mrr_max=mrr, samples=1, last_recorded_at=verified_at,
+            ))
+    RevenueSnapshot.objects.bulk_create(snapshots, batch_size=2000)
+    RevenueRollup.objects.bulk_create(rollups, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('revenue', '0014_integrationkey_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('mrr', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('mrr_min', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('mrr_max', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('last_recorded_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='revenue.company')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RevenueSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mrr', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('source', models.CharField(choices=[('stripe', 'Stripe'), ('razorpay', 'Razorpay'), ('paypal', 'PayPal'), ('combined', 'Several providers'), ('manual', 'Manual')], max_length=20)),
+                ('is_verified', models.BooleanField(default=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('added_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_snapshots', to='revenue.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'recorded_at'], name='snapshot_company_time_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(fields=('company', 'granularity', 'period_start'), name='rollup_company_period_uniq'),
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
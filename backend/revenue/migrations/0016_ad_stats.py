@@ -0,0 +1,53 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('revenue', '0015_revenue_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdStatDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('impressions', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='revenue.advertisement')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AdStatHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('impressions', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('ad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='revenue.advertisement')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'hour'], name='adstat_hourly_owner_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='adstathourly',
+            constraint=models.UniqueConstraint(fields=('ad', 'hour'), name='adstat_hourly_ad_hour_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='adstatdaily',
+            index=models.Index(fields=['owner', 'day'], name='adstat_daily_owner_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='adstatdaily',
+            constraint=models.UniqueConstraint(fields=('ad', 'day'), name='adstat_daily_ad_day_uniq'),
+        ),
+    ]
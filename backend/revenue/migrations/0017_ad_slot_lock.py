@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+def create_slot_locks(apps, schema_editor):
+    AdSlotLock = apps.get_model('revenue', 'AdSlotLock')
+    Advertisement = apps.get_model('revenue', 'Advertisement')
+    slots = [slot for slot, _ in Advertisement._meta.get_field('slot_id').choices]
+    AdSlotLock.objects.bulk_create([AdSlotLock(slot_id=slot) for slot in slots])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0016_ad_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdSlotLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_id', models.CharField(choices=[('left_1', 'Left Sidebar 1'), ('left_2', 'Left Sidebar 2'), ('left_3', 'Left Sidebar 3'), ('left_4', 'Left Sidebar 4'), ('left_5', 'Left Sidebar 5'), ('right_1', 'Right Sidebar 1'), ('right_2', 'Right Sidebar 2'), ('right_3', 'Right Sidebar 3'), ('right_4', 'Right Sidebar 4'), ('right_5', 'Right Sidebar 5')], max_length=20, unique=True)),
+                ('bookings', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_slot_locks, migrations.RunPython.noop),
+    ]
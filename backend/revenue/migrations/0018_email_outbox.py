@@ -0,0 +1,61 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:44
+
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def skip_started_ads(apps, schema_editor):
+    """Ads that went live before the scheduler existed don't get a late "now live" email"""
+    Advertisement = apps.get_model('revenue', 'Advertisement')
+    Advertisement.objects.filter(start_date__lt=date.today()).update(live_notification_sent=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0017_ad_slot_lock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ad_confirmation', 'Ad booking confirmation'), ('ad_live', 'Ad is live'), ('ad_expiry', 'Ad expiry reminder')], max_length=20)),
+                ('to_email', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='expiry_reminder_sent',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(condition=models.Q(('live_notification_sent', False)), fields=['start_date'], name='ad_live_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(condition=models.Q(('expiry_reminder_sent', False)), fields=['end_date'], name='ad_expiry_pending_idx'),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='ad',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emails', to='revenue.advertisement'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ),
+        migrations.RunPython(skip_started_ads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0018_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_id', models.CharField(choices=[('left_1', 'Left Sidebar 1'), ('left_2', 'Left Sidebar 2'), ('left_3', 'Left Sidebar 3'), ('left_4', 'Left Sidebar 4'), ('left_5', 'Left Sidebar 5'), ('right_1', 'Right Sidebar 1'), ('right_2', 'Right Sidebar 2'), ('right_3', 'Right Sidebar 3'), ('right_4', 'Right Sidebar 4'), ('right_5', 'Right Sidebar 5')], max_length=20, unique=True)),
+                ('computed_on', models.DateField()),
+                ('future_bookings', models.PositiveIntegerField(default=0)),
+                ('weekly_occupancy', models.JSONField(default=list)),
+            ],
+        ),
+    ]
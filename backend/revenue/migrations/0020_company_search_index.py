@@ -0,0 +1,65 @@
+from django.db import migrations, models
+
+# A frozen copy of the index as revenue.search defined it at this migration,
+# so later changes to the app code can't break it. revenue.search.restore_index
+# reinstalls the current definition after every migrate.
+FTS_TABLE = 'revenue_company_fts'
+FTS_COLUMNS = 'name, tagline, description, founder_name, twitter_handle'
+
+
+def _fts_values(prefix):
+    return ', '.join(f'{prefix}.{column}' for column in FTS_COLUMNS.split(', '))
+
+
+FTS_DELETE = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {FTS_COLUMNS}) VALUES ('delete', old.id, {_fts_values('old')});"
+FTS_INSERT = f"INSERT INTO {FTS_TABLE}(rowid, {FTS_COLUMNS}) VALUES (new.id, {_fts_values('new')});"
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{FTS_COLUMNS}, content='revenue_company', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON revenue_company BEGIN {FTS_INSERT} END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON revenue_company BEGIN {FTS_DELETE} END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {FTS_COLUMNS} ON revenue_company "
+    f"BEGIN {FTS_DELETE} {FTS_INSERT} END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+POSTGRES_INDEX = (
+    "CREATE INDEX IF NOT EXISTS company_search_idx ON revenue_company USING GIN (("
+    "setweight(to_tsvector('simple'::regconfig, coalesce(name, '') || ' ' || coalesce(twitter_handle, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(tagline, '') || ' ' || coalesce(founder_name, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'C')))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_INDEX)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_INDEX:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS company_search_idx")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0019_slot_demand'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['monthly_revenue'], name='company_revenue_idx'),
+        ),
+        # PostgreSQL GIN index / SQLite FTS5 table, see revenue/search.py
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
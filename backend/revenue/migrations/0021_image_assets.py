@@ -0,0 +1,52 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0020_company_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('preset', models.CharField(max_length=20)),
+                ('original', models.CharField(max_length=255)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('thumbnails', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='image_asset_pending_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imageasset',
+            constraint=models.UniqueConstraint(fields=('sha256', 'preset'), name='image_asset_content_uniq'),
+        ),
+        migrations.AddField(
+            model_name='advertisement',
+            name='image_asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='revenue.imageasset'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='founder_photo_asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='revenue.imageasset'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='logo_asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='revenue.imageasset'),
+        ),
+    ]
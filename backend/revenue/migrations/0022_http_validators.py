@@ -0,0 +1,26 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0021_image_assets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisement',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['updated_at'], name='ad_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['updated_at'], name='company_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:30
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Company = apps.get_model('revenue', 'Company')
+    CategoryStats = apps.get_model('revenue', 'CategoryStats')
+    revenues = {}
+    stats = {}
+
+    def empty(category):
+        return CategoryStats(category=category, total_mrr=Decimal(0), growth_sum=Decimal(0), median_mrr=Decimal(0))
+
+    rows = Company.objects.filter(show_in_leaderboard=True).values_list('category', 'monthly_revenue', 'mom_growth', 'is_verified')
+    for category, revenue, growth, verified in rows.iterator(chunk_size=2000):
+        entry = stats.setdefault(category, empty(category))
+        entry.companies += 1
+        entry.verified += int(verified)
+        entry.total_mrr += revenue
+        entry.growth_sum += growth
+        revenues.setdefault(category, []).append(revenue)
+    for key, _ in Company._meta.get_field('category').choices:
+        stats.setdefault(key, empty(key))
+    for category, entry in stats.items():
+        values = sorted(revenues.get(category, []))
+        if values:
+            middle = values[(len(values) - 1) // 2:len(values) // 2 + 1]
+            entry.median_mrr = (sum(middle) / len(middle)).quantize(Decimal('0.01'))
+    CategoryStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0022_http_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('saas', 'SaaS'), ('youtuber_gamer', 'YouTuber - Gamer'), ('youtuber_content_creator', 'YouTuber - Content Creator'), ('youtuber_educational', 'YouTuber - Educational'), ('influencer_instagram', 'Influencer - Instagram'), ('influencer_facebook', 'Influencer - Facebook'), ('influencer_twitter', 'Influencer - Twitter/X'), ('indian_startup', 'Indian Startup'), ('film_entertainment', 'Film/Entertainment'), ('business_india', 'Business in India'), ('ecommerce', 'E-commerce'), ('consulting', 'Consulting'), ('agency', 'Agency'), ('other', 'Other')], max_length=100, unique=True)),
+                ('companies', models.PositiveIntegerField(default=0)),
+                ('verified', models.PositiveIntegerField(default=0)),
+                ('total_mrr', models.DecimalField(decimal_places=2, default=0.0, max_digits=20)),
+                ('growth_sum', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('median_mrr', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+            ],
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 4.2.26 on 2026-10-18 13:02
+
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+
+# A frozen copy of revenue.projection as of this migration, so later changes
+# to the app code can't break it. `manage.py rebuild_public_projections`
+# recomputes the records with the current code.
+ANONYMOUS = {
+    "name": "Anonymous Company",
+    "founder_name": "Anonymous",
+    "website": None,
+    "twitter_handle": None,
+    "logo": None,
+    "logo_url": None,
+    "founder_photo": None,
+    "logo_thumbnails": None,
+    "founder_photo_thumbnails": None,
+    "added_by": None,
+}
+COLUMNS = [
+    'id', 'slug', 'name', 'website', 'founder_name', 'monthly_revenue', 'mom_growth', 'logo', 'logo_url',
+    'founder_photo', 'category', 'is_verified', 'last_verified_at', 'show_in_leaderboard', 'is_anonymous',
+    'added_by_id', 'added_by__username', 'description', 'twitter_handle', 'tagline', 'founding_date', 'country',
+    'follower_count', 'estimated_mrr', 'logo_asset__thumbnails', 'founder_photo_asset__thumbnails',
+]
+
+
+def public_record(row, media_base):
+    def image(name):
+        return media_base + filepath_to_uri(name) if name else None
+
+    def thumbnails(names_by_width):
+        if not names_by_width:
+            return None
+        return {
+            width: {kind: image(name) for kind, name in names.items()}
+            for width, names in names_by_width.items()
+        }
+
+    def decimal(value):
+        return None if value is None else '{:f}'.format(value.quantize(Decimal('0.01')))
+
+    last_verified_at = None
+    if row['last_verified_at'] is not None:
+        last_verified_at = timezone.localtime(row['last_verified_at']).isoformat()
+        if last_verified_at.endswith('+00:00'):
+            last_verified_at = last_verified_at[:-6] + 'Z'
+
+    data = {
+        "id": row['id'],
+        "slug": row['slug'],
+        "name": row['name'],
+        "website": row['website'],
+        "founder_name": row['founder_name'],
+        "monthly_revenue": decimal(row['monthly_revenue']),
+        "mom_growth": decimal(row['mom_growth']),
+        "logo": image(row['logo']),
+        "logo_url": row['logo_url'],
+        "founder_photo": image(row['founder_photo']),
+        "category": row['category'],
+        "is_verified": row['is_verified'],
+        "last_verified_at": last_verified_at,
+        "show_in_leaderboard": row['show_in_leaderboard'],
+        "is_anonymous": row['is_anonymous'],
+        "added_by": row['added_by_id'],
+    }
+    if row['added_by_id'] is not None:
+        data["added_by_username"] = row['added_by__username']
+    data.update({
+        "description": row['description'],
+        "twitter_handle": row['twitter_handle'],
+        "tagline": row['tagline'],
+        "founding_date": row['founding_date'].isoformat() if row['founding_date'] else None,
+        "country": row['country'],
+        "follower_count": row['follower_count'],
+        "estimated_mrr": decimal(row['estimated_mrr']),
+        "logo_thumbnails": thumbnails(row['logo_asset__thumbnails']),
+        "founder_photo_thumbnails": thumbnails(row['founder_photo_asset__thumbnails']),
+    })
+    if row['is_anonymous']:
+        data.update(ANONYMOUS)
+        data.pop("added_by_username", None)
+    return data
+
+
+def populate_public_data(apps, schema_editor):
+    Company = apps.get_model('revenue', 'Company')
+    media_base = default_storage.url('')
+    batch = []
+    for row in Company.objects.order_by('pk').values(*COLUMNS).iterator(chunk_size=2000):
+        batch.append(Company(pk=row['id'], public_data=public_record(row, media_base)))
+        if len(batch) >= 2000:
+            Company.objects.bulk_update(batch, ['public_data'])
+            batch = []
+    Company.objects.bulk_update(batch, ['public_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0023_category_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='public_data',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(populate_public_data, migrations.RunPython.noop),
+    ]
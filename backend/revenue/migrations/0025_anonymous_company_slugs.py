@@ -0,0 +1,34 @@
+# Generated by Django 4.2.26 on 2026-10-18 17:40
+
+import re
+import secrets
+
+from django.db import migrations
+
+GENERIC_SLUG = re.compile(r'company(-[0-9a-f]{6})?')
+
+
+def mask_anonymous_slugs(apps, schema_editor):
+    """Give anonymous companies that still have a name-derived slug a generic one"""
+    Company = apps.get_model('revenue', 'Company')
+    for company in list(Company.objects.filter(is_anonymous=True).only('slug', 'public_data')):
+        if company.slug and GENERIC_SLUG.fullmatch(company.slug):
+            continue
+        slug = f'company-{secrets.token_hex(3)}'
+        while Company.objects.filter(slug=slug).exists():
+            slug = f'company-{secrets.token_hex(3)}'
+        company.slug = slug
+        if company.public_data:
+            company.public_data['slug'] = slug
+        company.save(update_fields=['slug', 'public_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0024_company_public_data'),
+    ]
+
+    operations = [
+        migrations.RunPython(mask_anonymous_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.26 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+def create_lock(apps, schema_editor):
+    apps.get_model('revenue', 'LeaderboardRankLock').objects.create()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0025_anonymous_company_slugs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRankLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updates', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_lock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+def adopt_imported_companies(apps, schema_editor):
+    """
+    Imports used to match rows by slug. Companies without an owner or an
+    integration can only have come from an import (or the seed script), so
+    they keep being matched by that slug; every other company is left alone.
+    """
+    Company = apps.get_model('revenue', 'Company')
+    IntegrationKey = apps.get_model('revenue', 'IntegrationKey')
+    integrated = IntegrationKey.objects.values('company_id')
+    imported = Company.objects.filter(added_by__isnull=True, slug__isnull=False).exclude(pk__in=integrated)
+    imported.update(import_key=models.F('slug'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0026_leaderboard_rank_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(adopt_imported_companies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-18 18:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0027_company_import_key'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='leaderboardrank',
+            name='percentile',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-18 18:34
+
+import secrets
+
+from django.db import migrations
+
+# Slugs shadowed by other routes under /api/revenue/companies/, as of this migration
+RESERVED_SLUGS = ['search']
+
+
+def rename_reserved_slugs(apps, schema_editor):
+    """Move companies off slugs their profile URL can't be reached at"""
+    Company = apps.get_model('revenue', 'Company')
+    for company in list(Company.objects.filter(slug__in=RESERVED_SLUGS).only('slug', 'public_data')):
+        slug = f'{company.slug}-{secrets.token_hex(3)}'
+        while Company.objects.filter(slug=slug).exists():
+            slug = f'{company.slug}-{secrets.token_hex(3)}'
+        company.slug = slug
+        if company.public_data:
+            company.public_data['slug'] = slug
+        company.save(update_fields=['slug', 'public_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('revenue', '0028_drop_rank_percentile'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_reserved_slugs, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,15 @@
+import re
+import secrets
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils.text import slugify
+
+# What Company.generate_slug() gives anonymous companies: nothing from the name
+GENERIC_SLUG = re.compile(r'company(-[0-9a-f]{6})?')
+# Paths under /api/revenue/companies/ that would shadow a company with that slug (see urls.py)
+RESERVED_SLUGS = {'search'}
 
 class Company(models.Model):
     CATEGORY_CHOICES = [
@@ -20,6 +30,7 @@ class Company(models.Model):
     ]
     
     name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=80, unique=True, null=True, blank=True)  # Public profile URL, e.g. /company/gumroad
     website = models.URLField(blank=True, null=True)
     founder_name = models.CharField(max_length=255, blank=True, null=True)
     monthly_revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
@@ -27,6 +38,8 @@ class Company(models.Model):
     logo = models.ImageField(upload_to='logos/', blank=True, null=True)
     logo_url = models.URLField(blank=True, null=True)  # Keep for backward compatibility
     founder_photo = models.ImageField(upload_to='founder_photos/', blank=True, null=True)  # Founder profile picture
+    logo_asset = models.ForeignKey('ImageAsset', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # Thumbnails of logo
+    founder_photo_asset = models.ForeignKey('ImageAsset', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     category = models.CharField(max_length=100, choices=CATEGORY_CHOICES, default='other')
     is_verified = models.BooleanField(default=False)  # Revenue verification status
     last_verified_at = models.DateTimeField(null=True, blank=True)  # Last verification timestamp
@@ -42,10 +55,48 @@ class Company(models.Model):
     country = models.CharField(max_length=100, blank=True, null=True)  # Country code or name
     follower_count = models.IntegerField(default=0)  # Twitter/X follower count
     estimated_mrr = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)  # Estimated MRR
+    updated_at = models.DateTimeField(auto_now=True)
+    # Ready-to-serve public record, anonymity masking applied (see revenue/projection.py)
+    public_data = models.JSONField(default=dict, blank=True, editable=False)
+    # Row identity for the bulk importer, which only ever matches rows it created (see revenue/importing.py)
+    import_key = models.CharField(max_length=255, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Leaderboard keyset pagination: (monthly_revenue, id) within a category or overall
+            models.Index(fields=['show_in_leaderboard', 'category', '-monthly_revenue', '-id'], name='company_leaderboard_cat_idx'),
+            models.Index(fields=['show_in_leaderboard', '-monthly_revenue', '-id'], name='company_leaderboard_idx'),
+            # Revenue-range filters of company search
+            models.Index(fields=['monthly_revenue'], name='company_revenue_idx'),
+            # Last-Modified of the public endpoints (see conditional.py)
+            models.Index(fields=['updated_at'], name='company_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # A company turning anonymous loses its name-derived slug (and URL) too
+        if not self.slug or (self.is_anonymous and not GENERIC_SLUG.fullmatch(self.slug)):
+            self.slug = self.generate_slug()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = list(kwargs['update_fields']) + ['slug']
+        super().save(*args, **kwargs)
+
+    def generate_slug(self):
+        """
+        Unique slug from the company name. Anonymous companies get a generic
+        one so the URL doesn't reveal who they are. Never all digits, so it
+        can't be confused with an id, and never a RESERVED_SLUGS path.
+        """
+        base = 'company' if self.is_anonymous else (slugify(self.name or '')[:70] or 'company')
+        if base.isdigit() or base in RESERVED_SLUGS:
+            base = f'company-{base}'
+        slug = base
+        while Company.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            slug = f'{base}-{secrets.token_hex(3)}'
+        return slug
+
 
 
 class IntegrationKey(models.Model):
@@ -62,6 +113,10 @@ class IntegrationKey(models.Model):
     client_secret = models.CharField(max_length=255, blank=True, null=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
+    # Incremental sync state (see revenue/providers.py): transactions created
+    # before sync_cursor are already counted in the per-day totals
+    sync_cursor = models.DateTimeField(blank=True, null=True)
+    daily_revenue = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"{self.company.name} - {self.provider}"
@@ -89,6 +144,7 @@ class Advertisement(models.Model):
     description = models.CharField(max_length=200)
     target_url = models.URLField(help_text="Where the ad links to")
     image = models.ImageField(upload_to='ad_images/', blank=True, null=True)
+    image_asset = models.ForeignKey('ImageAsset', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # Thumbnails of image
     
     # Scheduling & Status
     slot_id = models.CharField(max_length=20, choices=SLOT_CHOICES)
@@ -96,6 +152,7 @@ class Advertisement(models.Model):
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     # Payment Info
     payment_id = models.CharField(max_length=100, blank=True, null=True) # Transaction ID
@@ -105,9 +162,18 @@ class Advertisement(models.Model):
     impressions = models.IntegerField(default=0)  # How many times ad was shown
     clicks = models.IntegerField(default=0)  # How many times ad was clicked
     
-    # Notifications
+    # Notifications (set once the email is queued in EmailOutbox)
     confirmation_email_sent = models.BooleanField(default=False)
     live_notification_sent = models.BooleanField(default=False)
+    expiry_reminder_sent = models.BooleanField(default=False)
+    
+    class Meta:
+        indexes = [
+            # The notification scheduler's lookups; only ads still waiting for an email are indexed
+            models.Index(fields=['start_date'], condition=models.Q(live_notification_sent=False), name='ad_live_pending_idx'),
+            models.Index(fields=['end_date'], condition=models.Q(expiry_reminder_sent=False), name='ad_expiry_pending_idx'),
+            models.Index(fields=['updated_at'], name='ad_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Ad: {self.title} ({self.slot_id})"
@@ -133,3 +199,249 @@ class Advertisement(models.Model):
         if not self.is_live:
             return 0
         return (self.end_date - date.today()).days
+
+
+class SlotDemand(models.Model):
+    """
+    Booking demand of an ad slot as of `computed_on`, read by the ad pricing
+    instead of counting bookings per quote. Refreshed whenever one of the
+    slot's ads is saved or deleted, and lazily once it is a day old (see
+    revenue.pricing).
+    """
+    slot_id = models.CharField(max_length=20, choices=Advertisement.SLOT_CHOICES, unique=True)
+    computed_on = models.DateField()
+    future_bookings = models.PositiveIntegerField(default=0)  # Active ads ending on or after computed_on
+    weekly_occupancy = models.JSONField(default=list)  # Booked days in each of the next DEMAND_WEEKS weeks
+
+    def __str__(self):
+        return f"Demand: {self.slot_id} ({self.future_bookings} bookings)"
+
+
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be sent (or already sent) by `manage.py
+    send_notifications`, so requests never wait on SMTP. See revenue.outbox.
+    """
+    KIND_CHOICES = [
+        ('ad_confirmation', 'Ad booking confirmation'),
+        ('ad_live', 'Ad is live'),
+        ('ad_expiry', 'Ad expiry reminder'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),  # Gave up after EMAIL_OUTBOX['MAX_ATTEMPTS']
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    ad = models.ForeignKey(Advertisement, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()  # Also pushed ahead while a worker holds the email
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.to_email} ({self.status})"
+
+
+class AdStatHourly(models.Model):
+    """Impressions and clicks of an ad per hour, written by revenue.ad_counters"""
+    ad = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='hourly_stats')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)  # Copied from the ad for portfolio queries
+    hour = models.DateTimeField()  # Start of the hour (UTC)
+    impressions = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ad', 'hour'], name='adstat_hourly_ad_hour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'hour'], name='adstat_hourly_owner_idx'),
+        ]
+
+
+class AdStatDaily(models.Model):
+    """Impressions and clicks of an ad per (UTC) day, rolled up alongside AdStatHourly"""
+    ad = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='daily_stats')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    impressions = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ad', 'day'], name='adstat_daily_ad_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'day'], name='adstat_daily_owner_idx'),
+        ]
+
+class AdSlotLock(models.Model):
+    """
+    One row per ad slot. A booking locks its slot's row before checking for
+    overlaps (see revenue.booking), so bookings of the same slot queue up
+    while bookings of other slots go ahead.
+    """
+    slot_id = models.CharField(max_length=20, choices=Advertisement.SLOT_CHOICES, unique=True)
+    bookings = models.PositiveIntegerField(default=0)  # Bumped to take the lock
+
+    def __str__(self):
+        return f"Lock: {self.slot_id}"
+
+class LeaderboardRankLock(models.Model):
+    """
+    A single row. Rank changes lock it first (see revenue.ranking), as every
+    one of them may shift the ranks of any other company.
+    """
+    updates = models.PositiveIntegerField(default=0)  # Bumped to take the lock
+
+    def __str__(self):
+        return "Lock: leaderboard ranks"
+
+class LeaderboardRank(models.Model):
+    """
+    Materialized leaderboard position of a company that is shown in the leaderboard.
+    Kept up to date incrementally by revenue.ranking.sync_company_rank, which
+    runs whenever a Company is saved.
+    """
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name='leaderboard_rank')
+    monthly_revenue = models.DecimalField(max_digits=15, decimal_places=2)  # Revenue the ranks were computed for
+    category = models.CharField(max_length=100)  # Category the category rank was computed for
+    overall_rank = models.PositiveIntegerField()
+    category_rank = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['overall_rank'], name='rank_overall_idx'),
+            models.Index(fields=['category', 'category_rank'], name='rank_category_idx'),
+            models.Index(fields=['monthly_revenue', 'company'], name='rank_key_idx'),
+            models.Index(fields=['category', 'monthly_revenue', 'company'], name='rank_category_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.overall_rank} {self.company_id}"
+
+
+class RevenueSnapshot(models.Model):
+    """
+    One observed MRR figure for a company. Append-only: every verification
+    (and every manually reported figure) adds a row, nothing is ever updated.
+    """
+    SOURCE_CHOICES = IntegrationKey.PROVIDER_CHOICES + [
+        ("combined", "Several providers"),  # Sum over all of a company's integrations
+        ("manual", "Manual"),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='revenue_snapshots')
+    mrr = models.DecimalField(max_digits=15, decimal_places=2)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    is_verified = models.BooleanField(default=True)  # False for manually reported figures
+    recorded_at = models.DateTimeField()
+    added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'recorded_at'], name='snapshot_company_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id} {self.mrr} @ {self.recorded_at:%Y-%m-%d %H:%M}"
+
+
+class RevenueRollup(models.Model):
+    """
+    MRR of a company summarised per day, week (starting Monday) or month,
+    maintained incrementally from RevenueSnapshot by revenue.history.
+    """
+    GRANULARITY_CHOICES = [
+        ("day", "Day"),
+        ("week", "Week"),
+        ("month", "Month"),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='revenue_rollups')
+    granularity = models.CharField(max_length=5, choices=GRANULARITY_CHOICES)
+    period_start = models.DateField()
+    mrr = models.DecimalField(max_digits=15, decimal_places=2)  # Latest figure in the period
+    mrr_min = models.DecimalField(max_digits=15, decimal_places=2)
+    mrr_max = models.DecimalField(max_digits=15, decimal_places=2)
+    samples = models.PositiveIntegerField(default=0)
+    last_recorded_at = models.DateTimeField()  # recorded_at of the snapshot `mrr` came from
+
+    class Meta:
+        constraints = [
+            # Also the index for history range scans
+            models.UniqueConstraint(fields=['company', 'granularity', 'period_start'], name='rollup_company_period_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id} {self.granularity} {self.period_start}: {self.mrr}"
+
+
+class ImageAsset(models.Model):
+    """
+    An uploaded image, stored once per distinct content (named after its
+    SHA-256), and the thumbnails rendered from it for one preset. See
+    revenue.images.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),  # Gave up after IMAGE_PIPELINE['MAX_ATTEMPTS']
+    ]
+    sha256 = models.CharField(max_length=64)
+    preset = models.CharField(max_length=20)  # Key of revenue.images.PRESETS
+    original = models.CharField(max_length=255)  # Storage name of the uploaded file
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    thumbnails = models.JSONField(default=dict, blank=True)  # {"<width>": {"webp": name, "jpeg": name}}, once ready
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'preset'], name='image_asset_content_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='image_asset_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.original} ({self.preset}, {self.status})"
+
+
+class CategoryStats(models.Model):
+    """
+    Totals of the companies a category shows in the leaderboard. Kept up to
+    date incrementally by revenue.category_stats; averages and shares are
+    derived from the sums when read.
+    """
+    category = models.CharField(max_length=100, choices=Company.CATEGORY_CHOICES, unique=True)
+    companies = models.PositiveIntegerField(default=0)
+    verified = models.PositiveIntegerField(default=0)  # Companies with is_verified
+    total_mrr = models.DecimalField(max_digits=20, decimal_places=2, default=0.00)
+    growth_sum = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)  # Sum of mom_growth
+    median_mrr = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+
+    @property
+    def verified_share(self):
+        """Percentage of companies that are verified"""
+        return self.verified * Decimal(100) / self.companies if self.companies else Decimal(0)
+
+    @property
+    def average_growth(self):
+        return Decimal(self.growth_sum) / self.companies if self.companies else Decimal(0)
+
+    def __str__(self):
+        return f"{self.category}: {self.companies} companies"
@@ -1,14 +1,21 @@
 # Email Notification Tasks
-# This would typically use Celery for async, but for simplicity we'll use direct email
+# Emails are queued in the outbox (revenue/outbox.py) and sent by
+# `manage.py send_notifications`, which also runs schedule_ad_notifications()
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from . import outbox
+from .models import Advertisement
+
+EXPIRY_REMINDER_DAYS = getattr(settings, 'EMAIL_OUTBOX', {}).get('EXPIRY_REMINDER_DAYS', 2)
 
 ADMIN_EMAIL = 'admin@trustmrr.com'
-NOTIFICATION_FROM_EMAIL = 'noreply@trustmrr.com'
 
-def send_ad_confirmation_email(ad):
-    """Send confirmation email when ad is booked"""
-    from django.core.mail import send_mail
-    from django.template.loader import render_to_string
-    
+def ad_confirmation_email(ad):
+    """Confirmation email for a booked ad"""
     subject = f'✅ Your Ad on TrustMRR is Confirmed! (Slot: {ad.slot_id})'
     
     message = f"""
@@ -41,19 +48,11 @@ def send_ad_confirmation_email(ad):
     Best regards,
     TrustMRR Team
     """
-    
-    send_mail(
-        subject,
-        message,
-        NOTIFICATION_FROM_EMAIL,
-        [ad.owner.email],
-        fail_silently=True,
-    )
+    return outbox.email('ad_confirmation', ad.owner.email, subject, message, ad=ad)
 
-def send_ad_live_notification(ad):
-    """Send email when ad goes live"""
-    from django.core.mail import send_mail
-    
+def ad_live_email(ad, today=None):
+    """Email sent when an ad goes live"""
+    today = today or date.today()
     subject = f'🚀 Your Ad is Now LIVE on TrustMRR!'
     
     message = f"""
@@ -63,7 +62,7 @@ def send_ad_live_notification(ad):
     
     📊 Live Stats (Real-time):
     • Slot: {ad.slot_id}
-    • Duration: {ad.end_date - ad.start_date} days remaining
+    • Duration: {(ad.end_date - today).days + 1} days remaining
     • Target: {ad.target_url}
     
     📈 Track your performance:
@@ -74,27 +73,24 @@ def send_ad_live_notification(ad):
     Best regards,
     TrustMRR Team
     """
-    
-    send_mail(
-        subject,
-        message,
-        NOTIFICATION_FROM_EMAIL,
-        [ad.owner.email],
-        fail_silently=False,
-    )
+    return outbox.email('ad_live', ad.owner.email, subject, message, ad=ad)
 
-def send_expiry_reminder(ad, days_remaining):
-    """Send reminder before ad expires"""
-    from django.core.mail import send_mail
-    
-    subject = f'⏰ Your TrustMRR Ad Expires in {days_remaining} Days'
+def expiry_reminder_email(ad, days_remaining):
+    """Reminder sent shortly before an ad expires (days_remaining 0 is its last day)"""
+    if days_remaining == 0:
+        expires, remaining = 'Today', 'its last day'
+    elif days_remaining == 1:
+        expires, remaining = 'Tomorrow', '1 day'
+    else:
+        expires, remaining = f'in {days_remaining} Days', f'{days_remaining} days'
+    subject = f'⏰ Your TrustMRR Ad Expires {expires}'
     
     message  = f"""
     Hi {ad.owner.username},
     
     Your advertisement "{ad.title}" will expire soon.
     
-    ⏳ Time Remaining: {days_remaining} days
+    ⏳ Time Remaining: {remaining}
     📅 Expiry Date: {ad.end_date.strftime('%B %d, %Y')}
     
     Want to keep your ad running?
@@ -105,11 +101,48 @@ def send_expiry_reminder(ad, days_remaining):
     Best regards,
     TrustMRR Team
     """
-    
-    send_mail(
-        subject,
-        message,
-        NOTIFICATION_FROM_EMAIL,
-        [ad.owner.email],
-        fail_silently=True,
+    return outbox.email('ad_expiry', ad.owner.email, subject, message, ad=ad)
+
+
+def send_ad_confirmation_email(ad):
+    """Queue the booking confirmation for an ad"""
+    if ad.owner.email:
+        outbox.enqueue([ad_confirmation_email(ad)])
+    Advertisement.objects.filter(pk=ad.pk).update(confirmation_email_sent=True)
+    ad.confirmation_email_sent = True
+
+
+def schedule_ad_notifications(today=None):
+    """
+    Queue "now live" emails for ads that have started and expiry reminders
+    for ads ending within EXPIRY_REMINDER_DAYS, each at most once per ad.
+    Both lookups use the partial start_date/end_date indexes of the ads still
+    waiting for that email. Returns (live, reminders) queued.
+    """
+    today = today or date.today()
+    ads = Advertisement.objects.filter(is_active=True).select_related('owner')
+
+    live = _queue_once(
+        ads.filter(live_notification_sent=False, start_date__lte=today, end_date__gte=today),
+        'live_notification_sent', lambda ad: ad_live_email(ad, today),
+    )
+    reminders = _queue_once(
+        ads.filter(expiry_reminder_sent=False, end_date__range=(today, today + timedelta(days=EXPIRY_REMINDER_DAYS))),
+        'expiry_reminder_sent', lambda ad: expiry_reminder_email(ad, (ad.end_date - today).days),
     )
+    return live, reminders
+
+
+def _queue_once(ads, flag, build_email):
+    """
+    Queue build_email(ad) for each of `ads` and set `flag` on them in one
+    transaction, so an email is never queued without its flag or the other
+    way round. Rows another scheduler run has locked are left to it.
+    Returns how many emails were queued.
+    """
+    with transaction.atomic():
+        due = list(ads.select_for_update(skip_locked=True, of=('self',)))
+        emails = [build_email(ad) for ad in due if ad.owner.email]
+        outbox.enqueue(emails)
+        Advertisement.objects.filter(pk__in=[ad.pk for ad in due]).update(**{flag: True})
+    return len(emails)
@@ -0,0 +1,103 @@
+# Email outbox
+#
+# Requests only insert EmailOutbox rows; `manage.py send_notifications`
+# drains the table. Each drain claims a batch of due emails by pushing their
+# next_attempt_at LEASE seconds ahead (so concurrent workers skip them), sends
+# the batch over a single SMTP connection, then records every email as sent
+# or schedules a retry with exponential backoff. A worker that dies mid-batch
+# only delays its emails until the lease runs out, after which they are sent
+# again (delivery is at-least-once).
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+_config = getattr(settings, 'EMAIL_OUTBOX', {})
+BATCH_SIZE = _config.get('BATCH_SIZE', 100)  # Emails per SMTP connection
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 5)
+BACKOFF = _config.get('BACKOFF', 60)  # Seconds before the first retry
+LEASE = _config.get('LEASE', 300)  # Seconds
+
+
+def email(kind, to_email, subject, body, ad=None):
+    """An unsaved outbox row, due right away"""
+    return EmailOutbox(
+        kind=kind, ad=ad, to_email=to_email, subject=subject, body=body, next_attempt_at=timezone.now()
+    )
+
+
+def enqueue(emails):
+    return EmailOutbox.objects.bulk_create(emails)
+
+
+def claim(batch_size=BATCH_SIZE, now=None):
+    """
+    Take up to `batch_size` due emails for this worker. Claiming is a
+    conditional UPDATE rather than SELECT ... FOR UPDATE so it needs no
+    long-lived locks and works the same on SQLite.
+    """
+    now = now or timezone.now()
+    due = EmailOutbox.objects.filter(status='pending', next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    lease = now + timedelta(seconds=LEASE)
+    due.filter(id__in=ids).update(next_attempt_at=lease)
+    # Rows another worker claimed in between carry that worker's lease instead
+    return list(EmailOutbox.objects.filter(id__in=ids, status='pending', next_attempt_at=lease).order_by('id'))
+
+
+def _failed(outgoing, error, now):
+    outgoing.last_error = str(error) or error.__class__.__name__
+    if outgoing.attempts >= MAX_ATTEMPTS:
+        outgoing.status = 'failed'
+    else:
+        outgoing.next_attempt_at = now + timedelta(seconds=BACKOFF * 2 ** (outgoing.attempts - 1))
+
+
+def drain(batch_size=BATCH_SIZE, now=None):
+    """
+    Send one batch of due emails over one connection. Returns the number of
+    emails {'sent', 'retrying', 'failed'}; all zero when nothing was due.
+    """
+    now = now or timezone.now()
+    batch = claim(batch_size, now)
+    results = {'sent': 0, 'retrying': 0, 'failed': 0}
+    if not batch:
+        return results
+
+    for outgoing in batch:
+        outgoing.attempts += 1
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Couldn't reach the mail server: the whole batch waits for a retry
+        for outgoing in batch:
+            _failed(outgoing, e, now)
+    else:
+        try:
+            for outgoing in batch:
+                message = EmailMessage(
+                    outgoing.subject, outgoing.body, settings.DEFAULT_FROM_EMAIL, [outgoing.to_email],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as e:
+                    _failed(outgoing, e, now)
+                else:
+                    outgoing.status = 'sent'
+                    outgoing.sent_at = timezone.now()
+                    outgoing.last_error = ''
+        finally:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    for outgoing in batch:
+        results['retrying' if outgoing.status == 'pending' else outgoing.status] += 1
+    return results
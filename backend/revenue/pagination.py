@@ -0,0 +1,82 @@
+# Keyset (cursor) pagination for the leaderboard
+#
+# The leaderboard is ordered by (-monthly_revenue, -id). Instead of OFFSET,
+# each page ends with an opaque cursor holding the (monthly_revenue, id) of its
+# last row, and the next page starts strictly after that key. Every page is a
+# single index range scan, so page N costs the same as page 1.
+
+import base64
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_CURSOR_LENGTH = 64  # encode_cursor() of the largest revenue and id is well under this
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(monthly_revenue, company_id):
+    raw = f"{monthly_revenue}:{company_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the (monthly_revenue, id) key stored in a cursor"""
+    if len(cursor) > MAX_CURSOR_LENGTH:
+        raise InvalidCursor("Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        revenue, company_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        revenue, company_id = Decimal(revenue), int(company_id)
+    except (ValueError, InvalidOperation, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not revenue.is_finite():
+        raise InvalidCursor("Invalid cursor")
+    return revenue, company_id
+
+
+def normalize_cursor(cursor):
+    """
+    The canonical form of a client's cursor ("" for none), so equivalent
+    cursors share a cache key; raises InvalidCursor
+    """
+    return encode_cursor(*decode_cursor(cursor)) if cursor else ""
+
+
+def parse_page_size(value):
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("Invalid limit")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate_leaderboard(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, rows_fn=list):
+    """
+    Return (rows, next_cursor) for one leaderboard page.
+    `queryset` must not be ordered or sliced yet. `rows_fn` turns the page's
+    queryset into rows, either model instances or dicts (e.g. projection.public_rows).
+    """
+    if cursor:
+        revenue, company_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(monthly_revenue__lt=revenue) | Q(monthly_revenue=revenue, id__lt=company_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    rows = list(rows_fn(queryset.order_by("-monthly_revenue", "-id")[:page_size + 1]))
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last["monthly_revenue"], last["id"])
+        else:
+            next_cursor = encode_cursor(last.monthly_revenue, last.id)
+    return rows, next_cursor
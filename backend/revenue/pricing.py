@@ -1,54 +1,105 @@
+# Ad pricing
+#
+# Prices depend on the slot's demand, which lives precomputed in SlotDemand
+# (refreshed from signals.py when an ad is saved or deleted). The demand of
+# all slots is kept in process memory per response-cache version, so a price
+# or a whole price grid is plain arithmetic without a database round trip.
+
+import threading
 from datetime import date, timedelta
-from .models import Advertisement
 
-def calculate_dynamic_price(slot_id, weeks, start_date_str=None):
+from . import cache
+from .availability import SlotIntervals
+from .models import Advertisement, SlotDemand
+
+SLOT_IDS = [slot for slot, _ in Advertisement.SLOT_CHOICES]
+BASE_RATE = 5000  # INR per week
+DEMAND_WEEKS = 12  # Weeks ahead SlotDemand.weekly_occupancy covers
+
+_lock = threading.Lock()
+_demand = {'key': None, 'slots': {}}
+
+
+def refresh_demand(slot_ids=None, today=None):
+    """Recompute SlotDemand for `slot_ids` (default: all slots) with one query"""
+    today = today or date.today()
+    slot_ids = list(slot_ids or SLOT_IDS)
+    ranges = {slot: [] for slot in slot_ids}
+    ads = Advertisement.objects.filter(slot_id__in=slot_ids, is_active=True, end_date__gte=today)
+    for slot, start, end in ads.values_list('slot_id', 'start_date', 'end_date'):
+        ranges[slot].append((start, end))
+
+    rows = []
+    for slot, slot_ranges in ranges.items():
+        intervals = SlotIntervals(slot_ranges)
+        rows.append(SlotDemand(
+            slot_id=slot,
+            computed_on=today,
+            future_bookings=len(slot_ranges),
+            weekly_occupancy=[
+                intervals.booked_days(today + timedelta(weeks=week), today + timedelta(weeks=week + 1))
+                for week in range(DEMAND_WEEKS)
+            ],
+        ))
+    SlotDemand.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['slot_id'],
+        update_fields=['computed_on', 'future_bookings', 'weekly_occupancy'],
+    )
+    return {row.slot_id: row for row in rows}
+
+
+def load_demand(today=None):
+    """{slot_id: SlotDemand} for every slot, current as of `today`"""
+    today = today or date.today()
+    key = (cache.current_version(), today)
+    with _lock:
+        if _demand['key'] == key:
+            return _demand['slots']
+    slots = {row.slot_id: row for row in SlotDemand.objects.filter(computed_on=today)}
+    stale = [slot for slot in SLOT_IDS if slot not in slots]
+    if stale:
+        slots.update(refresh_demand(stale, today))
+    with _lock:
+        _demand.update(key=key, slots=slots)
+    return slots
+
+
+def quote(future_bookings, weeks, start=None, today=None):
     """
-    Calculate price based on demand, duration, and urgency.
+    Price based on demand, duration, and urgency.
     Base Price: ₹5,000 / week
     """
-    base_rate = 5000
-    
+    today = today or date.today()
+
     # 1. Demand Factor
-    # Count how many future bookings this slot has
-    future_bookings = Advertisement.objects.filter(
-        slot_id=slot_id,
-        end_date__gte=date.today()
-    ).count()
-    
     demand_multiplier = 1.0
     if future_bookings > 5:
         demand_multiplier = 1.5  # High demand: +50%
     elif future_bookings > 2:
         demand_multiplier = 1.2  # Medium demand: +20%
-        
+
     # 2. Duration Discount
     duration_discount = 1.0
     if weeks >= 8:
         duration_discount = 0.80 # 20% off
     elif weeks >= 4:
         duration_discount = 0.90 # 10% off
-        
+
     # 3. Urgency (Surge if booking last minute)
     urgency_multiplier = 1.0
-    if start_date_str:
-        try:
-            start = date.fromisoformat(start_date_str)
-            days_until = (start - date.today()).days
-            if days_until <= 2 and future_bookings > 0:
-                urgency_multiplier = 1.25 # Last minute premium
-        except:
-            pass
-            
+    if start and (start - today).days <= 2 and future_bookings > 0:
+        urgency_multiplier = 1.25 # Last minute premium
+
     # Calculate final weekly rate
-    weekly_rate = base_rate * demand_multiplier * urgency_multiplier * duration_discount
-    
+    weekly_rate = BASE_RATE * demand_multiplier * urgency_multiplier * duration_discount
+
     # Round to nearest 100
     weekly_rate = round(weekly_rate / 100) * 100
-    
+
     total_price = weekly_rate * weeks
-    
+
     return {
-        "base_rate": base_rate,
+        "base_rate": BASE_RATE,
         "final_weekly_rate": int(weekly_rate),
         "total_price": int(total_price),
         "applied_discounts": {
@@ -56,3 +107,31 @@ def calculate_dynamic_price(slot_id, weeks, start_date_str=None):
             "duration": f"{int((1-duration_discount)*100)}% off" if duration_discount < 1 else None
         }
     }
+
+
+def calculate_dynamic_price(slot_id, weeks, start_date_str=None):
+    """Price of booking `slot_id` for `weeks` weeks from `start_date_str` (YYYY-MM-DD)"""
+    demand = load_demand().get(slot_id)
+    try:
+        start = date.fromisoformat(start_date_str) if start_date_str else None
+    except (TypeError, ValueError):
+        start = None
+    return quote(demand.future_bookings if demand else 0, weeks, start)
+
+
+def price_grid(durations, starts, today=None):
+    """Prices of every slot for every duration (weeks) and start date, plus each slot's demand"""
+    today = today or date.today()
+    demand = load_demand(today)
+    grid = {}
+    for slot in SLOT_IDS:
+        bookings = demand[slot].future_bookings
+        grid[slot] = {
+            "future_bookings": bookings,
+            "weekly_occupancy": [round(days / 7 * 100, 1) for days in demand[slot].weekly_occupancy],
+            "prices": {
+                start.isoformat(): {str(weeks): quote(bookings, weeks, start, today) for weeks in durations}
+                for start in starts
+            },
+        }
+    return grid
@@ -0,0 +1,79 @@
+# Public projection of each company
+#
+# Company.public_data is the company as anyone but its owner may see it: the
+# CompanySerializer fields (formatted by serializers.company_list_rows, which
+# skips the serializer), with anonymous companies masked: no name, founder,
+# links, images or owner. It is computed whenever the company is
+# written, so the public endpoints (leaderboard pages, search, profile views
+# of other people's companies, neighbors, exports) serve stored records as
+# they are. The owner's own views keep serializing the row in full.
+#
+# Company saves refresh it through a post_save signal. Writes that bypass
+# signals (bulk_create, bulk_update, queryset.update) call refresh() on the
+# companies they touched. Image URLs are stored absolute, so after moving
+# MEDIA_URL run `manage.py rebuild_public_projections`.
+
+from . import serializers
+
+# What anonymous companies show in place of who they are
+ANONYMOUS = {
+    "name": "Anonymous Company",
+    "founder_name": "Anonymous",
+    "website": None,
+    "twitter_handle": None,
+    "logo": None,
+    "logo_url": None,
+    "founder_photo": None,
+    "logo_thumbnails": None,
+    "founder_photo_thumbnails": None,
+    "added_by": None,
+}
+BATCH_SIZE = 2000
+
+
+def public_projection(row):
+    """The public record of a company_list_rows() row"""
+    if row["is_anonymous"]:
+        row.update(ANONYMOUS)
+        row.pop("added_by_username", None)  # Absent without an owner, as in CompanySerializer
+    return row
+
+
+def public_rows(queryset):
+    """The public records of `queryset`, for paginate_leaderboard's rows_fn"""
+    return queryset.values_list('public_data', flat=True)
+
+
+def refresh(queryset, batch_size=BATCH_SIZE):
+    """Recompute public_data of every company in `queryset`. Returns how many were written."""
+    model = queryset.model
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    chunk = []
+    written = 0
+    for company_id in ids.iterator(chunk_size=batch_size):
+        chunk.append(company_id)
+        if len(chunk) >= batch_size:
+            written += _write(model, chunk)
+            chunk = []
+    if chunk:
+        written += _write(model, chunk)
+    return written
+
+
+def _write(model, ids):
+    companies = [
+        model(pk=row["id"], public_data=public_projection(row))
+        for row in serializers.company_list_rows(model.objects.filter(pk__in=ids))
+    ]
+    model.objects.bulk_update(companies, ['public_data'])
+    return len(companies)
+
+
+def neighbor_cards(companies):
+    """Cards (serializers.NEIGHBOR_FIELDS) of ranked companies, from their public records"""
+    cards = []
+    for company in companies:
+        card = {field: company.public_data.get(field) for field in serializers.NEIGHBOR_FIELDS}
+        card["rank"] = company.leaderboard_rank.overall_rank
+        cards.append(card)
+    return cards
@@ -0,0 +1,416 @@
+# Revenue providers (Stripe, Razorpay, PayPal)
+#
+# Each provider talks to its REST API through one pooled requests.Session and
+# pages through results with generators, so nothing is capped at the first
+# 100 transactions. Credentials travel with every request, which keeps the
+# providers safe to use from many threads at once.
+#
+# Revenue is synced incrementally: an IntegrationKey remembers how far it has
+# been synced (sync_cursor) and per-day totals for the last SYNC_DAYS days
+# (daily_revenue), so later syncs only pull transactions created since the
+# cursor. Windows are half-open, [start, end), so consecutive syncs never
+# count a transaction twice.
+#
+# API base URLs come from settings.REVENUE_PROVIDER_API_BASES so everything can
+# be pointed at local stub servers (see `manage.py run_stub_providers`).
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_BASES = {
+    'stripe': 'https://api.stripe.com',
+    'razorpay': 'https://api.razorpay.com',
+    'paypal': 'https://api-m.sandbox.paypal.com',  # Use sandbox for testing
+}
+API_BASES = {**DEFAULT_API_BASES, **getattr(settings, 'REVENUE_PROVIDER_API_BASES', {})}
+REQUEST_TIMEOUT = 30  # Seconds
+POOL_SIZE = 32  # Keep-alive connections per provider
+ASYNC_THREADS = getattr(settings, 'REVENUE_PROVIDER_ASYNC_THREADS', 64)  # Threads making calls for sync_async()
+
+SYNC_DAYS = 60  # Two 30-day windows: this month and the one before, for growth
+MONTH_DAYS = 30
+
+_executor = ThreadPoolExecutor(max_workers=ASYNC_THREADS, thread_name_prefix='revenue-provider')
+
+
+class ProviderError(Exception):
+    pass
+
+
+class InvalidCredentials(ProviderError):
+    pass
+
+
+class RateLimited(ProviderError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds, if the provider said
+
+
+class RevenueFigures(namedtuple('RevenueFigures', ['monthly_revenue', 'previous_revenue'])):
+    """Revenue for the last 30 days and the 30 days before that"""
+
+    @property
+    def growth(self):
+        if not self.previous_revenue:
+            return 0
+        return ((self.monthly_revenue - self.previous_revenue) / self.previous_revenue) * 100
+
+
+Transaction = namedtuple('Transaction', ['id', 'amount', 'created'])
+
+# Subscription billing periods as a fraction of a month
+MONTHLY_FACTORS = {'day': 365 / 12, 'week': 52 / 12, 'month': 1, 'year': 1 / 12}
+
+
+def _monthly(amount, period, interval_count=1):
+    return amount * MONTHLY_FACTORS.get(period, 1) / (interval_count or 1)
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_body(response):
+    try:
+        return response.json().get('error') or {}
+    except ValueError:
+        return {}
+
+
+class RevenueProvider:
+    """
+    A payment provider. Subclasses implement transactions() and, where the
+    provider has subscriptions, subscriptions_mrr(); sync() turns those into
+    revenue figures.
+    """
+
+    name = None
+    label = None
+    # How long after creation a transaction is guaranteed to show up in the
+    # API. Syncs stop this far short of now so late arrivals aren't skipped.
+    settle_delay = timedelta(0)
+
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    @classmethod
+    def session(cls):
+        with cls._sessions_lock:
+            if cls.name not in cls._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls._sessions[cls.name] = session
+            return cls._sessions[cls.name]
+
+    def request(self, method, path, **kwargs):
+        try:
+            response = self.session().request(
+                method, f'{API_BASES[self.name]}{path}', timeout=REQUEST_TIMEOUT, **kwargs
+            )
+        except requests.exceptions.RequestException as e:
+            raise ProviderError(f"{self.label} API error: {str(e)}")
+        if response.status_code == 429:
+            raise RateLimited(f"{self.label} rate limit", _retry_after(response.headers))
+        if response.status_code >= 500:
+            # Upstream trouble is as retryable as a rate limit
+            raise RateLimited(f"{self.label} unavailable ({response.status_code})", _retry_after(response.headers))
+        return response
+
+    def transactions(self, start, end):
+        """Yield pages (lists of Transaction) of successful payments created in [start, end)"""
+        raise NotImplementedError
+
+    def subscriptions_mrr(self):
+        """Monthly recurring revenue of active subscriptions, 0 if there are none"""
+        return 0
+
+    def _plan(self, cursor, daily_revenue, now):
+        """(daily totals still in range, window start, window end, first day of this month)"""
+        now = (now or datetime.now(timezone.utc)).replace(microsecond=0)
+        today = now.date()
+        oldest = (today - timedelta(days=SYNC_DAYS - 1)).isoformat()
+        this_month = (today - timedelta(days=MONTH_DAYS - 1)).isoformat()
+
+        # ISO dates compare correctly as strings
+        daily = {day: amount for day, amount in (daily_revenue or {}).items() if day >= oldest}
+        start = datetime.fromisoformat(oldest).replace(tzinfo=timezone.utc)
+        if cursor and cursor > start:
+            start = cursor
+        end = max(start, now - self.settle_delay)
+        return daily, start, end, this_month
+
+    def _collect(self, start, end):
+        """Per-day totals of the transactions created in [start, end)"""
+        daily = {}
+        if end > start:
+            for page in self.transactions(start, end):
+                for txn in page:
+                    day = txn.created.astimezone(timezone.utc).date().isoformat()
+                    daily[day] = round(daily.get(day, 0) + txn.amount, 2)
+        return daily
+
+    @staticmethod
+    def _figures(daily, this_month, mrr):
+        total_revenue = sum(amount for day, amount in daily.items() if day >= this_month)
+        previous_revenue = sum(amount for day, amount in daily.items() if day < this_month)
+
+        # Use MRR if available, otherwise use total revenue
+        monthly_revenue = mrr if mrr > 0 else total_revenue
+        return RevenueFigures(round(monthly_revenue, 2), round(previous_revenue, 2))
+
+    @staticmethod
+    def _merge(daily, *collected):
+        daily = dict(daily)
+        for totals in collected:
+            for day, amount in totals.items():
+                daily[day] = round(daily.get(day, 0) + amount, 2)
+        return daily
+
+    def sync(self, cursor=None, daily_revenue=None, now=None):
+        """
+        Pull transactions created since `cursor` into the per-day totals and
+        work out the revenue figures. Returns (figures, cursor, daily totals);
+        the arguments are left untouched, so a failed sync changes nothing.
+        """
+        daily, start, end, this_month = self._plan(cursor, daily_revenue, now)
+        daily = self._merge(daily, self._collect(start, end))
+        return self._figures(daily, this_month, self.subscriptions_mrr()), end, daily
+
+    async def sync_async(self, cursor=None, daily_revenue=None, now=None):
+        """
+        sync() for async views: the previous month's and this month's
+        transactions and the subscriptions are fetched concurrently, on
+        worker threads, so the event loop never waits on the provider.
+        """
+        daily, start, end, this_month = self._plan(cursor, daily_revenue, now)
+        # Split the window at the month boundary (a day boundary, so no day's total is split)
+        boundary = min(max(start, datetime.fromisoformat(this_month).replace(tzinfo=timezone.utc)), end)
+        loop = asyncio.get_running_loop()
+        previous, current, mrr = await asyncio.gather(
+            loop.run_in_executor(_executor, self._collect, start, boundary),
+            loop.run_in_executor(_executor, self._collect, boundary, end),
+            loop.run_in_executor(_executor, self.subscriptions_mrr),
+        )
+        daily = self._merge(daily, previous, current)
+        return self._figures(daily, this_month, mrr), end, daily
+
+
+class StripeProvider(RevenueProvider):
+    name = 'stripe'
+    label = 'Stripe'
+    page_size = 100
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def get(self, path, params):
+        response = self.request('GET', path, params=params, headers={'Authorization': f'Bearer {self.api_key}'})
+        if response.status_code == 401:
+            raise InvalidCredentials("Invalid Stripe API key")
+        if response.status_code != 200:
+            raise ProviderError(f"Stripe API error: {_error_body(response).get('message', response.text)}")
+        return response.json()
+
+    def pages(self, path, params):
+        params = {**params, 'limit': self.page_size}
+        while True:
+            body = self.get(path, params)
+            yield body['data']
+            if not body.get('has_more') or not body['data']:
+                return
+            params['starting_after'] = body['data'][-1]['id']
+
+    def transactions(self, start, end):
+        params = {'created[gte]': int(start.timestamp()), 'created[lt]': int(end.timestamp())}
+        for charges in self.pages('/v1/charges', params):
+            yield [
+                Transaction(charge['id'], charge['amount'] / 100,  # Convert from cents
+                            datetime.fromtimestamp(charge['created'], timezone.utc))
+                for charge in charges if charge['paid']
+            ]
+
+    def subscriptions_mrr(self):
+        mrr = 0
+        for subscriptions in self.pages('/v1/subscriptions', {'status': 'active'}):
+            for sub in subscriptions:
+                for item in sub.get('items', {}).get('data', []):
+                    # Prices carry the billing period under `recurring`, legacy plans inline
+                    price = item.get('price') or item.get('plan') or {}
+                    recurring = price.get('recurring') or price
+                    amount = price.get('unit_amount', price.get('amount')) or 0
+                    mrr += _monthly(amount * (item.get('quantity') or 1),
+                                    recurring.get('interval'), recurring.get('interval_count'))
+        return mrr / 100
+
+
+class RazorpayProvider(RevenueProvider):
+    name = 'razorpay'
+    label = 'Razorpay'
+    page_size = 100
+    periods = {'daily': 'day', 'weekly': 'week', 'monthly': 'month', 'yearly': 'year'}
+
+    def __init__(self, api_key, api_secret):
+        self.auth = (api_key, api_secret)
+
+    def get(self, path, params=None):
+        response = self.request('GET', path, params=params, auth=self.auth)
+        if response.status_code == 200:
+            return response.json()
+        description = _error_body(response).get('description', response.text)
+        if response.status_code == 401 or 'authentication' in description.lower():
+            raise InvalidCredentials("Invalid Razorpay credentials")
+        raise ProviderError(f"Razorpay API error: {description}")
+
+    def pages(self, path, params):
+        skip = 0
+        while True:
+            items = self.get(path, {**params, 'count': self.page_size, 'skip': skip})['items']
+            yield items
+            if len(items) < self.page_size:
+                return
+            skip += len(items)
+
+    def transactions(self, start, end):
+        # Razorpay's `to` is inclusive
+        params = {'from': int(start.timestamp()), 'to': int(end.timestamp()) - 1}
+        for payments in self.pages('/v1/payments', params):
+            yield [
+                Transaction(payment['id'], payment['amount'] / 100,  # Razorpay amounts are in paise
+                            datetime.fromtimestamp(payment['created_at'], timezone.utc))
+                for payment in payments if payment['status'] == 'captured'
+            ]
+
+    def subscriptions_mrr(self):
+        # Subscriptions only reference their plan, which holds the amount and period
+        plans = {}
+        mrr = 0
+        for subscriptions in self.pages('/v1/subscriptions', {}):
+            for sub in subscriptions:
+                if sub['status'] != 'active':
+                    continue
+                if sub['plan_id'] not in plans:
+                    plans[sub['plan_id']] = self.get(f"/v1/plans/{sub['plan_id']}")
+                plan = plans[sub['plan_id']]
+                mrr += _monthly(plan['item']['amount'] * (sub.get('quantity') or 1),
+                                self.periods.get(plan['period']), plan.get('interval'))
+        return mrr / 100
+
+
+class PayPalProvider(RevenueProvider):
+    name = 'paypal'
+    label = 'PayPal'
+    page_size = 500
+    # Transactions take up to three hours to appear in the reporting API
+    settle_delay = timedelta(hours=3)
+    max_window = timedelta(days=31)  # Longest range the reporting API accepts
+
+    _tokens = {}
+    _tokens_lock = threading.Lock()
+
+    def __init__(self, client_id, client_secret):
+        self.auth = (client_id, client_secret)
+        self.token_key = hashlib.sha256(f'{client_id}:{client_secret}'.encode()).hexdigest()
+
+    def access_token(self):
+        """OAuth token for these credentials, reused until shortly before it expires"""
+        with self._tokens_lock:
+            token, expires = self._tokens.get(self.token_key, (None, 0))
+        if token and expires > time.monotonic():
+            return token
+
+        response = self.request(
+            'POST', '/v1/oauth2/token',
+            headers={'Accept': 'application/json', 'Accept-Language': 'en_US'},
+            auth=self.auth,
+            data={'grant_type': 'client_credentials'},
+        )
+        if response.status_code != 200:
+            raise InvalidCredentials("Invalid PayPal credentials")
+        body = response.json()
+        with self._tokens_lock:
+            self._tokens[self.token_key] = (body['access_token'], time.monotonic() + body.get('expires_in', 0) - 60)
+        return body['access_token']
+
+    def transactions(self, start, end):
+        headers = {'Authorization': f'Bearer {self.access_token()}', 'Content-Type': 'application/json'}
+        first = True
+        while start < end:
+            window_end = min(end, start + self.max_window)
+            page = 1
+            while True:
+                response = self.request('GET', '/v1/reporting/transactions', headers=headers, params={
+                    'start_date': start.strftime('%Y-%m-%dT%H:%M:%S+0000'),
+                    # end_date is inclusive
+                    'end_date': (window_end - timedelta(seconds=1)).strftime('%Y-%m-%dT%H:%M:%S+0000'),
+                    'fields': 'transaction_info',
+                    'page_size': self.page_size,
+                    'page': page,
+                })
+                if response.status_code == 403 and first:
+                    # Accounts without reporting access simply show no revenue
+                    return
+                if response.status_code == 401:
+                    raise InvalidCredentials("Invalid PayPal credentials")
+                if response.status_code != 200:
+                    # Anything past this page would be skipped for good, as
+                    # the cursor would move past it
+                    raise ProviderError(f"PayPal API error ({response.status_code}): {response.text[:200]}")
+                first = False
+                body = response.json()
+                yield [
+                    Transaction(
+                        info['transaction_id'],
+                        float(info['transaction_amount']['value']),
+                        datetime.strptime(info['transaction_initiation_date'], '%Y-%m-%dT%H:%M:%S%z'),
+                    )
+                    for info in (txn['transaction_info'] for txn in body.get('transaction_details', []))
+                    if info['transaction_status'] == 'S'  # Success
+                ]
+                if page >= body.get('total_pages', 1):
+                    break
+                page += 1
+            start = window_end
+
+
+def get_provider(integration):
+    """The RevenueProvider for an IntegrationKey's provider and credentials"""
+    if integration.provider == 'stripe':
+        return StripeProvider(integration.api_key)
+    if integration.provider == 'razorpay':
+        return RazorpayProvider(integration.api_key, integration.api_secret)
+    if integration.provider == 'paypal':
+        return PayPalProvider(integration.client_id, integration.client_secret)
+    raise ProviderError("Unknown provider")
+
+
+def sync_revenue(integration, full=False):
+    """
+    Bring an IntegrationKey's revenue up to date and return its figures. The
+    new sync state is set on the instance but not saved. `full` ignores the
+    stored state, e.g. when the credentials have just changed.
+    """
+    cursor, daily = (None, None) if full else (integration.sync_cursor, integration.daily_revenue)
+    figures, integration.sync_cursor, integration.daily_revenue = get_provider(integration).sync(cursor, daily)
+    return figures
+
+
+async def sync_revenue_async(integration, full=False):
+    """sync_revenue() for async views, see RevenueProvider.sync_async()"""
+    cursor, daily = (None, None) if full else (integration.sync_cursor, integration.daily_revenue)
+    figures, integration.sync_cursor, integration.daily_revenue = await get_provider(integration).sync_async(cursor, daily)
+    return figures
@@ -0,0 +1,228 @@
+# Materialized leaderboard ranks
+#
+# Ranks follow the leaderboard order (-monthly_revenue, -id). When a company's
+# revenue, category or visibility changes we only shift the ranks of the rows
+# between its old and new position, instead of re-sorting the whole table.
+#
+# Every change may shift any other company's rank, so they run one at a time:
+# each starts by locking the single LeaderboardRankLock row, the way bookings
+# lock their slot (see booking.py), and holds it until commit. Company saves
+# and deletes trigger them through signals (see signals.py), so admin, shell
+# and API edits all keep the ranks current; bulk writes, which send no
+# signals, call sync_company_rank() or rebuild_ranks() themselves. Saves that
+# change none of the rank inputs (a new tagline, say) don't take the lock.
+#
+# Percentiles follow from the rank and the total, so they are computed when
+# read rather than stored: storing them would rewrite every row whenever a
+# company joins or leaves the leaderboard.
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import category_stats
+from .models import Company, LeaderboardRank, LeaderboardRankLock
+
+
+def lock_ranks():
+    """Lock the ranks until the end of the current transaction"""
+    if not LeaderboardRankLock.objects.update(updates=F('updates') + 1):
+        # Lost, or a database created without the migration's row
+        LeaderboardRankLock.objects.get_or_create(pk=1)
+        LeaderboardRankLock.objects.update(updates=F('updates') + 1)
+
+
+def _ahead_of(monthly_revenue, company_id):
+    """Rows that sort before the (monthly_revenue, id) key on the leaderboard"""
+    return Q(monthly_revenue__gt=monthly_revenue) | Q(monthly_revenue=monthly_revenue, company_id__gt=company_id)
+
+
+def _insert_position(rows, rank_field, monthly_revenue, company_id, removed_rank=None):
+    """
+    Rank the key would take among `rows`. If the company currently sits at
+    `removed_rank` in `rows`, positions are computed as if it were removed.
+    """
+    previous = (
+        rows.filter(_ahead_of(monthly_revenue, company_id))
+        .exclude(company_id=company_id)
+        .order_by('monthly_revenue', 'company_id')
+        .values_list(rank_field, flat=True)
+        .first()
+    )
+    if previous is None:
+        return 1
+    if removed_rank is not None and previous > removed_rank:
+        previous -= 1
+    return previous + 1
+
+
+def _move(rows, rank_field, old_rank, new_rank):
+    """Shift the rows between old_rank and new_rank to make room for a moved row"""
+    if new_rank < old_rank:
+        rows.filter(**{f'{rank_field}__gte': new_rank, f'{rank_field}__lt': old_rank}).update(**{rank_field: F(rank_field) + 1})
+    elif new_rank > old_rank:
+        rows.filter(**{f'{rank_field}__gt': old_rank, f'{rank_field}__lte': new_rank}).update(**{rank_field: F(rank_field) - 1})
+
+
+def _remove(rows, rank_field, rank):
+    rows.filter(**{f'{rank_field}__gt': rank}).update(**{rank_field: F(rank_field) - 1})
+
+
+def _insert(rows, rank_field, rank):
+    rows.filter(**{f'{rank_field}__gte': rank}).update(**{rank_field: F(rank_field) + 1})
+
+
+def _total():
+    return LeaderboardRank.objects.order_by('-overall_rank').values_list('overall_rank', flat=True).first() or 0
+
+
+def _percentile(rank, total):
+    if not total:
+        return Decimal('0.00')
+    return Decimal((total - rank) * 100 / total).quantize(Decimal('0.01'))
+
+
+def _in_sync(entry, company, revenue):
+    if not company.show_in_leaderboard:
+        return entry is None
+    return entry is not None and entry.monthly_revenue == revenue and entry.category == company.category
+
+
+@transaction.atomic
+def sync_company_rank(company):
+    """
+    Bring the company's LeaderboardRank in line with its current revenue,
+    category and leaderboard visibility. No-op if none of them changed.
+    """
+    revenue = Decimal(str(company.monthly_revenue))
+    entry = LeaderboardRank.objects.filter(company_id=company.pk).first()
+    if _in_sync(entry, company, revenue):
+        return entry
+    lock_ranks()
+    entry = LeaderboardRank.objects.filter(company_id=company.pk).first()  # As of the lock
+    everyone = LeaderboardRank.objects.all()
+
+    if not company.show_in_leaderboard:
+        if entry:
+            _remove(everyone, 'overall_rank', entry.overall_rank)
+            _remove(everyone.filter(category=entry.category), 'category_rank', entry.category_rank)
+            entry.delete()
+            category_stats.refresh_medians([entry.category])
+        return None
+
+    if _in_sync(entry, company, revenue):
+        return entry
+
+    in_category = everyone.filter(category=company.category)
+
+    if entry is None:
+        overall_rank = _insert_position(everyone, 'overall_rank', revenue, company.pk)
+        category_rank = _insert_position(in_category, 'category_rank', revenue, company.pk)
+        _insert(everyone, 'overall_rank', overall_rank)
+        _insert(in_category, 'category_rank', category_rank)
+        entry = LeaderboardRank(company_id=company.pk, overall_rank=overall_rank, category_rank=category_rank)
+        previous_category = company.category
+    else:
+        others = everyone.exclude(company_id=company.pk)
+        overall_rank = _insert_position(everyone, 'overall_rank', revenue, company.pk, removed_rank=entry.overall_rank)
+        _move(others, 'overall_rank', entry.overall_rank, overall_rank)
+
+        if entry.category == company.category:
+            category_rank = _insert_position(in_category, 'category_rank', revenue, company.pk, removed_rank=entry.category_rank)
+            _move(others.filter(category=company.category), 'category_rank', entry.category_rank, category_rank)
+        else:
+            _remove(others.filter(category=entry.category), 'category_rank', entry.category_rank)
+            category_rank = _insert_position(in_category, 'category_rank', revenue, company.pk)
+            _insert(in_category, 'category_rank', category_rank)
+
+        previous_category = entry.category
+        entry.overall_rank = overall_rank
+        entry.category_rank = category_rank
+
+    entry.monthly_revenue = revenue
+    entry.category = company.category
+    entry.save()
+    category_stats.refresh_medians({previous_category, company.category})
+    return entry
+
+
+@transaction.atomic
+def remove_company_rank(company):
+    """Take a company off the materialized leaderboard (e.g. before deleting it)"""
+    lock_ranks()
+    entry = LeaderboardRank.objects.filter(company_id=company.pk).first()
+    if entry is None:
+        return
+    everyone = LeaderboardRank.objects.exclude(company_id=company.pk)
+    _remove(everyone, 'overall_rank', entry.overall_rank)
+    _remove(everyone.filter(category=entry.category), 'category_rank', entry.category_rank)
+    entry.delete()
+    category_stats.refresh_medians([entry.category])
+
+
+@transaction.atomic
+def rebuild_ranks():
+    """Recompute every rank from scratch. Returns the number of ranked companies."""
+    lock_ranks()
+    rows = (
+        Company.objects.filter(show_in_leaderboard=True)
+        .order_by('-monthly_revenue', '-id')
+        .values_list('id', 'monthly_revenue', 'category')
+    )
+    total = rows.count()
+    category_counts = {}
+    entries = []
+    for overall_rank, (company_id, revenue, category) in enumerate(rows.iterator(chunk_size=2000), start=1):
+        category_counts[category] = category_counts.get(category, 0) + 1
+        entries.append(LeaderboardRank(
+            company_id=company_id,
+            monthly_revenue=revenue,
+            category=category,
+            overall_rank=overall_rank,
+            category_rank=category_counts[category],
+        ))
+
+    LeaderboardRank.objects.all().delete()
+    LeaderboardRank.objects.bulk_create(entries, batch_size=2000)
+    category_stats.refresh_medians()
+    return total
+
+
+def rank_summary(company):
+    """Rank info for API responses, e.g. rank #412 of 9,800. None if not ranked."""
+    try:
+        entry = company.leaderboard_rank
+    except LeaderboardRank.DoesNotExist:
+        return None
+    category_total = (
+        LeaderboardRank.objects.filter(category=entry.category)
+        .order_by('-category_rank')
+        .values_list('category_rank', flat=True)
+        .first()
+    )
+    total = _total()
+    return {
+        "overall": entry.overall_rank,
+        "total": total,
+        "category": entry.category_rank,
+        "category_total": category_total,
+        "percentile": _percentile(entry.overall_rank, total),
+    }
+
+
+def neighbors(company, count=2):
+    """Companies ranked up to `count` places above and below `company`, in rank order"""
+    try:
+        rank = company.leaderboard_rank.overall_rank
+    except LeaderboardRank.DoesNotExist:
+        return Company.objects.none()
+    return (
+        Company.objects.filter(
+            leaderboard_rank__overall_rank__gte=rank - count,
+            leaderboard_rank__overall_rank__lte=rank + count,
+        )
+        .exclude(pk=company.pk)
+        .select_related('leaderboard_rank')
+        .order_by('leaderboard_rank__overall_rank')
+    )
@@ -0,0 +1,186 @@
+# Batched revenue re-verification for every company with an integration
+#
+# Companies are walked in id order, one batch at a time. Within a batch the
+# provider calls fan out over a thread pool, with a separate concurrency limit
+# per provider and exponential backoff when a provider rate-limits us. Results
+# are written back with a single bulk_update per batch and appended to the
+# revenue history. Syncs are incremental (see revenue/providers.py), so a run
+# only pulls transactions created since the previous one.
+
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import cache, category_stats, history, projection, ranking
+from .metrics import percentiles
+from .models import Company, IntegrationKey
+from .providers import ProviderError, RateLimited, sync_revenue
+
+DEFAULT_PROVIDER_CONCURRENCY = {'stripe': 8, 'razorpay': 4, 'paypal': 4}
+
+# Past this many changed companies one full rebuild is cheaper than shifting ranks one by one
+RANK_REBUILD_THRESHOLD = 200
+
+
+def _source(company):
+    providers = {key.provider for key in company.integrationkey_set.all()}
+    return providers.pop() if len(providers) == 1 else 'combined'
+
+
+class ProviderStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.retries = defaultdict(int)
+
+    def record(self, provider, seconds=None, error=False, retry=False):
+        with self.lock:
+            if seconds is not None:
+                self.latencies[provider].append(seconds)
+            if error:
+                self.errors[provider] += 1
+            if retry:
+                self.retries[provider] += 1
+
+    def report(self):
+        providers = set(self.latencies) | set(self.errors)
+        return {
+            provider: {
+                'calls': len(self.latencies[provider]),
+                'errors': self.errors[provider],
+                'retries': self.retries[provider],
+                **(percentiles(self.latencies[provider]) if self.latencies[provider] else {}),
+            }
+            for provider in sorted(providers)
+        }
+
+
+class Reverifier:
+    def __init__(self, batch_size=100, workers=16, provider_concurrency=None, max_retries=4,
+                 backoff_base=1.0, providers=None, log=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.providers = providers
+        self.log = log or (lambda message: None)
+        limits = {**DEFAULT_PROVIDER_CONCURRENCY, **(provider_concurrency or {})}
+        self.semaphores = {provider: threading.BoundedSemaphore(limit) for provider, limit in limits.items()}
+        self.stats = ProviderStats()
+
+    def _fetch(self, integration):
+        """Fetch one integration's figures, backing off while rate limited. None on failure."""
+        provider = integration.provider
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                with self.semaphores[provider]:
+                    figures = sync_revenue(integration)
+                self.stats.record(provider, time.perf_counter() - started)
+                return figures
+            except RateLimited as e:
+                self.stats.record(provider, retry=True)
+                if attempt == self.max_retries:
+                    break
+                delay = e.retry_after or self.backoff_base * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+            except (ProviderError, KeyError, ValueError) as e:
+                self.log(f"company {integration.company_id} ({provider}): {e}")
+                break
+            except Exception as e:
+                self.log(f"company {integration.company_id} ({provider}): unexpected error {e!r}")
+                break
+        self.stats.record(provider, error=True)
+        return None
+
+    def _batches(self):
+        companies = Company.objects.filter(integrationkey__isnull=False).distinct().order_by('id')
+        integrations = IntegrationKey.objects.order_by('id')
+        if self.providers:
+            companies = companies.filter(integrationkey__provider__in=self.providers)
+            integrations = integrations.filter(provider__in=self.providers)
+        last_id = 0
+        while True:
+            batch = list(
+                companies.filter(id__gt=last_id)
+                .prefetch_related(Prefetch('integrationkey_set', queryset=integrations))[:self.batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def run(self):
+        started = time.perf_counter()
+        changed = []
+        companies_seen = integrations_seen = verified = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in self._batches():
+                integrations = [key for company in batch for key in company.integrationkey_set.all()]
+                results = dict(zip((key.id for key in integrations), pool.map(self._fetch, integrations)))
+                companies_seen += len(batch)
+                integrations_seen += len(integrations)
+
+                now = timezone.now()
+                growth_baselines = history.baselines([company.id for company in batch])
+                updated = []
+                for company in batch:
+                    figures = [results[key.id] for key in company.integrationkey_set.all()]
+                    if not figures or any(f is None for f in figures):
+                        continue  # Keep the last verified figures rather than a partial total
+                    # A company with several processors earns the sum of them
+                    current = sum(f.monthly_revenue for f in figures)
+                    previous = sum(f.previous_revenue or 0 for f in figures)
+                    provider_growth = ((current - previous) / previous) * 100 if previous > 0 else 0
+
+                    old_revenue = company.monthly_revenue
+                    company.monthly_revenue = Decimal(str(round(current, 2)))
+                    company.mom_growth = history.growth(
+                        company.monthly_revenue, growth_baselines.get(company.id), fallback=round(provider_growth, 2)
+                    )
+                    company.last_verified_at = now
+                    company.updated_at = now  # auto_now isn't applied by bulk_update
+                    updated.append(company)
+                    if company.monthly_revenue != old_revenue:
+                        changed.append(company)
+
+                verified += len(updated)
+                Company.objects.bulk_update(updated, ['monthly_revenue', 'mom_growth', 'last_verified_at', 'updated_at'], batch_size=500)
+                projection.refresh(Company.objects.filter(pk__in=[company.pk for company in updated]))
+                # Keep the sync state of every integration that synced, even if a sibling failed
+                synced = [key for key in integrations if results[key.id] is not None]
+                IntegrationKey.objects.bulk_update(synced, ['sync_cursor', 'daily_revenue'], batch_size=500)
+                history.record_revenue_many(
+                    [(company, company.monthly_revenue) for company in updated], source=_source, recorded_at=now,
+                )
+                # bulk_update sends no signals, so invalidate cached responses ourselves
+                cache.bump_version()
+                self.log(f"batch up to company {batch[-1].id}: {len(updated)}/{len(batch)} verified")
+
+        if len(changed) > RANK_REBUILD_THRESHOLD:
+            ranking.rebuild_ranks()
+        else:
+            for company in changed:
+                ranking.sync_company_rank(company)
+        if verified:
+            # Revenue and growth were bulk-updated, past the category stats signals
+            category_stats.rebuild()
+
+        elapsed = time.perf_counter() - started
+        return {
+            'companies': companies_seen,
+            'integrations': integrations_seen,
+            'revenue_changed': len(changed),
+            'seconds': round(elapsed, 3),
+            'integrations_per_second': round(integrations_seen / elapsed, 2) if elapsed else 0,
+            'providers': self.stats.report(),
+        }
+
@@ -0,0 +1,257 @@
+# Company search
+#
+# Full-text search over name, tagline, description, founder_name and
+# twitter_handle, with facet counts and filters on category, country,
+# is_verified and monthly revenue. Matching and ranking are served by an index:
+#
+# - PostgreSQL: a GIN index (company_search_idx) on a weighted tsvector
+#   expression. Queries repeat the exact same expression, which is what lets
+#   the planner use the index.
+# - SQLite: an FTS5 external-content table (revenue_company_fts) that
+#   triggers keep in step with revenue_company.
+#
+# Other backends fall back to unranked icontains matching. Every word of the
+# query has to match, the last one as a prefix, so results narrow as the user
+# types. Anonymous companies are left out of text matches (a hit on their
+# name would tell who they are) and only show up when browsing by filters.
+# Hits are public records (see projection.py) plus their leaderboard rank, as
+# their position in the results says nothing about it.
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, connections
+from django.db.models import BooleanField, Count, FloatField, Q
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.expressions import RawSQL
+
+from .models import Company
+
+SEARCH_FIELDS = ['name', 'tagline', 'description', 'founder_name', 'twitter_handle']
+FACETS = ['category', 'country', 'is_verified']
+MAX_TERMS = 8
+MAX_PAGE = 100  # Deep OFFSETs get slow; nobody reads page 100 of search results
+
+FTS_TABLE = 'revenue_company_fts'
+INDEX_MIGRATION = '0020_company_search_index'
+# bm25() weight per FTS column, in SEARCH_FIELDS order
+FTS_WEIGHTS = '10.0, 4.0, 1.0, 4.0, 10.0'
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def tsvector_sql(table=''):
+    """
+    The weighted document PostgreSQL indexes and matches against: name and
+    handle (A), tagline and founder (B), description (C)
+    """
+    def text(*columns):
+        return " || ' ' || ".join(f"coalesce({table}{column}, '')" for column in columns)
+
+    return (
+        f"setweight(to_tsvector('simple'::regconfig, {text('name', 'twitter_handle')}), 'A') || "
+        f"setweight(to_tsvector('simple'::regconfig, {text('tagline', 'founder_name')}), 'B') || "
+        f"setweight(to_tsvector('simple'::regconfig, {text('description')}), 'C')"
+    )
+
+
+def _sqlite_index_sql():
+    columns = ', '.join(SEARCH_FIELDS)
+    new = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+    old = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+    delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='revenue_company', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON revenue_company BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON revenue_company BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON revenue_company "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def install_index(using='default'):
+    """
+    Create the search index for the `using` database. Idempotent: on SQLite
+    it also restores the triggers, which are lost whenever a migration
+    rebuilds revenue_company, and then re-syncs the FTS table.
+    """
+    db = connections[using]
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS company_search_idx ON revenue_company USING GIN (({tsvector_sql()}))")
+        elif db.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'revenue_company' "
+                "AND name LIKE %s", [f'{FTS_TABLE}_a_']
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            for statement in _sqlite_index_sql():
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def restore_index(using='default', **kwargs):
+    """post_migrate receiver: reinstall the index if its migration is applied"""
+    applied = MigrationRecorder(connections[using]).applied_migrations()
+    if ('revenue', INDEX_MIGRATION) in applied:
+        install_index(using)
+
+
+def drop_index(using='default'):
+    db = connections[using]
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS company_search_idx")
+        elif db.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search_terms(query):
+    """Words of the query, lowercased; punctuation (including @ and _) separates words"""
+    return re.findall(r'[^\W_]+', (query or '').lower())[:MAX_TERMS]
+
+
+def match(queryset, terms):
+    """
+    Return (queryset, rank): `queryset` narrowed to companies matching every
+    term and an expression scoring each match (higher is better), or None
+    when there is nothing to rank by.
+    """
+    if not terms:
+        return queryset, None
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(terms) + ':*'
+        document = tsvector_sql('revenue_company.')
+        return (
+            queryset.filter(RawSQL(
+                f"{document} @@ to_tsquery('simple'::regconfig, %s)", [tsquery], output_field=BooleanField()
+            )),
+            RawSQL(f"ts_rank_cd({document}, to_tsquery('simple'::regconfig, %s))", [tsquery], output_field=FloatField()),
+        )
+    if vendor == 'sqlite':
+        expression = ' '.join(f'"{term}"' for term in terms) + '*'
+        # A join rather than `id IN (subquery)`, so FTS5 evaluates the query
+        # once and bm25() (lower is better) is available for every row
+        return (
+            queryset.extra(
+                tables=[FTS_TABLE],
+                where=[f'{FTS_TABLE}.rowid = revenue_company.id', f'{FTS_TABLE} MATCH %s'],
+                params=[expression],
+            ),
+            RawSQL(f"-bm25({FTS_TABLE}, {FTS_WEIGHTS})", [], output_field=FloatField()),
+        )
+    for term in terms:
+        queryset = queryset.filter(Q(*[(f'{field}__icontains', term) for field in SEARCH_FIELDS], _connector=Q.OR))
+    return queryset, None
+
+
+def _decimal(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite():
+        raise InvalidSearch(f"{name} must be a number")
+    return number
+
+
+def _page(value):
+    if value in (None, ''):
+        return 1
+    try:
+        page = int(value)
+    except ValueError:
+        raise InvalidSearch("Invalid page")
+    if not 1 <= page <= MAX_PAGE:
+        raise InvalidSearch(f"page must be between 1 and {MAX_PAGE}")
+    return page
+
+
+def parse_filters(params):
+    """
+    Facet and range filters from query params: comma-separated `category` and
+    `country`, `verified=true|false`, `min_revenue` and `max_revenue`.
+    """
+    filters = {}
+    for facet in ('category', 'country'):
+        values = sorted({value for value in params.get(facet, '').split(',') if value and value != 'all'})
+        if values:
+            filters[facet] = values
+    verified = params.get('verified', '').lower()
+    if verified in ('true', '1'):
+        filters['is_verified'] = [True]
+    elif verified in ('false', '0'):
+        filters['is_verified'] = [False]
+    elif verified:
+        raise InvalidSearch("verified must be true or false")
+    filters['min_revenue'] = _decimal(params.get('min_revenue'), 'min_revenue')
+    filters['max_revenue'] = _decimal(params.get('max_revenue'), 'max_revenue')
+    filters['page'] = _page(params.get('page'))
+    return filters
+
+
+def _filtered(queryset, filters, skip=None):
+    for facet in FACETS:
+        if facet != skip and filters.get(facet):
+            queryset = queryset.filter(**{f'{facet}__in': filters[facet]})
+    if filters.get('min_revenue') is not None:
+        queryset = queryset.filter(monthly_revenue__gte=filters['min_revenue'])
+    if filters.get('max_revenue') is not None:
+        queryset = queryset.filter(monthly_revenue__lte=filters['max_revenue'])
+    return queryset
+
+
+def facet_counts(queryset, filters):
+    """
+    {facet: [{"value", "count"}]} with the most common values first. Each
+    facet is counted with every filter applied except its own, so the other
+    values of a facet stay visible once one of them is picked.
+    """
+    facets = {}
+    for facet in FACETS:
+        counts = _filtered(queryset, filters, skip=facet).values(facet).annotate(count=Count('id')).order_by()
+        facets[facet] = sorted(
+            ({"value": row[facet], "count": row['count']} for row in counts),
+            key=lambda entry: (-entry['count'], str(entry['value'])),
+        )
+    return facets
+
+
+def search(query, filters, page_size):
+    """One page of ranked results plus the total and the facet counts"""
+    terms = search_terms(query)
+    companies = Company.objects.filter(show_in_leaderboard=True)
+    if terms:
+        # The index holds their real name and founder; a match would give them away
+        companies = companies.filter(is_anonymous=False)
+    matches, rank = match(companies, terms)
+    results = _filtered(matches, filters)
+    page = results.order_by('-monthly_revenue', '-id')
+    if rank is not None:
+        page = page.annotate(rank=rank).order_by('-rank', '-monthly_revenue', '-id')
+
+    offset = (filters['page'] - 1) * page_size
+    rows = [
+        {**data, "rank": overall_rank, "category_rank": category_rank}
+        for data, overall_rank, category_rank in page[offset:offset + page_size + 1].values_list(
+            'public_data', 'leaderboard_rank__overall_rank', 'leaderboard_rank__category_rank',
+        )
+    ]
+    return {
+        "query": ' '.join(terms),
+        "total": results.count(),
+        "page": filters['page'],
+        "has_more": len(rows) > page_size,
+        "companies": rows[:page_size],
+        "facets": facet_counts(matches, filters),
+    }
@@ -1,13 +1,22 @@
 from rest_framework import serializers
-from .models import Company, Advertisement
+from .images import thumbnail_urls
+from .models import Advertisement, CategoryStats, Company
+
+
+def _asset_thumbnails(asset):
+    return thumbnail_urls(asset.thumbnails if asset else None)
+
 
 class CompanySerializer(serializers.ModelSerializer):
     added_by_username = serializers.CharField(source='added_by.username', read_only=True)
+    logo_thumbnails = serializers.SerializerMethodField()
+    founder_photo_thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = Company
         fields = [
             "id",
+            "slug",
             "name",
             "website",
             "founder_name",
@@ -29,12 +38,149 @@ class CompanySerializer(serializers.ModelSerializer):
             "founding_date",
             "country",
             "follower_count",
-            "estimated_mrr"
+            "estimated_mrr",
+            "logo_thumbnails",
+            "founder_photo_thumbnails",
         ]
-        read_only_fields = ['added_by', 'added_by_username']
+        read_only_fields = ['added_by', 'added_by_username', 'slug']
+
+    def get_logo_thumbnails(self, obj):
+        return _asset_thumbnails(obj.logo_asset)
+
+    def get_founder_photo_thumbnails(self, obj):
+        return _asset_thumbnails(obj.founder_photo_asset)
+
+# Compact card for the companies ranked around a profile (see projection.neighbor_cards)
+NEIGHBOR_FIELDS = [
+    "id",
+    "slug",
+    "name",
+    "tagline",
+    "category",
+    "logo",
+    "monthly_revenue",
+    "is_verified",
+    "is_anonymous",
+    "rank",
+    "logo_thumbnails",
+]
 
 class AdvertisementSerializer(serializers.ModelSerializer):
+    image_thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Advertisement
-        fields = '__all__'
+        exclude = ['image_asset', 'updated_at']
         read_only_fields = ['owner', 'amount_paid', 'payment_id', 'is_active', 'created_at']
+
+    def get_image_thumbnails(self, obj):
+        return _asset_thumbnails(obj.image_asset)
+
+
+
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    label = serializers.CharField(source='get_category_display', read_only=True)
+    verified_share = serializers.DecimalField(max_digits=5, decimal_places=2, read_only=True)  # Percent
+    average_growth = serializers.DecimalField(max_digits=7, decimal_places=2, read_only=True)  # Average mom_growth
+
+    class Meta:
+        model = CategoryStats
+        fields = [
+            "category",
+            "label",
+            "companies",
+            "verified",
+            "verified_share",
+            "total_mrr",
+            "median_mrr",
+            "average_growth",
+        ]
+
+# -------------------------------------------------------------------------
+# Rows of the public records
+# -------------------------------------------------------------------------
+# CompanySerializer builds a field tree and runs a to_representation() per
+# field per row, and follows added_by for every row. The public records
+# (projection.py) are rebuilt in bulk, by imports and batch re-verification
+# among others, so they are computed from plain column values instead
+# (username joined in the same query), formatted exactly like
+# CompanySerializer would. The output is identical to
+# CompanySerializer(many=True). List responses no longer format rows at all:
+# they serve the stored records, encoded with the C json encoder.
+
+import json
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+
+_LIST_COLUMNS = [
+    field for field in CompanySerializer.Meta.fields
+    if field not in ('added_by', 'added_by_username', 'logo_thumbnails', 'founder_photo_thumbnails')
+] + ['added_by_id', 'added_by__username', 'logo_asset__thumbnails', 'founder_photo_asset__thumbnails']
+
+_TWO_PLACES = Decimal('0.01')
+
+
+def _decimal(value):
+    return None if value is None else '{:f}'.format(value.quantize(_TWO_PLACES))
+
+
+def _datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def company_list_rows(queryset):
+    """
+    Yield one dict per company, formatted like CompanySerializer, from a
+    single query over just the columns it needs
+    """
+    media_base = default_storage.url('')
+
+    def image(name):
+        return media_base + filepath_to_uri(name) if name else None
+
+    for row in queryset.values(*_LIST_COLUMNS):
+        data = {
+            "id": row['id'],
+            "slug": row['slug'],
+            "name": row['name'],
+            "website": row['website'],
+            "founder_name": row['founder_name'],
+            "monthly_revenue": _decimal(row['monthly_revenue']),
+            "mom_growth": _decimal(row['mom_growth']),
+            "logo": image(row['logo']),
+            "logo_url": row['logo_url'],
+            "founder_photo": image(row['founder_photo']),
+            "category": row['category'],
+            "is_verified": row['is_verified'],
+            "last_verified_at": _datetime(row['last_verified_at']),
+            "show_in_leaderboard": row['show_in_leaderboard'],
+            "is_anonymous": row['is_anonymous'],
+            "added_by": row['added_by_id'],
+        }
+        # CompanySerializer leaves the key out entirely when there is no owner
+        if row['added_by_id'] is not None:
+            data["added_by_username"] = row['added_by__username']
+        data.update({
+            "description": row['description'],
+            "twitter_handle": row['twitter_handle'],
+            "tagline": row['tagline'],
+            "founding_date": row['founding_date'].isoformat() if row['founding_date'] else None,
+            "country": row['country'],
+            "follower_count": row['follower_count'],
+            "estimated_mrr": _decimal(row['estimated_mrr']),
+            "logo_thumbnails": thumbnail_urls(row['logo_asset__thumbnails']),
+            "founder_photo_thumbnails": thumbnail_urls(row['founder_photo_asset__thumbnails']),
+        })
+        yield data
+
+
+def render_json(data):
+    """Compact UTF-8 JSON, byte-for-byte what DRF's JSONRenderer produces"""
+    body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return body.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
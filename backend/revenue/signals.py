@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, category_stats, pricing, projection, ranking
+from .models import Advertisement, Company
+
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def refresh_slot_demand(sender, instance, **kwargs):
+    # Connected before invalidate_response_cache, so the new demand is stored
+    # before the version bump lets pricing.load_demand() read it again
+    transaction.on_commit(lambda: pricing.refresh_demand([instance.slot_id]), robust=True)
+
+
+@receiver(pre_save, sender=Company)
+def remember_category_contribution(sender, instance, **kwargs):
+    instance._category_contribution = (
+        None if instance._state.adding else category_stats.stored_contribution(instance.pk)
+    )
+
+
+@receiver(post_save, sender=Company)
+def update_category_stats(sender, instance, **kwargs):
+    category_stats.apply(getattr(instance, '_category_contribution', None), category_stats.contribution(instance))
+
+
+@receiver(post_save, sender=Company)
+def refresh_public_projection(sender, instance, **kwargs):
+    projection.refresh(Company.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Company)
+def sync_leaderboard_rank(sender, instance, raw=False, **kwargs):
+    if not raw:  # Fixtures are ranked by rebuild_leaderboard_ranks
+        ranking.sync_company_rank(instance)
+
+
+@receiver(pre_delete, sender=Company)
+def remove_leaderboard_rank(sender, instance, **kwargs):
+    # Before the delete cascades to the rank row, or the ranks below keep their gap
+    ranking.remove_company_rank(instance)
+
+
+@receiver(post_save, sender=User)
+def refresh_owner_name(sender, instance, update_fields=None, **kwargs):
+    # The public records carry the owner's username; logins only touch last_login
+    if update_fields is None or 'username' in update_fields:
+        projection.refresh(Company.objects.filter(added_by=instance))
+
+
+@receiver(post_delete, sender=Company)
+def remove_from_category_stats(sender, instance, **kwargs):
+    category_stats.apply(category_stats.contribution(instance), None)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+@receiver(post_save, sender=Advertisement)
+@receiver(post_delete, sender=Advertisement)
+def invalidate_response_cache(sender, **kwargs):
+    # Wait for the commit so nothing can re-cache the old rows under the new version
+    transaction.on_commit(cache.bump_version)
@@ -0,0 +1,169 @@
+# Local stand-ins for the Stripe, Razorpay and PayPal APIs
+#
+# Just enough of each API for revenue.providers to run against: a stable set
+# of transactions per credential, with the providers' own time filters and
+# pagination, optional latency, and a configurable share of 429 responses to
+# exercise backoff. Credentials containing "invalid" are rejected.
+# Start with `manage.py run_stub_providers` and point the app at it with
+# REVENUE_PROVIDER_STUB=http://127.0.0.1:<port>.
+
+import base64
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0, rate_limit=0.0, items=250, subscriptions=0, seed=0):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit  # Share of requests answered with 429
+        self.items = items  # Transactions per credential, spread over the last 90 days
+        self.subscriptions = subscriptions  # Active subscriptions per credential
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.started = int(time.time())
+
+    def should_rate_limit(self):
+        with self.lock:
+            return self.random.random() < self.rate_limit
+
+    def transactions(self, credential):
+        """Stable per-credential (id, created, amount in minor units), newest first"""
+        rnd = random.Random(zlib.crc32(credential.encode()))
+        rows = [
+            (f'{i:06d}', self.started - rnd.randint(0, 90 * 86400), rnd.randint(500, 50_000))
+            for i in range(self.items)
+        ]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def _window(rows, start, end):
+    """Rows created in [start, end]"""
+    return [row for row in rows if start <= row[1] <= end]
+
+
+def _first(params, name, default=None):
+    return params.get(name, [default])[0]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _credential(self):
+        auth = self.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            return auth[len('Bearer '):]
+        if auth.startswith('Basic '):
+            return base64.b64decode(auth[len('Basic '):]).decode(errors='replace')
+        return ''
+
+    def _handle(self):
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        if self.config.should_rate_limit():
+            return self._send(429, {'error': {'type': 'rate_limit_error', 'message': 'Too many requests'}},
+                              {'Retry-After': '0.05'})
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        credential = self._credential()
+        provider = url.path.split('/')[1]
+
+        if provider == 'paypal' and url.path != '/paypal/v1/oauth2/token':
+            credential = credential[len('token-'):]  # Requests after the token carry it instead
+        if 'invalid' in credential:
+            if provider == 'stripe':
+                return self._send(401, {'error': {'type': 'invalid_request_error', 'message': 'Invalid API Key provided'}})
+            if provider == 'razorpay':
+                return self._send(401, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Authentication failed'}})
+            return self._send(401, {'error': 'invalid_client'})
+
+        return self.route(provider, url.path, params, credential)
+
+    def route(self, provider, path, params, credential):
+        rows = self.config.transactions(credential)
+
+        if path == '/stripe/v1/charges':
+            rows = _window(rows, int(_first(params, 'created[gte]', 0)), int(_first(params, 'created[lt]', 2**40)) - 1)
+            after = _first(params, 'starting_after')
+            if after:
+                rows = rows[[f'ch_{row[0]}' for row in rows].index(after) + 1:]
+            limit = int(_first(params, 'limit', 10))
+            data = [{'id': f'ch_{id}', 'object': 'charge', 'amount': amount, 'paid': True, 'created': created}
+                    for id, created, amount in rows[:limit]]
+            return self._send(200, {'object': 'list', 'url': '/v1/charges', 'has_more': len(rows) > limit, 'data': data})
+        if path == '/stripe/v1/subscriptions':
+            data = [{'id': f'sub_{i}', 'object': 'subscription', 'status': 'active', 'items': {'data': [
+                {'quantity': 1, 'price': {'unit_amount': 2900, 'recurring': {'interval': 'month', 'interval_count': 1}}},
+            ]}} for i in range(self.config.subscriptions)]
+            return self._send(200, {'object': 'list', 'url': '/v1/subscriptions', 'has_more': False, 'data': data})
+
+        if path.startswith('/razorpay/v1/'):
+            count, skip = int(_first(params, 'count', 10)), int(_first(params, 'skip', 0))
+        if path == '/razorpay/v1/payments':
+            rows = _window(rows, int(_first(params, 'from', 0)), int(_first(params, 'to', 2**40)))
+            items = [{'id': f'pay_{id}', 'entity': 'payment', 'amount': amount, 'status': 'captured', 'created_at': created}
+                     for id, created, amount in rows[skip:skip + count]]
+            return self._send(200, {'entity': 'collection', 'count': len(items), 'items': items})
+        if path == '/razorpay/v1/subscriptions':
+            items = [{'id': f'sub_{i}', 'entity': 'subscription', 'plan_id': 'plan_monthly', 'quantity': 1, 'status': 'active'}
+                     for i in range(self.config.subscriptions)][skip:skip + count]
+            return self._send(200, {'entity': 'collection', 'count': len(items), 'items': items})
+        if path.startswith('/razorpay/v1/plans/'):
+            return self._send(200, {'id': path.rsplit('/', 1)[-1], 'entity': 'plan', 'period': 'monthly', 'interval': 1,
+                                    'item': {'amount': 249900, 'currency': 'INR'}})
+
+        if path == '/paypal/v1/oauth2/token':
+            return self._send(200, {'access_token': f'token-{credential}', 'token_type': 'Bearer', 'expires_in': 32400})
+        if path == '/paypal/v1/reporting/transactions':
+            start = datetime.strptime(_first(params, 'start_date'), '%Y-%m-%dT%H:%M:%S%z').timestamp()
+            end = datetime.strptime(_first(params, 'end_date'), '%Y-%m-%dT%H:%M:%S%z').timestamp()
+            if end - start > 31 * 86400:
+                return self._send(400, {'name': 'INVALID_REQUEST', 'message': 'Date range is greater than 31 days'})
+            rows = _window(rows, start, end)
+            page, page_size = int(_first(params, 'page', 1)), int(_first(params, 'page_size', 100))
+            details = [{'transaction_info': {
+                'transaction_id': f'txn_{id}',
+                'transaction_status': 'S',
+                'transaction_initiation_date': datetime.fromtimestamp(created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+0000'),
+                'transaction_amount': {'currency_code': 'USD', 'value': f'{amount / 100:.2f}'},
+            }} for id, created, amount in rows[(page - 1) * page_size:page * page_size]]
+            total_pages = max(1, -(-len(rows) // page_size))
+            return self._send(200, {'transaction_details': details, 'page': page, 'total_pages': total_pages})
+
+        return self._send(404, {'error': f'No stub for {path}'})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+def make_server(port=8765, config=None):
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config or StubConfig()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(port=8765, config=None):
+    """Start the stub server in a background thread and return it"""
+    server = make_server(port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,3 +1,1237 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import statistics
+import tempfile
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    ad_counters, availability, cache, category_stats, history, images, importing, metrics, notifications, outbox,
+    projection, ranking, reverify,
+)
+from .middleware import RequestMetricsMiddleware
+from .models import (
+    GENERIC_SLUG, AdStatDaily, AdStatHourly, Advertisement, CategoryStats, Company, EmailOutbox, ImageAsset,
+    IntegrationKey,
+    LeaderboardRank, LeaderboardRankLock, RevenueSnapshot, SlotDemand,
+)
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .providers import (
+    PayPalProvider, ProviderError, RateLimited, RazorpayProvider, RevenueFigures, RevenueProvider, StripeProvider,
+)
+from .serializers import CompanySerializer, company_list_rows, render_json
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = str(self.body)
+        self.headers = {}
+
+    def json(self):
+        return self.body
+
+
+def paypal_page(total_pages, *transactions):
+    return FakeResponse(200, {
+        'total_pages': total_pages,
+        'transaction_details': [
+            {'transaction_info': {
+                'transaction_id': txn_id,
+                'transaction_amount': {'value': str(amount)},
+                'transaction_initiation_date': created.strftime('%Y-%m-%dT%H:%M:%S+0000'),
+                'transaction_status': 'S',
+            }}
+            for txn_id, amount, created in transactions
+        ],
+    })
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        for key in ((Decimal("1234.50"), 42), (Decimal("0.00"), 1), (Decimal("99999999999.99"), 10 ** 9)):
+            self.assertEqual(decode_cursor(encode_cursor(*key)), key)
+
+    def test_cursors_are_url_safe(self):
+        self.assertRegex(encode_cursor(Decimal("1.01"), 7), r'^[A-Za-z0-9_-]+$')
+
+    def test_garbage_is_rejected(self):
+        for cursor in ("", "!!", "bm90LWEta2V5", encode_cursor("abc", 1), encode_cursor(Decimal(1), "x")):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class PayPalSyncTests(SimpleTestCase):
+    now = datetime(2026, 3, 15, 12, tzinfo=timezone.utc)
+
+    def sync(self, *responses, cursor=None, daily=None):
+        provider = PayPalProvider('client', 'secret')
+        with mock.patch.object(PayPalProvider, 'access_token', return_value='token'), \
+                mock.patch.object(PayPalProvider, 'request', side_effect=list(responses)):
+            return provider.sync(cursor=cursor, daily_revenue=daily, now=self.now)
+
+    def test_pages_are_summed_per_day(self):
+        created = self.now - timedelta(days=2)
+        figures, cursor, daily = self.sync(
+            paypal_page(2, ('a', 10, created)),
+            paypal_page(2, ('b', 5.5, created)),
+            paypal_page(1),  # Second 31-day window
+        )
+        self.assertEqual(daily, {created.date().isoformat(): 15.5})
+        self.assertEqual(cursor, self.now - PayPalProvider.settle_delay)
+
+    def test_failed_later_page_raises_instead_of_advancing_the_cursor(self):
+        created = self.now - timedelta(days=2)
+        with self.assertRaises(ProviderError):
+            self.sync(paypal_page(2, ('a', 10, created)), FakeResponse(400, {'message': 'bad page'}))
+
+    def test_no_reporting_access_shows_no_revenue(self):
+        figures, cursor, daily = self.sync(FakeResponse(403))
+        self.assertEqual(daily, {})
+        self.assertEqual(figures.monthly_revenue, 0)
+
+    def test_forbidden_after_the_first_page_is_an_error(self):
+        created = self.now - timedelta(days=2)
+        with self.assertRaises(ProviderError):
+            self.sync(paypal_page(2, ('a', 10, created)), FakeResponse(403))
+
+
+def stripe_api(charges):
+    """RevenueProvider.request stand-in serving `charges` [(id, cents, created, paid)] like Stripe"""
+    def request(provider, method, path, params=None, **kwargs):
+        if path == '/v1/charges':
+            data = [
+                {'id': charge_id, 'amount': cents, 'created': int(created.timestamp()), 'paid': paid}
+                for charge_id, cents, created, paid in charges
+                if params['created[gte]'] <= created.timestamp() < params['created[lt]']
+            ]
+        else:
+            data = []  # No subscriptions
+        return FakeResponse(200, {'data': data, 'has_more': False})
+    return request
+
+
+def razorpay_api(payments):
+    """RevenueProvider.request stand-in serving `payments` [(id, paise, created, status)] like Razorpay"""
+    def request(provider, method, path, params=None, **kwargs):
+        if path == '/v1/payments':
+            items = [
+                {'id': payment_id, 'amount': paise, 'created_at': int(created.timestamp()), 'status': status}
+                for payment_id, paise, created, status in payments
+                if params['from'] <= created.timestamp() <= params['to']
+            ]
+            items = items[params['skip']:params['skip'] + params['count']]
+        else:
+            items = []
+        return FakeResponse(200, {'items': items})
+    return request
+
+
+class IncrementalSyncTests(SimpleTestCase):
+    now = datetime(2026, 3, 15, 12, tzinfo=timezone.utc)
+
+    def sync(self, provider, api, cursor=None, daily=None, now=None):
+        with mock.patch.object(RevenueProvider, 'request', autospec=True, side_effect=api) as request:
+            result = provider.sync(cursor=cursor, daily_revenue=daily, now=now or self.now)
+        return result, [call.kwargs.get('params') for call in request.call_args_list]
+
+    def test_stripe_syncs_only_charges_since_the_cursor(self):
+        charges = [
+            ('ch_old', 10000, self.now - timedelta(days=40), True),
+            ('ch_new', 5000, self.now - timedelta(days=2), True),
+            ('ch_failed', 7000, self.now - timedelta(days=1), False),
+            ('ch_expired', 9900, self.now - timedelta(days=90), True),
+        ]
+        (figures, cursor, daily), _ = self.sync(StripeProvider('sk_test'), stripe_api(charges))
+        self.assertEqual(figures, (50, 100))
+        self.assertEqual(cursor, self.now)
+
+        charges.append(('ch_later', 2500, self.now + timedelta(hours=1), True))
+        (figures, cursor, daily), calls = self.sync(
+            StripeProvider('sk_test'), stripe_api(charges), cursor, daily, self.now + timedelta(hours=2),
+        )
+        self.assertEqual(calls[0]['created[gte]'], int(self.now.timestamp()))  # Only the new window
+        self.assertEqual(figures, (75, 100))
+        self.assertEqual(daily[(self.now - timedelta(days=2)).date().isoformat()], 50)
+
+    def test_razorpay_pages_and_syncs_incrementally(self):
+        payments = [
+            (f'pay_{i}', 10000, self.now - timedelta(days=1, minutes=i), 'captured') for i in range(3)
+        ] + [('pay_failed', 10000, self.now - timedelta(days=1), 'failed')]
+        with mock.patch.object(RazorpayProvider, 'page_size', 2):
+            (figures, cursor, daily), calls = self.sync(RazorpayProvider('rzp_key', 'secret'), razorpay_api(payments))
+            self.assertEqual(figures.monthly_revenue, 300)
+            # Four payments (one failed) in pages of two, then an empty page
+            self.assertEqual([params['skip'] for params in calls if 'from' in params], [0, 2, 4])
+
+            payments.append(('pay_later', 4000, self.now, 'captured'))  # Exactly at the cursor
+            later = self.now + timedelta(hours=1)
+            (figures, cursor, daily), calls = self.sync(
+                RazorpayProvider('rzp_key', 'secret'), razorpay_api(payments), cursor, daily, later,
+            )
+        self.assertEqual(calls[0]['from'], int(self.now.timestamp()))
+        self.assertEqual(figures.monthly_revenue, 340)
+
+
+class IntegrationViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('founder')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.recent = datetime.now(timezone.utc) - timedelta(days=2)
+
+    def post(self, url, data, api):
+        with mock.patch.object(RevenueProvider, 'request', autospec=True, side_effect=api) as request:
+            response = self.client.post(url, data, content_type='application/json', **self.auth)
+        return response, [call.kwargs.get('params') for call in request.call_args_list]
+
+    def test_verifying_stores_the_sync_state(self):
+        response, _ = self.post("/api/revenue/integrations/razorpay/", {
+            'api_key': 'rzp_key', 'api_secret': 'secret', 'company_name': "Acme",
+        }, razorpay_api([('pay_1', 120000, self.recent, 'captured')]))
+        self.assertEqual(response.status_code, 200)
+        company = Company.objects.get(pk=response.json()['company_id'])
+        self.assertEqual(
+            (company.monthly_revenue, company.is_verified, company.added_by), (Decimal('1200.00'), True, self.user),
+        )
+        integration = IntegrationKey.objects.get(company=company)
+        self.assertIsNotNone(integration.sync_cursor)
+        self.assertEqual(integration.daily_revenue, {self.recent.date().isoformat(): 1200})
+
+    def test_refresh_resyncs_from_scratch(self):
+        response, _ = self.post("/api/revenue/integrations/stripe/", {'api_key': 'sk_old', 'company_name': "Acme"},
+                                stripe_api([('ch_1', 5000, self.recent, True)]))
+        company_id = response.json()['company_id']
+        # The new key belongs to another account, with other charges
+        response, calls = self.post(f"/api/revenue/companies/{company_id}/refresh/", {'api_key': 'sk_new'},
+                                    stripe_api([('ch_2', 8000, self.recent, True)]))
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(calls[0]['created[gte]'], (self.recent - timedelta(days=50)).timestamp())
+        integration = IntegrationKey.objects.get(company_id=company_id)
+        self.assertEqual(integration.api_key, 'sk_new')
+        self.assertEqual(integration.daily_revenue, {self.recent.date().isoformat(): 80})
+        self.assertEqual(Company.objects.get(pk=company_id).monthly_revenue, Decimal('80.00'))
+
+    def test_refresh_needs_the_owner(self):
+        owner = User.objects.create_user('someone-else')
+        company = Company.objects.create(name="Theirs", monthly_revenue=10, added_by=owner)
+        IntegrationKey.objects.create(company=company, provider='stripe', api_key='sk', added_by=owner)
+        response, calls = self.post(
+            f"/api/revenue/companies/{company.pk}/refresh/", {'api_key': 'sk_new'}, stripe_api([]),
+        )
+        self.assertEqual((response.status_code, calls), (403, []))
+
+
+class ReverifyTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('founder')
+        self.revenue = {}  # api_key -> figure the provider reports
+        self.companies = []
+        for i in range(5):
+            company = Company.objects.create(name=f"C{i}", monthly_revenue=100, added_by=self.owner)
+            IntegrationKey.objects.create(company=company, provider='stripe', api_key=f'sk_{i}', added_by=self.owner)
+            self.revenue[f'sk_{i}'] = 100 * (i + 1)
+            self.companies.append(company)
+        # Two processors: its revenue is the sum of both
+        IntegrationKey.objects.create(
+            company=self.companies[0], provider='razorpay', api_key='rzp_0', api_secret='s', added_by=self.owner,
+        )
+        self.revenue['rzp_0'] = 1000
+        self.cursor = datetime(2026, 3, 15, tzinfo=timezone.utc)
+
+    def fake_sync(self, rate_limited=(), broken=()):
+        remaining = set(rate_limited)
+
+        def sync_revenue(integration):
+            if integration.api_key in remaining:
+                remaining.discard(integration.api_key)
+                raise RateLimited("slow down", retry_after=0)
+            if integration.api_key in broken:
+                raise ProviderError("revoked")
+            integration.sync_cursor = self.cursor
+            integration.daily_revenue = {'2026-03-14': self.revenue[integration.api_key]}
+            return RevenueFigures(self.revenue[integration.api_key], 0)
+        return sync_revenue
+
+    def run_reverify(self, **kwargs):
+        logged = []
+        with mock.patch.object(reverify, 'sync_revenue', side_effect=self.fake_sync(**kwargs)):
+            report = reverify.Reverifier(batch_size=2, workers=4, backoff_base=0, log=logged.append).run()
+        return report, logged
+
+    def test_companies_are_verified_in_batches(self):
+        report, logged = self.run_reverify(rate_limited={'sk_1'}, broken={'sk_4'})
+        self.assertEqual((report['companies'], report['integrations']), (5, 6))
+        self.assertEqual(len([line for line in logged if line.startswith("batch up to company")]), 3)
+        self.assertEqual(report['providers']['stripe']['retries'], 1)
+        self.assertEqual(report['providers']['stripe']['errors'], 1)
+        self.assertIn('p50_ms', report['providers']['stripe'])
+
+        revenues = dict(Company.objects.values_list('name', 'monthly_revenue'))
+        self.assertEqual(revenues, {
+            "C0": Decimal('1100.00'), "C1": Decimal('200.00'), "C2": Decimal('300.00'), "C3": Decimal('400.00'),
+            "C4": Decimal('100.00'),  # Its sync failed, so it keeps the last verified figure
+        })
+        synced = IntegrationKey.objects.filter(sync_cursor=self.cursor).order_by('api_key')
+        self.assertEqual(list(synced.values_list('api_key', flat=True)), ['rzp_0', 'sk_0', 'sk_1', 'sk_2', 'sk_3'])
+        self.assertEqual(
+            list(LeaderboardRank.objects.order_by('overall_rank').values_list('company__name', flat=True)),
+            ["C0", "C3", "C2", "C1", "C4"],
+        )
+        self.assertEqual(Company.objects.get(name="C2").public_data['monthly_revenue'], '300.00')
+
+
+class RevenueHistoryTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Acme", monthly_revenue=1000)
+        self.today = datetime.now(timezone.utc)
+
+    def test_rollups_keep_the_latest_figure_of_each_period(self):
+        history.record_revenue(self.company, 100, 'stripe', recorded_at=self.today - timedelta(hours=2))
+        history.record_revenue(self.company, 300, 'stripe', recorded_at=self.today)
+        history.record_revenue(self.company, 200, 'stripe', recorded_at=self.today - timedelta(hours=1))
+        (period, mrr, mrr_min, mrr_max), = history.history(self.company, 'day')
+        self.assertEqual((mrr, mrr_min, mrr_max), (Decimal(300), Decimal(100), Decimal(300)))
+
+    def test_unverified_figures_stay_out_of_charts_and_growth(self):
+        month_ago = self.today - timedelta(days=31)
+        history.record_revenue(self.company, 500, 'stripe', recorded_at=month_ago)
+        history.record_revenue(self.company, 50, 'manual', verified=False, recorded_at=month_ago + timedelta(hours=1))
+        history.record_revenue(self.company, 9000, 'manual', verified=False)
+
+        self.assertEqual(RevenueSnapshot.objects.filter(company=self.company).count(), 3)
+        self.assertEqual([row[1] for row in history.history(self.company, 'day')], [Decimal(500)])
+        self.assertEqual(history.month_over_month(self.company, 1000), Decimal('100.00'))
+
+        history.rebuild_rollups([self.company.pk])
+        self.assertEqual([row[1] for row in history.history(self.company, 'day')], [Decimal(500)])
+
+
+@mock.patch.object(metrics, 'should_sample', return_value=True)
+class RequestMetricsMiddlewareTests(TestCase):
+    def test_sync_requests_are_timed(self, should_sample):
+        def view(request):
+            Company.objects.count()
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        self.assertFalse(iscoroutinefunction(middleware))
+        response = middleware(RequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    async def test_async_requests_stay_async_and_count_their_queries(self, should_sample):
+        async def view(request):
+            await sync_to_async(Company.objects.count)()
+            await sync_to_async(Company.objects.count)()
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+
+class PublicProjectionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='secret')
+        self.company = Company.objects.create(
+            name="Acme Rockets", founder_name="Wile E.", website="https://acme.example.com",
+            twitter_handle="acme", added_by=self.owner, monthly_revenue=1234,
+        )
+
+    def assertMasked(self, data):
+        serialized = str(data)
+        for secret in ("Acme", "acme", "Wile", "owner"):
+            self.assertNotIn(secret, serialized)
+        self.assertEqual(data["name"], projection.ANONYMOUS["name"])
+
+    def test_public_data_follows_saves(self):
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.public_data["name"], "Acme Rockets")
+        self.assertEqual(self.company.public_data["added_by_username"], "owner")
+        self.company.monthly_revenue = 99
+        self.company.save()
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.public_data["monthly_revenue"], "99.00")
+
+    def test_turning_anonymous_masks_the_record_and_the_slug(self):
+        self.assertEqual(self.company.slug, "acme-rockets")
+        self.company.is_anonymous = True
+        self.company.save(update_fields=["is_anonymous"])
+        self.company.refresh_from_db()
+        self.assertTrue(GENERIC_SLUG.fullmatch(self.company.slug))
+        self.assertEqual(self.company.public_data["slug"], self.company.slug)
+        self.assertMasked(self.company.public_data)
+
+        self.assertEqual(self.client.get("/api/revenue/companies/acme-rockets/").status_code, 404)
+        response = self.client.get(f"/api/revenue/companies/{self.company.slug}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertMasked(response.json())
+
+    def test_anonymous_slug_stays_put(self):
+        self.company.is_anonymous = True
+        self.company.save()
+        slug = self.company.slug
+        self.company.tagline = "Still anonymous"
+        self.company.save()
+        self.assertEqual(self.company.slug, slug)
+
+    def test_import_refuses_name_slugs_for_anonymous_rows(self):
+        with self.assertRaises(importing.InvalidRow):
+            importing.parse_row({"name": "Hidden Co", "slug": "hidden-co", "is_anonymous": "yes"})
+        company = importing.parse_row({"name": "Hidden Co", "is_anonymous": "yes"})
+        self.assertTrue(GENERIC_SLUG.fullmatch(company.slug))
+
+    def test_rows_match_the_serializer_byte_for_byte(self):
+        Company.objects.create(name="Plain", mom_growth=Decimal("-3.5"), founding_date=date(2020, 2, 29))
+        Company.objects.create(name="Ownerless", last_verified_at=datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        companies = Company.objects.order_by("-monthly_revenue", "-id")
+        self.assertEqual(
+            render_json(list(company_list_rows(companies))),
+            JSONRenderer().render(CompanySerializer(companies, many=True).data),
+        )
+
+    def test_migration_computes_the_same_records(self):
+        migration = importlib.import_module("revenue.migrations.0024_company_public_data")
+        Company.objects.create(name="Hidden Co", founder_name="Someone", is_anonymous=True, added_by=self.owner)
+        expected = dict(Company.objects.values_list("pk", "public_data"))
+        Company.objects.update(public_data={})
+        migration.populate_public_data(apps, None)
+        self.assertEqual(dict(Company.objects.values_list("pk", "public_data")), expected)
+
+
+class AdCounterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('advertiser', password='secret')
+        self.ad = Advertisement.objects.create(
+            owner=self.owner, title="Ad", description="An ad", target_url="https://example.com",
+            slot_id='left_1', start_date=date.today(), end_date=date.today() + timedelta(days=7),
+        )
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log_dir = log_dir.name
+
+    def buffer(self):
+        return ad_counters.AdCounterBuffer(log_dir=self.log_dir, flush_interval=3600)
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.log_dir) if name.startswith('ads-'))
+
+    def test_flush_applies_deltas_and_deletes_the_segment(self):
+        buffer = self.buffer()
+        buffer.record(ad_counters.IMPRESSION, [self.ad.id])
+        buffer.record(ad_counters.CLICK, [self.ad.id])
+        self.assertEqual(buffer.pending(self.ad.id), (1, 1))
+        buffer.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.impressions, self.ad.clicks), (1, 1))
+        self.assertEqual(AdStatDaily.objects.get(ad=self.ad).impressions, 1)
+        self.assertEqual(self.segments(), [])
+
+    def test_live_segments_are_left_alone(self):
+        buffer = self.buffer()
+        buffer.record(ad_counters.IMPRESSION, [self.ad.id])
+        self.assertEqual(ad_counters.replay_orphans(self.log_dir), 0)
+        self.assertEqual(len(self.segments()), 1)
+
+    def test_segments_of_a_crashed_process_are_replayed_once(self):
+        crashed = self.buffer()
+        crashed.record(ad_counters.IMPRESSION, [self.ad.id])
+        crashed.record(ad_counters.IMPRESSION, [self.ad.id])
+        with open(crashed.segment, 'ab') as f:
+            f.write(b'i 17000')  # Torn last write
+        os.close(crashed.fd)  # What the kernel does when the process dies: the lock goes
+
+        # Its successor may well get the same pid, but not the same segment
+        successor = self.buffer()
+        successor.record(ad_counters.CLICK, [self.ad.id])
+        self.assertEqual(len(self.segments()), 2)
+
+        self.assertEqual(ad_counters.replay_orphans(self.log_dir), 1)
+        self.assertEqual(ad_counters.replay_orphans(self.log_dir), 0)
+        self.ad.refresh_from_db()
+        self.assertEqual((self.ad.impressions, self.ad.clicks), (2, 0))
+        self.assertEqual(self.segments(), [os.path.basename(successor.segment)])
+
+    def test_stats_rows_created_elsewhere_are_incremented(self):
+        other = Advertisement.objects.create(
+            owner=self.owner, title="Other", description="An ad", target_url="https://example.com",
+            slot_id='left_2', start_date=date.today(), end_date=date.today() + timedelta(days=7),
+        )
+        hour = 1_700_000_000 - 1_700_000_000 % 3600
+        day = datetime.fromtimestamp(hour, timezone.utc).date()
+        # Another process created this ad's row after our flush started
+        AdStatDaily.objects.create(ad=self.ad, owner=self.owner, day=day, impressions=5, clicks=1)
+        ad_counters.apply_deltas({(self.ad.id, hour): [1, 0], (other.id, hour): [2, 1]})
+        ad_counters.apply_deltas({(self.ad.id, hour): [1, 1]})
+        def counts(model):
+            return {ad_id: (i, c) for ad_id, i, c in model.objects.values_list('ad_id', 'impressions', 'clicks')}
+
+        self.assertEqual(counts(AdStatDaily), {self.ad.id: (7, 2), other.id: (2, 1)})
+        self.assertEqual(counts(AdStatHourly), {self.ad.id: (2, 1), other.id: (2, 1)})
+        self.assertEqual(AdStatHourly.objects.get(ad=other).hour, datetime.fromtimestamp(hour, timezone.utc))
+
+
+class LeaderboardRankTests(TestCase):
+    def setUp(self):
+        self.a = Company.objects.create(name="A", monthly_revenue=300, category='saas')
+        self.b = Company.objects.create(name="B", monthly_revenue=200, category='agency')
+        self.c = Company.objects.create(name="C", monthly_revenue=100, category='saas')
+
+    def ranks(self):
+        return list(
+            LeaderboardRank.objects.order_by('overall_rank')
+            .values_list('company__name', 'overall_rank', 'category_rank')
+        )
+
+    def assertRanksConsistent(self):
+        ranks = self.ranks()
+        ranking.rebuild_ranks()
+        self.assertEqual(ranks, self.ranks())
+
+    def test_saves_rank_new_companies(self):
+        self.assertEqual(self.ranks(), [("A", 1, 1), ("B", 2, 1), ("C", 3, 2)])
+        Company.objects.create(name="D", monthly_revenue=250, category='saas')
+        self.assertEqual(self.ranks(), [("A", 1, 1), ("D", 2, 2), ("B", 3, 1), ("C", 4, 3)])
+        self.assertRanksConsistent()
+
+    def test_ties_rank_newer_companies_first(self):
+        d = Company.objects.create(name="D", monthly_revenue=200, category='agency')
+        self.assertEqual(d.leaderboard_rank.overall_rank, 2)
+        self.assertRanksConsistent()
+
+    def test_revenue_and_category_changes_shift_ranks(self):
+        self.c.monthly_revenue = 400
+        self.c.save()
+        self.assertEqual(self.ranks(), [("C", 1, 1), ("A", 2, 2), ("B", 3, 1)])
+        self.a.category = 'agency'
+        self.a.save()
+        self.assertEqual(self.ranks(), [("C", 1, 1), ("A", 2, 1), ("B", 3, 2)])
+        self.assertRanksConsistent()
+
+    def test_hiding_and_deleting_close_the_gap(self):
+        self.a.show_in_leaderboard = False
+        self.a.save()
+        self.assertEqual(self.ranks(), [("B", 1, 1), ("C", 2, 1)])
+        self.b.delete()
+        self.assertEqual(self.ranks(), [("C", 1, 1)])
+        Company.objects.filter(pk=self.c.pk).delete()  # Querysets (e.g. the admin) too
+        self.assertEqual(self.ranks(), [])
+
+    def test_rank_changes_take_the_lock(self):
+        before = LeaderboardRankLock.objects.get().updates
+        self.b.monthly_revenue = 50
+        self.b.save()
+        self.assertEqual(LeaderboardRankLock.objects.get().updates, before + 1)
+
+    def test_unrelated_changes_skip_the_lock(self):
+        before = LeaderboardRankLock.objects.get().updates
+        self.b.tagline = "Now with more agency"
+        self.b.save()
+        hidden = Company.objects.create(name="D", monthly_revenue=500, show_in_leaderboard=False)
+        hidden.tagline = "Still hidden"
+        hidden.save()
+        self.assertEqual(LeaderboardRankLock.objects.get().updates, before)
+
+    def test_percentile_follows_the_total(self):
+        self.assertEqual(ranking.rank_summary(self.b)["percentile"], Decimal("33.33"))
+        Company.objects.create(name="D", monthly_revenue=50, category='saas')
+        self.b.refresh_from_db()
+        summary = ranking.rank_summary(self.b)
+        self.assertEqual((summary["overall"], summary["total"]), (2, 4))
+        self.assertEqual(summary["percentile"], Decimal("50.00"))
+
+
+class CategoryStatsTests(TestCase):
+    def setUp(self):
+        self.a = Company.objects.create(name="A", monthly_revenue=300, mom_growth=10, category='saas', is_verified=True)
+        self.b = Company.objects.create(name="B", monthly_revenue=200, mom_growth=-5, category='agency')
+        self.c = Company.objects.create(name="C", monthly_revenue=100, mom_growth=2, category='saas')
+
+    def stats(self):
+        return {
+            row[0]: row[1:] for row in CategoryStats.objects.filter(companies__gt=0).values_list(
+                'category', 'companies', 'verified', 'total_mrr', 'growth_sum', 'median_mrr',
+            )
+        }
+
+    def assertStatsConsistent(self):
+        stats = self.stats()
+        category_stats.rebuild()
+        self.assertEqual(stats, self.stats())
+        for category, row in stats.items():
+            revenues = Company.objects.filter(category=category, show_in_leaderboard=True).values_list(
+                'monthly_revenue', flat=True,
+            )
+            self.assertEqual(row[-1], statistics.median(revenues).quantize(Decimal('0.01')))
+
+    def test_deltas_follow_every_change(self):
+        self.assertEqual(self.stats()['saas'], (2, 1, Decimal('400.00'), Decimal('12.00'), Decimal('200.00')))
+        self.assertStatsConsistent()
+        Company.objects.create(name="D", monthly_revenue=50, mom_growth=1, category='saas', is_verified=True)
+        self.assertStatsConsistent()
+        self.c.monthly_revenue = 1000
+        self.c.is_verified = True
+        self.c.save()
+        self.assertStatsConsistent()
+        self.a.category = 'agency'
+        self.a.save()
+        self.assertStatsConsistent()
+        self.b.show_in_leaderboard = False
+        self.b.save()
+        self.assertStatsConsistent()
+        self.c.delete()
+        self.assertStatsConsistent()
+        self.assertEqual(self.stats()['agency'], (1, 1, Decimal('300.00'), Decimal('10.00'), Decimal('300.00')))
+
+    def test_median_matches_a_brute_force_median(self):
+        for i, revenue in enumerate([7, 7, 13, 400, 21, 0, 99]):
+            Company.objects.create(name=f"S{i}", monthly_revenue=revenue, category='saas')
+            self.assertStatsConsistent()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        Company.objects.create(name="Rocket Fuel", monthly_revenue=900, category='saas')
+        Company.objects.create(name="Rocketship Analytics", monthly_revenue=50, category='saas')
+        Company.objects.create(name="Rocket Stealth", founder_name="Rocket Founder", monthly_revenue=500,
+                               category='agency', is_anonymous=True)
+
+    def search(self, **params):
+        response = self.client.get("/api/revenue/companies/search/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_matches_with_leaderboard_ranks(self):
+        results = self.search(q="rocketsh")
+        self.assertEqual([hit["name"] for hit in results["companies"]], ["Rocketship Analytics"])
+        hit, = results["companies"]
+        self.assertEqual((hit["rank"], hit["category_rank"]), (3, 2))
+
+    def test_text_matches_leave_out_anonymous_companies(self):
+        results = self.search(q="rocket")
+        self.assertEqual(results["total"], 2)
+        self.assertNotIn("Stealth", str(results))
+
+    def test_anonymous_companies_are_browsable_masked(self):
+        results = self.search(category="agency")
+        hit, = results["companies"]
+        self.assertEqual(hit["name"], projection.ANONYMOUS["name"])
+        self.assertNotIn("Rocket", str(hit))
+
+    def test_a_company_called_search_keeps_a_reachable_profile(self):
+        company = Company.objects.create(name="Search", monthly_revenue=10, category='saas')
+        self.assertEqual(company.slug, "company-search")
+        response = self.client.get(f"/api/revenue/companies/{company.slug}/")
+        self.assertEqual(response.json()["name"], "Search")
+        self.assertIn("total", self.search(q="search"))
+        with self.assertRaises(importing.InvalidRow):
+            importing.parse_row({"name": "Search", "slug": "search", "monthly_revenue": "10"})
+
+
+class AdBookingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('advertiser', email='ads@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.start = date.today() + timedelta(days=1)
+
+    def book(self, start, end, slot_id='left_1'):
+        return self.client.post('/api/revenue/ads/book/', {
+            'slot_id': slot_id, 'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            'title': "Ad", 'description': "An ad", 'target_url': "https://example.com",
+        })
+
+    def test_booking_queues_its_confirmation(self):
+        response = self.book(self.start, self.start + timedelta(days=6))
+        self.assertEqual(response.status_code, 201)
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.kind, email.ad_id, email.to_email), ('ad_confirmation', response.json()['id'], 'ads@example.com'))
+
+    def test_overlapping_booking_is_refused(self):
+        self.assertEqual(self.book(self.start, self.start + timedelta(days=6)).status_code, 201)
+        self.assertEqual(self.book(self.start + timedelta(days=6), self.start + timedelta(days=9)).status_code, 409)
+        self.assertEqual(self.book(self.start, self.start + timedelta(days=6), slot_id='left_2').status_code, 201)
+        self.assertEqual(Advertisement.objects.count(), 2)
+
+    def test_no_booking_without_its_confirmation(self):
+        with mock.patch.object(outbox, 'enqueue', side_effect=RuntimeError("outbox down")):
+            self.assertEqual(self.book(self.start, self.start).status_code, 400)
+        self.assertFalse(Advertisement.objects.exists())
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('advertiser')
+        self.start = date(2026, 6, 1)
+
+    def book(self, first, last, slot_id='left_1', **fields):
+        return Advertisement.objects.create(
+            owner=self.owner, title="Ad", description="An ad", target_url="https://example.com", slot_id=slot_id,
+            start_date=self.start + timedelta(days=first), end_date=self.start + timedelta(days=last), **fields,
+        )
+
+    def day(self, offset):
+        return self.start + timedelta(days=offset)
+
+    def test_adjacent_and_overlapping_bookings_merge(self):
+        self.book(2, 4)
+        self.book(5, 6)  # Adjacent
+        self.book(6, 9)  # Overlapping
+        self.book(12, 12)
+        intervals = availability.load(self.start, self.day(30))['left_1']
+        self.assertEqual(intervals.booked_ranges(self.start, self.day(30)), [
+            (self.day(2), self.day(9)), (self.day(12), self.day(12)),
+        ])
+        self.assertEqual(intervals.free_ranges(self.start, self.day(14)), [
+            (self.day(0), self.day(1)), (self.day(10), self.day(11)), (self.day(13), self.day(13)),
+        ])
+        self.assertEqual(intervals.booked_days(self.start, self.day(30)), 9)
+        self.assertEqual(intervals.next_available(self.day(3)), self.day(10))
+
+    def test_boundary_days(self):
+        self.book(2, 4)
+        intervals = availability.load(self.start, self.day(10))['left_1']
+        self.assertTrue(intervals.is_free(self.day(1)))
+        self.assertFalse(intervals.is_free(self.day(2)))  # First and last days are booked
+        self.assertFalse(intervals.is_free(self.day(4)))
+        self.assertTrue(intervals.is_free(self.day(5)))
+        self.assertEqual(intervals.booked_days(self.day(3), self.day(4)), 1)  # Half-open window
+        self.assertEqual(intervals.booked_ranges(self.day(3), self.day(10)), [(self.day(3), self.day(4))])
+        self.assertIsNone(intervals.next_available(self.day(2), until=self.day(5)))
+
+    def test_cancelled_bookings_free_their_days(self):
+        self.book(0, 6, is_active=False)
+        self.book(0, 1, slot_id='right_1')
+        result = availability.calendar(self.start, days=7)
+        self.assertEqual(result['left_1']['booked_dates'], [])
+        self.assertEqual(result['left_1']['next_available'], self.start.isoformat())
+        self.assertEqual(result['left_1']['availability_percent'], 100)
+        self.assertEqual(result['right_1']['next_available'], self.day(2).isoformat())
+
+    def test_calendar_keeps_booked_dates(self):
+        self.book(-3, 1)  # Started before the window
+        self.book(5, 20)  # Runs past it
+        slot = availability.calendar(self.start, days=7)['left_1']
+        self.assertEqual(slot['booked_dates'], [self.day(offset).isoformat() for offset in (0, 1, 5, 6)])
+        self.assertEqual(slot['booked_ranges'], [
+            {'start': self.day(0).isoformat(), 'end': self.day(1).isoformat()},
+            {'start': self.day(5).isoformat(), 'end': self.day(6).isoformat()},
+        ])
+        self.assertEqual(slot['free_ranges'], [{'start': self.day(2).isoformat(), 'end': self.day(4).isoformat()}])
+        self.assertAlmostEqual(slot['availability_percent'], 3 / 7 * 100)
+
+
+class AdPricingTests(TestCase):
+    def setUp(self):
+        cache.bump_version()
+        self.owner = User.objects.create_user('advertiser', email='ads@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.start = date.today() + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            for week in range(1, 4):
+                Advertisement.objects.create(
+                    owner=self.owner, title="Ad", description="An ad", target_url="https://example.com",
+                    slot_id='left_1', start_date=self.start + timedelta(weeks=week),
+                    end_date=self.start + timedelta(weeks=week, days=6),
+                )
+
+    def grid(self, **params):
+        return self.client.get("/api/revenue/ads/prices/", params).json()
+
+    def test_grid_prices_match_single_estimates(self):
+        start = self.start.isoformat()
+        grid = self.grid(weeks="1,4", start=start)
+        self.assertEqual(grid['left_1']['future_bookings'], 3)
+        for slot in ('left_1', 'right_5'):
+            for weeks in (1, 4):
+                estimate = self.client.post(
+                    "/api/revenue/ads/price/", {'slot_id': slot, 'duration': weeks, 'start_date': start}
+                ).json()
+                self.assertEqual(grid[slot]['prices'][start][str(weeks)], estimate)
+        prices = {slot: grid[slot]['prices'][start]['1']['total_price'] for slot in ('left_1', 'right_5')}
+        self.assertGreater(prices['left_1'], prices['right_5'])  # Demand surcharge
+
+    def test_demand_follows_bookings_and_cancellations(self):
+        self.assertEqual(self.grid()['left_2']['future_bookings'], 0)
+        with self.captureOnCommitCallbacks(execute=True), redirect_stdout(io.StringIO()):
+            booked = self.client.post('/api/revenue/ads/book/', {
+                'slot_id': 'left_2', 'start_date': (self.start + timedelta(days=9)).isoformat(),
+                'end_date': (self.start + timedelta(days=15)).isoformat(),
+                'title': "Ad", 'description': "An ad", 'target_url': "https://example.com",
+            })
+        self.assertEqual(booked.status_code, 201)
+        grid = self.grid()
+        self.assertEqual(grid['left_2']['future_bookings'], 1)
+        self.assertEqual(grid['left_2']['weekly_occupancy'][:3], [0.0, round(4 / 7 * 100, 1), round(3 / 7 * 100, 1)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/revenue/ads/{booked.json()['id']}/cancel/").status_code, 200)
+        self.assertEqual(self.grid()['left_2']['future_bookings'], 0)
+        self.assertEqual(SlotDemand.objects.get(slot_id='left_2').future_bookings, 0)
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, color=(200, 40, 40, 255), size=(200, 100), image_format='PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, color).save(buffer, image_format)
+        return SimpleUploadedFile('logo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_files_are_named_after_their_content(self):
+        first = images.store(self.upload(), 'square')
+        self.assertRegex(first.original, rf'^images/{first.sha256[:2]}/{first.sha256}\.png$')
+        self.assertEqual(images.store(self.upload(), 'square'), first)  # Same bytes, same asset
+        banner = images.store(self.upload(), 'banner')
+        self.assertEqual(banner.original, first.original)  # One file for both presets
+        self.assertNotEqual(images.store(self.upload(color=(0, 0, 255, 255)), 'square').original, first.original)
+        with self.assertRaises(images.InvalidImage):
+            images.store(SimpleUploadedFile('logo.png', b'not an image'), 'square')
+
+    def test_thumbnails_in_webp_and_jpeg(self):
+        asset = images.process(images.store(self.upload(), 'square'))
+        self.assertEqual((asset.status, asset.width, asset.height), ('ready', 200, 100))
+        self.assertEqual(sorted(asset.thumbnails, key=int), ['40', '80'])  # Nothing wider than the original
+        for width, names in asset.thumbnails.items():
+            for kind, image_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with default_storage.open(names[kind]) as file, Image.open(file) as thumbnail:
+                    self.assertEqual((thumbnail.format, thumbnail.size), (image_format, (int(width), int(width))))
+        urls = images.thumbnail_urls(asset.thumbnails)
+        self.assertTrue(urls['40']['webp'].endswith('-40x40.webp'))
+
+    def test_unchanged_content_is_not_rendered_again(self):
+        asset = images.process(images.store(self.upload(), 'square'))
+        with mock.patch.object(default_storage, 'save', wraps=default_storage.save) as save:
+            same = images.store(self.upload(), 'square')
+            self.assertEqual(same.status, 'ready')
+            images.process(same)  # e.g. process_images run again
+        save.assert_not_called()
+        self.assertEqual(ImageAsset.objects.get().thumbnails, asset.thumbnails)
+
+
+class AdStatsViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('advertiser')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.ad = self.create_ad(self.owner, 'left_1')
+        self.other_ad = self.create_ad(self.owner, 'left_2')
+        stranger = User.objects.create_user('stranger')
+        self.stranger_ad = self.create_ad(stranger, 'left_3')
+
+        self.day = date(2026, 5, 2)
+        hour = datetime(2026, 5, 2, 9, tzinfo=timezone.utc)
+        for ad, impressions, clicks in ((self.ad, 200, 5), (self.other_ad, 50, 5), (self.stranger_ad, 999, 99)):
+            AdStatDaily.objects.create(ad=ad, owner=ad.owner, day=self.day, impressions=impressions, clicks=clicks)
+            AdStatHourly.objects.create(ad=ad, owner=ad.owner, hour=hour, impressions=impressions, clicks=clicks)
+        AdStatDaily.objects.create(ad=self.ad, owner=self.owner, day=self.day + timedelta(days=1), impressions=10)
+
+    def create_ad(self, owner, slot_id):
+        return Advertisement.objects.create(
+            owner=owner, title="Ad", description="An ad", target_url="https://example.com", slot_id=slot_id,
+            start_date=date(2026, 5, 1), end_date=date(2026, 5, 7),
+        )
+
+    def get(self, url, **params):
+        return self.client.get(url, {'from': '2026-05-01', 'to': '2026-05-03', **params})
+
+    def test_daily_series_fills_gaps_with_zeros(self):
+        response = self.get(f"/api/revenue/ads/{self.ad.id}/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['series'], [
+            {'period': '2026-05-01', 'impressions': 0, 'clicks': 0, 'ctr': 0},
+            {'period': '2026-05-02', 'impressions': 200, 'clicks': 5, 'ctr': 2.5},
+            {'period': '2026-05-03', 'impressions': 10, 'clicks': 0, 'ctr': 0},
+        ])
+
+    def test_hourly_series_covers_whole_days(self):
+        response = self.client.get(
+            f"/api/revenue/ads/{self.ad.id}/stats/", {'granularity': 'hour', 'from': '2026-05-02', 'to': '2026-05-02'},
+        )
+        series = response.json()['series']
+        self.assertEqual(len(series), 24)
+        self.assertEqual(series[0]['period'], '2026-05-02T00:00:00+00:00')
+        self.assertEqual([point['impressions'] for point in series if point['impressions']], [200])
+        self.assertEqual(series[9]['ctr'], 2.5)
+
+    def test_owner_series_sums_only_their_ads(self):
+        series = self.get("/api/revenue/ads/my/stats/").json()['series']
+        self.assertEqual(series[1], {'period': '2026-05-02', 'impressions': 250, 'clicks': 10, 'ctr': 4.0})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get(f"/api/revenue/ads/{self.stranger_ad.id}/stats/").status_code, 404)
+        self.assertEqual(self.get(f"/api/revenue/ads/{self.ad.id}/stats/", granularity='minute').status_code, 400)
+        self.assertEqual(self.get("/api/revenue/ads/my/stats/", granularity='hour', to='2026-07-01').status_code, 400)
+        self.assertEqual(self.get("/api/revenue/ads/my/stats/", to='2026-04-01').status_code, 400)
+
+
+class AdSlotMatrixTests(TestCase):
+    def setUp(self):
+        cache.bump_version()
+        self.owner = User.objects.create_user('advertiser')
+        self.start = date(2026, 6, 1)
+
+    def book(self, slot_id, first, last, **fields):
+        return Advertisement.objects.create(
+            owner=self.owner, title="Ad", description="An ad", target_url="https://example.com", slot_id=slot_id,
+            start_date=self.start + timedelta(days=first), end_date=self.start + timedelta(days=last), **fields,
+        )
+
+    def matrix(self, days=7):
+        end = self.start + timedelta(days=days - 1)
+        return self.client.get("/api/revenue/ads/slots/", {'from': self.start.isoformat(), 'to': end.isoformat()})
+
+    def test_days_hold_the_booked_ad(self):
+        first = self.book('left_1', 1, 3)
+        overlapping = self.book('left_1', 3, 5)
+        self.book('left_1', 6, 6, is_active=False)  # Cancelled
+        whole = self.book('left_2', -2, 10)
+        body = self.matrix().json()
+        self.assertEqual((body['from'], body['to']), ('2026-06-01', '2026-06-07'))
+
+        left_1 = body['slots']['left_1']
+        self.assertEqual(left_1['days'], [None, first.id, first.id, first.id, overlapping.id, overlapping.id, None])
+        self.assertEqual((left_1['status'], left_1['next_available']), ('available', '2026-06-01'))
+
+        left_2 = body['slots']['left_2']
+        self.assertEqual(left_2['days'], [whole.id] * 7)
+        self.assertEqual((left_2['status'], left_2['ad']['id'], left_2['next_available']), ('booked', whole.id, None))
+        self.assertEqual(set(body['slots']), {slot for slot, _ in Advertisement.SLOT_CHOICES})
+        self.assertEqual(body['slots']['right_5']['days'], [None] * 7)
+
+    def test_bad_ranges_are_400s(self):
+        self.assertEqual(self.client.get("/api/revenue/ads/slots/", {'from': '2026-06-01'}).status_code, 400)
+        inverted = {'from': '2026-06-02', 'to': '2026-06-01'}
+        self.assertEqual(self.client.get("/api/revenue/ads/slots/", inverted).status_code, 400)
+        self.assertEqual(self.matrix(days=367).status_code, 400)
+        self.assertEqual(self.matrix(days=366).status_code, 200)
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.now = datetime(2026, 5, 1, 12, tzinfo=timezone.utc)
+        outbox.enqueue([outbox.email('ad_live', 'ads@example.com', "Live", "Your ad is live")])
+        EmailOutbox.objects.update(next_attempt_at=self.now)
+
+    def test_claimed_emails_wait_for_the_lease(self):
+        self.assertEqual(len(outbox.claim(now=self.now)), 1)
+        self.assertEqual(outbox.claim(now=self.now), [])  # Another worker holds it
+        # The worker died: once the lease runs out the email is due again
+        later = self.now + timedelta(seconds=outbox.LEASE + 1)
+        self.assertEqual(outbox.drain(now=later)['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+
+    def test_failed_sends_back_off_then_give_up(self):
+        with mock.patch('revenue.outbox.EmailMessage.send', side_effect=OSError("refused")):
+            self.assertEqual(outbox.drain(now=self.now)['retrying'], 1)
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.next_attempt_at, self.now + timedelta(seconds=outbox.BACKOFF))
+            self.assertEqual(outbox.drain(now=self.now)['retrying'], 0)  # Not due yet
+
+            moment = email.next_attempt_at
+            for _ in range(outbox.MAX_ATTEMPTS - 1):
+                outbox.drain(now=moment)
+                moment = EmailOutbox.objects.get().next_attempt_at
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('failed', outbox.MAX_ATTEMPTS, "refused"))
+
+
+class NotificationScheduleTests(TestCase):
+    def setUp(self):
+        self.today = date(2026, 5, 10)
+        owner = User.objects.create_user('advertiser', email='ads@example.com')
+        self.last_day = self.ad(owner, self.today - timedelta(days=6), self.today)
+        self.ending = self.ad(owner, self.today - timedelta(days=4), self.today + timedelta(days=2))
+
+    def ad(self, owner, start, end):
+        return Advertisement.objects.create(
+            owner=owner, title="Ad", description="An ad", target_url="https://example.com",
+            slot_id='left_1', start_date=start, end_date=end,
+        )
+
+    def test_each_email_is_queued_once(self):
+        self.assertEqual(notifications.schedule_ad_notifications(self.today), (2, 2))
+        self.assertEqual(notifications.schedule_ad_notifications(self.today), (0, 0))
+        subjects = dict(EmailOutbox.objects.filter(kind='ad_expiry').values_list('ad_id', 'subject'))
+        self.assertIn("Expires Today", subjects[self.last_day.pk])
+        self.assertIn("Expires in 2 Days", subjects[self.ending.pk])
+
+    def test_no_flag_without_its_email(self):
+        with mock.patch.object(outbox, 'enqueue', side_effect=RuntimeError("outbox down")):
+            with self.assertRaises(RuntimeError):
+                notifications.schedule_ad_notifications(self.today)
+        self.assertFalse(Advertisement.objects.filter(live_notification_sent=True).exists())
+        self.assertEqual(notifications.schedule_ad_notifications(self.today), (2, 2))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.bump_version()  # Nothing cached by other tests
+        self.company = Company.objects.create(name="Acme", monthly_revenue=100, category='saas')
+        Company.objects.create(name="Other", monthly_revenue=50, category='agency')
+
+    def test_writes_invalidate_both_tiers(self):
+        version = cache.current_version()
+        self.assertEqual(cache.get_entry("k", lambda: {"n": 1})[1], 'miss')
+        self.assertEqual(cache.get_entry("k", lambda: {"n": 2})[1], 'local')
+        cache._local.clear()  # As seen from another worker
+        self.assertEqual(cache.get_entry("k", lambda: {"n": 3})[1], 'shared')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.monthly_revenue = 200
+            self.company.save()
+        self.assertNotEqual(cache.current_version(), version)
+        self.assertEqual(cache._local, {})
+        entry, status = cache.get_entry("k", lambda: {"n": 4})
+        self.assertEqual((entry[0], status), (b'{"n":4}', 'miss'))
+
+    def test_keys_cover_category_and_cursor(self):
+        def x_cache(**params):
+            return self.client.get("/api/revenue/companies/", params)['X-Cache']
+
+        self.assertEqual(x_cache(category='saas'), 'MISS')
+        self.assertEqual(x_cache(category='saas'), 'LOCAL')
+        self.assertEqual(x_cache(category='agency'), 'MISS')
+        cursor = encode_cursor(Decimal('100.00'), self.company.pk)
+        self.assertEqual(x_cache(cursor=cursor), 'MISS')
+        self.assertEqual(x_cache(cursor=cursor + '=='), 'LOCAL')  # Same cursor, same entry
+
+    def test_oversized_keys_are_refused(self):
+        self.assertEqual(self.client.get("/api/revenue/companies/", {"cursor": "A" * 65}).status_code, 400)
+        self.assertEqual(self.client.get("/api/revenue/companies/", {"category": "x" * 101}).status_code, 400)
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(encode_cursor("NaN", 1))
+
+
+class ConditionalGetTests(TestCase):
+    url = "/api/revenue/categories/stats/"
+
+    def setUp(self):
+        cache.bump_version()
+        caches[cache.CACHE_ALIAS].delete('http-validators:companies')
+        self.company = Company.objects.create(name="Acme", monthly_revenue=100, category='saas')
+        self.modified = datetime(2026, 5, 1, 12, tzinfo=timezone.utc)
+        Company.objects.update(updated_at=self.modified)
+
+    def test_validators_and_304s(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(self.modified.timestamp()))
+        self.assertIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_validators_change_after_a_write(self):
+        before = self.client.get(self.url)
+        later = self.modified + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True), mock.patch('django.utils.timezone.now', return_value=later):
+            self.company.monthly_revenue = 250
+            self.company.save()
+        after = self.client.get(self.url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after['Last-Modified'], http_date(later.timestamp()))
+        stale = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=before['Last-Modified'])
+        self.assertEqual(stale.status_code, 200)
+
+
+class CompanyDetailsTests(TestCase):
+    def setUp(self):
+        cache.bump_version()
+        self.owner = User.objects.create_user('founder')
+        self.company = Company.objects.create(
+            name="Acme Labs", founder_name="Jo", monthly_revenue=100, category='saas', added_by=self.owner,
+        )
+        Company.objects.create(name="Beta", monthly_revenue=50, category='saas')
+
+    def test_lookup_by_slug_or_id(self):
+        by_slug = self.client.get(f"/api/revenue/companies/{self.company.slug}/")
+        self.assertEqual(by_slug.status_code, 200)
+        body = by_slug.json()
+        self.assertEqual((body["id"], body["name"], body["rank"]["overall"]), (self.company.pk, "Acme Labs", 1))
+        self.assertEqual([card["name"] for card in body["neighbors"]], ["Beta"])
+        self.assertEqual(self.client.get(f"/api/revenue/companies/{self.company.pk}/").json(), body)
+
+    def test_unknown_or_private_companies_are_404(self):
+        self.assertEqual(self.client.get("/api/revenue/companies/no-such-company/").status_code, 404)
+        Company.objects.filter(pk=self.company.pk).update(show_in_leaderboard=False)
+        cache.bump_version()
+        self.assertEqual(self.client.get(f"/api/revenue/companies/{self.company.slug}/").status_code, 404)
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        self.assertEqual(client.get(f"/api/revenue/companies/{self.company.slug}/").status_code, 200)
+
+    def test_revalidation_is_a_304(self):
+        url = f"/api/revenue/companies/{self.company.slug}/"
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.acme = Company.objects.create(
+            name="Acme", founder_name="Jo", website="https://acme.example", monthly_revenue=300, category='saas',
+        )
+        self.stealth = Company.objects.create(
+            name="Stealth Labs", founder_name="Secret Founder", website="https://stealth.example",
+            twitter_handle="stealthlabs", monthly_revenue=200, category='saas', is_anonymous=True,
+        )
+        self.hidden = Company.objects.create(name="Hidden", monthly_revenue=900, show_in_leaderboard=False)
+        for company in (self.acme, self.stealth, self.hidden):
+            history.record_revenue(company, company.monthly_revenue, 'stripe')
+
+    def download(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def assertMasked(self, body):
+        for secret in ("Stealth", "Secret Founder", "stealth", "Hidden"):
+            self.assertNotIn(secret, body)
+
+    def test_csv_masks_anonymous_and_leaves_out_hidden_companies(self):
+        body = self.download("/api/revenue/export/companies.csv")
+        self.assertMasked(body)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(row['rank'], row['name']) for row in rows], [('1', "Acme"), ('2', "Anonymous Company")])
+        self.assertEqual((rows[1]['founder_name'], rows[1]['website']), ("Anonymous", ""))
+        self.assertTrue(GENERIC_SLUG.fullmatch(rows[1]['slug']))
+
+    def test_jsonl_masks_anonymous_and_leaves_out_hidden_companies(self):
+        body = self.download("/api/revenue/export/companies.jsonl")
+        self.assertMasked(body)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Acme", "Anonymous Company"])
+        self.assertEqual((rows[1]['website'], rows[1]['twitter_handle']), (None, None))
+
+    def test_history_export_leaves_out_hidden_companies(self):
+        body = self.download("/api/revenue/export/mrr-history.jsonl")
+        self.assertMasked(body)
+        company_ids = {json.loads(line)['company_id'] for line in body.splitlines()}
+        self.assertEqual(company_ids, {self.acme.pk, self.stealth.pk})
+
+
+class LeaderboardPaginationTests(TestCase):
+    def setUp(self):
+        # Ties on revenue are broken by id, newest first
+        for i, revenue in enumerate([500, 300, 300, 300, 100, 100, 0]):
+            Company.objects.create(name=f"Company {i}", monthly_revenue=revenue)
+        Company.objects.create(name="Hidden", monthly_revenue=400, show_in_leaderboard=False)
+
+    def pages(self, limit, **params):
+        names, cursor = [], None
+        while True:
+            query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get("/api/revenue/companies/", query).json()
+            names += [company["name"] for company in body["companies"]]
+            cursor = body["next_cursor"]
+            self.assertEqual(body["has_more"], cursor is not None)
+            if not cursor:
+                return names
+
+    def test_pages_walk_the_leaderboard_once_in_order(self):
+        expected = list(
+            Company.objects.filter(show_in_leaderboard=True)
+            .order_by("-monthly_revenue", "-id").values_list("name", flat=True)
+        )
+        self.assertEqual(expected[1:4], ["Company 3", "Company 2", "Company 1"])
+        for limit in (1, 2, 3, 50):
+            self.assertEqual(self.pages(limit), expected)
+
+    def test_rows_added_above_the_cursor_do_not_shift_later_pages(self):
+        first = self.client.get("/api/revenue/companies/", {"limit": 2}).json()
+        Company.objects.create(name="Newcomer", monthly_revenue=1000)
+        second = self.client.get("/api/revenue/companies/", {"limit": 2, "cursor": first["next_cursor"]}).json()
+        self.assertEqual([company["name"] for company in second["companies"]], ["Company 2", "Company 1"])
+
+    def test_bad_cursor_is_a_400(self):
+        self.assertEqual(self.client.get("/api/revenue/companies/", {"cursor": "!!"}).status_code, 400)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('founder', password='secret')
+
+    def run_import(self, *rows):
+        written, skipped = importing.import_companies(enumerate(rows, start=1))
+        self.assertEqual(skipped, 0)
+        importing.finish()
+        return written
+
+    def test_reimport_updates_the_rows_it_created(self):
+        self.run_import({"name": "Acme", "monthly_revenue": "100", "tagline": "First"})
+        self.run_import({"name": "Acme", "monthly_revenue": "200", "tagline": "Second"})
+        company = Company.objects.get()
+        self.assertEqual((company.slug, company.monthly_revenue, company.tagline), ("acme", Decimal(200), "Second"))
+
+    def test_slug_collisions_never_touch_other_companies(self):
+        acme = Company.objects.create(
+            name="Acme", added_by=self.owner, monthly_revenue=5000, is_verified=True,
+        )
+        self.assertEqual(acme.slug, "acme")
+        self.run_import({"name": "Acme", "slug": "acme", "monthly_revenue": "1", "is_verified": "yes"})
+        self.run_import({"name": "Acme", "slug": "acme", "monthly_revenue": "2", "is_verified": "yes"})
+
+        acme.refresh_from_db()
+        self.assertEqual((acme.monthly_revenue, acme.is_verified, acme.import_key), (Decimal(5000), True, None))
+        imported = Company.objects.exclude(pk=acme.pk).get()
+        self.assertRegex(imported.slug, r'^acme-[0-9a-f]{6}$')
+        self.assertEqual(imported.monthly_revenue, Decimal(2))
+
+    def test_provider_figures_survive_reimports(self):
+        self.run_import({"name": "Acme", "monthly_revenue": "100"})
+        company = Company.objects.get()
+        company.monthly_revenue, company.is_verified = Decimal(900), True
+        company.save()
+        IntegrationKey.objects.create(company=company, provider='stripe', api_key='sk_test', added_by=self.owner)
+
+        self.run_import({"name": "Acme", "monthly_revenue": "100", "is_verified": "no", "tagline": "Updated"})
+        company.refresh_from_db()
+        self.assertEqual((company.monthly_revenue, company.is_verified, company.tagline), (Decimal(900), True, "Updated"))
+
+    def test_anonymous_slugs_are_random_and_stable(self):
+        self.run_import({"name": "Hidden Co", "is_anonymous": "yes"})
+        company = Company.objects.get()
+        self.assertTrue(GENERIC_SLUG.fullmatch(company.slug))
+        # A fresh import of the same name would not give the same slug: it can't be recomputed
+        self.assertNotEqual(importing.parse_row({"name": "Hidden Co", "is_anonymous": "yes"}).slug, company.slug)
+        self.assertNotIn("hidden", str(company.public_data).lower())
+
+        self.run_import({"name": "Hidden Co", "is_anonymous": "yes", "tagline": "Again"})
+        self.assertEqual(Company.objects.get().slug, company.slug)
+
+    def test_turning_anonymous_on_reimport_masks_the_slug(self):
+        self.run_import({"name": "Acme"})
+        self.run_import({"name": "Acme", "is_anonymous": "yes"})
+        company = Company.objects.get()
+        self.assertTrue(GENERIC_SLUG.fullmatch(company.slug))
+        self.assertEqual(company.public_data["slug"], company.slug)
@@ -1,25 +1,34 @@
 from django.urls import path
-from . import views, ad_views
+from . import views, ad_views, integration_views
 
 urlpatterns = [
     path("companies/", views.list_companies, name="list_companies"),
+    path("companies/search/", views.search_companies, name="search_companies"),
+    path("categories/stats/", views.list_category_stats, name="list_category_stats"),
+    path("export/companies.<str:fmt>", views.export_companies, name="export_companies"),
+    path("export/mrr-history.<str:fmt>", views.export_mrr_history, name="export_mrr_history"),
     path("companies/<int:company_id>/", views.get_company_details, name="get_company_details"),
+    path("companies/<slug:slug>/", views.get_company_details, name="get_company_by_slug"),
     path("companies/<int:company_id>/mrr/", views.company_mrr, name="company_mrr"),
     path("companies/<int:company_id>/update/", views.update_company, name="update_company"),
-    path("companies/<int:company_id>/refresh/", views.refresh_api_key, name="refresh_api_key"),
+    path("companies/<int:company_id>/refresh/", integration_views.refresh_api_key, name="refresh_api_key"),
     path("companies/<int:company_id>/delete/", views.delete_company, name="delete_company"),
     path("revenue/add/", views.add_revenue, name="add_revenue"),
+    path("metrics/", views.request_metrics, name="request_metrics"),
     
     # Integration endpoints
-    path("integrations/stripe/", views.stripe_integration, name="stripe_integration"),
-    path("integrations/razorpay/", views.razorpay_integration, name="razorpay_integration"),
-    path("integrations/paypal/", views.paypal_integration, name="paypal_integration"),
+    path("integrations/stripe/", integration_views.stripe_integration, name="stripe_integration"),
+    path("integrations/razorpay/", integration_views.razorpay_integration, name="razorpay_integration"),
+    path("integrations/paypal/", integration_views.paypal_integration, name="paypal_integration"),
     
     # Ad endpoints
     path("ads/slots/", views.get_ad_slots, name="get_ad_slots"),
     path("ads/price/", views.get_price_estimate, name="get_price_estimate"),
+    path("ads/prices/", views.get_price_grid, name="get_price_grid"),
     path("ads/book/", views.book_ad, name="book_ad"),
     path("ads/my/", ad_views.my_ads, name="my_ads"),
+    path("ads/my/stats/", ad_views.my_ads_analytics, name="my_ads_analytics"),
+    path("ads/<int:ad_id>/stats/", ad_views.ad_analytics, name="ad_analytics"),
     path("ads/calendar/", ad_views.ad_availability_calendar, name="ad_calendar"),
     path("ads/<int:ad_id>/click/", ad_views.track_ad_click, name="track_ad_click"),
     path("ads/<int:ad_id>/cancel/", ad_views.cancel_ad, name="cancel_ad"),
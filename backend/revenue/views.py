@@ -1,447 +1,227 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Company, IntegrationKey
+from .models import Company
+from .history import GRANULARITIES, history, record_revenue
+from .ranking import neighbors, rank_summary
 from rest_framework import status
-import stripe
-import razorpay
-import requests
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+import hashlib
+import hmac
+import json
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def stripe_integration(request):
-    """
-    Validate Stripe API key and fetch real revenue data
-    """
-    api_key = request.data.get("api_key")
-    company_name = request.data.get("company_name", "New Startup")
-    
-    if not api_key:
-        return Response({"error": "Missing Stripe API key"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Validate Stripe API key and fetch revenue
-    try:
-        stripe.api_key = api_key
-        
-        # Test the API key by fetching balance
-        balance = stripe.Balance.retrieve()
-        
-        # Fetch charges from the last 30 days to calculate MRR
-        thirty_days_ago = int((datetime.now() - timedelta(days=30)).timestamp())
-        charges = stripe.Charge.list(created={"gte": thirty_days_ago}, limit=100)
-        
-        # Calculate total revenue from charges
-        total_revenue = sum(charge.amount for charge in charges.data if charge.paid) / 100  # Convert from cents
-        
-        # Fetch subscriptions for recurring revenue
-        subscriptions = stripe.Subscription.list(status='active', limit=100)
-        mrr = sum(sub.plan.amount for sub in subscriptions.data if hasattr(sub, 'plan')) / 100
-        
-        # Use MRR if available, otherwise use total revenue
-        monthly_revenue = mrr if mrr > 0 else total_revenue
-        
-        # Calculate growth (simplified - compare with previous period)
-        sixty_days_ago = int((datetime.now() - timedelta(days=60)).timestamp())
-        prev_charges = stripe.Charge.list(created={"gte": sixty_days_ago, "lt": thirty_days_ago}, limit=100)
-        prev_revenue = sum(charge.amount for charge in prev_charges.data if charge.paid) / 100
-        
-        if prev_revenue > 0:
-            growth = ((monthly_revenue - prev_revenue) / prev_revenue) * 100
-        else:
-            growth = 0
-        
-    except stripe.error.AuthenticationError:
-        return Response({"error": "Invalid Stripe API key"}, status=status.HTTP_401_UNAUTHORIZED)
-    except stripe.error.StripeError as e:
-        return Response({"error": f"Stripe API error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        return Response({"error": f"Error validating Stripe key: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    # Create or update company
-    company_id = request.data.get("company_id")
-    category = request.data.get("category", "saas")
-    show_in_leaderboard = request.data.get("show_in_leaderboard", True)
-    is_anonymous = request.data.get("is_anonymous", False)
-    description = request.data.get("description", "")
-    website = request.data.get("website", "")
-    twitter_handle = request.data.get("twitter_handle", "")
-    
-    if company_id:
-        company = Company.objects.filter(id=company_id).first()
-        if not company:
-            return Response({"error": "Invalid company"}, status=status.HTTP_400_BAD_REQUEST)
-    else:
-        company = Company.objects.create(
-            name=company_name,
-            founder_name=request.user.username,
-            category=category,
-            show_in_leaderboard=show_in_leaderboard,
-            is_anonymous=is_anonymous,
-            added_by=request.user,
-            description=description,
-            website=website,
-            twitter_handle=twitter_handle
-        )
-        
-        # Handle logo upload
-        if 'logo' in request.FILES:
-            company.logo = request.FILES['logo']
-            company.save()
-
-    # Save integration key
-    IntegrationKey.objects.update_or_create(
-        company=company,
-        provider="stripe",
-        defaults={
-            "api_key": api_key,
-            "added_by": request.user
-        }
-    )
-    
-    # Update company with verified revenue
-    company.monthly_revenue = Decimal(str(monthly_revenue))
-    company.mom_growth = Decimal(str(round(growth, 2)))
-    company.is_verified = True
-    company.last_verified_at = datetime.now()
-    company.save()
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
 
-    return Response({
-        "message": "Stripe API key validated & revenue verified!",
-        "company_id": company.id,
-        "revenue": monthly_revenue,
-        "growth": round(growth, 2),
-        "verified": True
-    })
+from .serializers import (
+    CategoryStatsSerializer, CompanySerializer, render_json,
+)
+from .pagination import InvalidCursor, normalize_cursor, paginate_leaderboard, parse_page_size
+from .cache import cached_json_response
+from .conditional import public_json_response
+from .search import InvalidSearch, parse_filters, search, search_terms
+from . import category_stats, export, images, metrics
+from .projection import neighbor_cards, public_rows
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def razorpay_integration(request):
+@api_view(["GET"])
+def list_companies(request):
     """
-    Validate Razorpay API credentials and fetch real revenue data
+    List companies with optional category filtering.
+    Only shows companies that opted into the leaderboard.
+    Results are cursor-paginated: pass `next_cursor` back as `?cursor=`
+    to get the next page, and `?limit=` to change the page size.
     """
-    api_key = request.data.get("api_key")
-    api_secret = request.data.get("api_secret")
-    company_name = request.data.get("company_name", "New Startup")
+    # Get category filter from query params
+    category = request.query_params.get('category', None)
 
-    if not api_key or not api_secret:
-        return Response({"error": "Missing Razorpay API key/secret"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Validate Razorpay credentials and fetch revenue
+    # Base queryset - only companies that want to be shown
+    companies = Company.objects.filter(show_in_leaderboard=True)
+
+    # Apply category filter if provided
+    if category and category != 'all':
+        companies = companies.filter(category=category)
+
+    if category and len(category) > Company._meta.get_field('category').max_length:
+        return Response({"error": "Invalid category"}, status=status.HTTP_400_BAD_REQUEST)
+
+    cursor = request.query_params.get('cursor')
     try:
-        client = razorpay.Client(auth=(api_key, api_secret))
-        
-        # Test the credentials by fetching payments
-        # Calculate timestamp for last 30 days
-        thirty_days_ago = int((datetime.now() - timedelta(days=30)).timestamp())
-        
-        payments = client.payment.all({
-            'from': thirty_days_ago,
-            'to': int(datetime.now().timestamp()),
-            'count': 100
-        })
-        
-        # Calculate total revenue (Razorpay amounts are in paise)
-        total_revenue = sum(payment['amount'] for payment in payments['items'] if payment['status'] == 'captured') / 100
-        
-        # Fetch subscriptions for recurring revenue
-        try:
-            subscriptions = client.subscription.all({'count': 100})
-            mrr = sum(sub['plan_id'] for sub in subscriptions['items'] if sub['status'] == 'active') / 100
-        except:
-            mrr = 0
-        
-        monthly_revenue = mrr if mrr > 0 else total_revenue
-        
-        # Calculate growth
-        sixty_days_ago = int((datetime.now() - timedelta(days=60)).timestamp())
-        prev_payments = client.payment.all({
-            'from': sixty_days_ago,
-            'to': thirty_days_ago,
-            'count': 100
+        page_size = parse_page_size(request.query_params.get('limit'))
+        # Keyed on the decoded cursor, so clients can't mint cache entries
+        # with equivalent or oversized ones
+        cursor_key = normalize_cursor(cursor)
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def build_page():
+        # Order by revenue descending, one page at a time. Rows are the stored
+        # public records (see projection.py), served as they are.
+        rows, next_cursor = paginate_leaderboard(companies, cursor, page_size, rows_fn=public_rows)
+        return render_json({
+            "companies": rows,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
         })
-        prev_revenue = sum(payment['amount'] for payment in prev_payments['items'] if payment['status'] == 'captured') / 100
-        
-        if prev_revenue > 0:
-            growth = ((monthly_revenue - prev_revenue) / prev_revenue) * 100
-        else:
-            growth = 0
-            
-    except razorpay.errors.SignatureVerificationError:
-        return Response({"error": "Invalid Razorpay credentials"}, status=status.HTTP_401_UNAUTHORIZED)
-    except Exception as e:
-        return Response({"error": f"Error validating Razorpay credentials: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    # Create or update company
-    company_id = request.data.get("company_id")
-    category = request.data.get("category", "saas")
-    show_in_leaderboard = request.data.get("show_in_leaderboard", True)
-    is_anonymous = request.data.get("is_anonymous", False)
-    description = request.data.get("description", "")
-    website = request.data.get("website", "")
-    twitter_handle = request.data.get("twitter_handle", "")
-    
-    if company_id:
-        company = Company.objects.filter(id=company_id).first()
-        if not company:
-            return Response({"error": "Invalid company"}, status=status.HTTP_400_BAD_REQUEST)
-    else:
-        company = Company.objects.create(
-            name=company_name,
-            founder_name=request.user.username,
-            category=category,
-            show_in_leaderboard=show_in_leaderboard,
-            is_anonymous=is_anonymous,
-            added_by=request.user,
-            description=description,
-            website=website,
-            twitter_handle=twitter_handle
-        )
-        
-        # Handle logo upload
-        if 'logo' in request.FILES:
-            company.logo = request.FILES['logo']
-            company.save()
-
-
-    # Save integration key
-    IntegrationKey.objects.update_or_create(
-        company=company,
-        provider="razorpay",
-        defaults={
-            "api_key": api_key,
-            "api_secret": api_secret,
-            "added_by": request.user
-        }
+
+    return public_json_response(
+        request, f"companies:{category or 'all'}:{cursor_key}:{page_size}", build_page, 'companies'
     )
 
-    # Update company with verified revenue
-    company.monthly_revenue = Decimal(str(monthly_revenue))
-    company.mom_growth = Decimal(str(round(growth, 2)))
-    company.is_verified = True
-    company.last_verified_at = datetime.now()
-    company.save()
+@api_view(["GET"])
+def search_companies(request):
+    """
+    Full-text search over leaderboard companies, best matches first (by
+    revenue when `q` is empty). Filters: comma-separated `category` and
+    `country`, `verified=true|false`, `min_revenue`/`max_revenue`.
+    Page-numbered with `?page=` and `?limit=`; every response includes the
+    total and facet counts for category, country and is_verified. Each hit
+    carries its leaderboard `rank` and `category_rank`.
+    """
+    params = request.query_params
+    try:
+        filters = parse_filters(params)
+        page_size = parse_page_size(params.get('limit'))
+    except (InvalidSearch, InvalidCursor) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response({
-        "message": "Razorpay credentials validated & revenue verified!",
-        "company_id": company.id,
-        "revenue": monthly_revenue,
-        "growth": round(growth, 2),
-        "verified": True
-    })
+    query = params.get('q', '')
+    key = json.dumps([search_terms(query), filters, page_size], default=str, separators=(',', ':'))
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return cached_json_response(f"search:{digest}", lambda: render_json(search(query, filters, page_size)))
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def paypal_integration(request):
+@api_view(["GET"])
+def list_category_stats(request):
     """
-    Validate PayPal API credentials and fetch real revenue data
+    Leaderboard totals of every category: company count, verified count and
+    share, total and median MRR, and average month-over-month growth
     """
-    client_id = request.data.get("client_id")
-    client_secret = request.data.get("client_secret")
-    company_name = request.data.get("company_name", "New Startup")
-
-    if not client_id or not client_secret:
-        return Response({"error": "Missing PayPal client ID/secret"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Validate PayPal credentials and fetch revenue
-    try:
-        # Get access token
-        auth_response = requests.post(
-            'https://api-m.sandbox.paypal.com/v1/oauth2/token',  # Use sandbox for testing
-            headers={'Accept': 'application/json', 'Accept-Language': 'en_US'},
-            auth=(client_id, client_secret),
-            data={'grant_type': 'client_credentials'}
-        )
-        
-        if auth_response.status_code != 200:
-            return Response({"error": "Invalid PayPal credentials"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        access_token = auth_response.json()['access_token']
-        
-        # Fetch transactions from last 30 days
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        transactions_response = requests.get(
-            'https://api-m.sandbox.paypal.com/v1/reporting/transactions',
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            },
-            params={
-                'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                'end_date': end_date.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                'fields': 'all',
-                'page_size': 100
-            }
-        )
-        
-        if transactions_response.status_code == 200:
-            transactions = transactions_response.json()
-            total_revenue = sum(
-                float(txn['transaction_info']['transaction_amount']['value'])
-                for txn in transactions.get('transaction_details', [])
-                if txn['transaction_info']['transaction_status'] == 'S'  # Success
-            )
-        else:
-            total_revenue = 0
-        
-        monthly_revenue = total_revenue
-        
-        # Calculate growth (simplified)
-        prev_start = start_date - timedelta(days=30)
-        prev_transactions_response = requests.get(
-            'https://api-m.sandbox.paypal.com/v1/reporting/transactions',
-            headers={
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            },
-            params={
-                'start_date': prev_start.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                'end_date': start_date.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                'fields': 'all',
-                'page_size': 100
-            }
-        )
-        
-        if prev_transactions_response.status_code == 200:
-            prev_transactions = prev_transactions_response.json()
-            prev_revenue = sum(
-                float(txn['transaction_info']['transaction_amount']['value'])
-                for txn in prev_transactions.get('transaction_details', [])
-                if txn['transaction_info']['transaction_status'] == 'S'
-            )
-            
-            if prev_revenue > 0:
-                growth = ((monthly_revenue - prev_revenue) / prev_revenue) * 100
-            else:
-                growth = 0
-        else:
-            growth = 0
-            
-    except requests.exceptions.RequestException as e:
-        return Response({"error": f"PayPal API error: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        return Response({"error": f"Error validating PayPal credentials: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    # Create or update company
-    company_id = request.data.get("company_id")
-    category = request.data.get("category", "saas")
-    show_in_leaderboard = request.data.get("show_in_leaderboard", True)
-    is_anonymous = request.data.get("is_anonymous", False)
-    description = request.data.get("description", "")
-    website = request.data.get("website", "")
-    twitter_handle = request.data.get("twitter_handle", "")
-    
-    if company_id:
-        company = Company.objects.filter(id=company_id).first()
-        if not company:
-            return Response({"error": "Invalid company"}, status=status.HTTP_400_BAD_REQUEST)
-    else:
-        company = Company.objects.create(
-            name=company_name,
-            founder_name=request.user.username,
-            category=category,
-            show_in_leaderboard=show_in_leaderboard,
-            is_anonymous=is_anonymous,
-            added_by=request.user,
-            description=description,
-            website=website,
-            twitter_handle=twitter_handle
-        )
-        
-        # Handle logo upload
-        if 'logo' in request.FILES:
-            company.logo = request.FILES['logo']
-            company.save()
-
-    # Save integration key
-    IntegrationKey.objects.update_or_create(
-        company=company,
-        provider="paypal",
-        defaults={
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "added_by": request.user
-        }
+    return public_json_response(
+        request, "category_stats",
+        lambda: {"categories": CategoryStatsSerializer(category_stats.all_stats(), many=True).data},
+        'companies',
     )
 
-    # Update company with verified revenue
-    company.monthly_revenue = Decimal(str(monthly_revenue))
-    company.mom_growth = Decimal(str(round(growth, 2)))
-    company.is_verified = True
-    company.last_verified_at = datetime.now()
-    company.save()
+def _export_response(rows, columns, fmt, filename):
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": "Format must be csv or jsonl"}, status=404)
+    response = StreamingHttpResponse(export.stream(rows, columns, fmt), content_type=export.FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
 
-    return Response({
-        "message": "PayPal credentials validated & revenue verified!",
-        "company_id": company.id,
-        "revenue": monthly_revenue,
-        "growth": round(growth, 2),
-        "verified": True
-    })
+# The exports are plain Django views: DRF's content negotiation would turn
+# away clients asking for text/csv with a 406
 
-from .serializers import CompanySerializer
+@require_GET
+def export_companies(request, fmt):
+    """
+    Every leaderboard company as one CSV or JSON Lines download, streamed
+    (anonymous companies masked). Optional ?category=.
+    """
+    return _export_response(export.company_rows(request.GET.get("category")), export.COMPANY_COLUMNS, fmt, "companies")
 
-@api_view(["GET"])
-def list_companies(request):
+@require_GET
+def export_mrr_history(request, fmt):
     """
-    List companies with optional category filtering.
-    Only shows companies that opted into the leaderboard.
+    MRR rollups of every leaderboard company as one CSV or JSON Lines
+    download, streamed. ?granularity=day|week|month (default month), optional ?category=.
     """
-    # Get category filter from query params
-    category = request.query_params.get('category', None)
-    
-    # Base queryset - only companies that want to be shown
-    companies = Company.objects.filter(show_in_leaderboard=True)
-    
-    # Apply category filter if provided
-    if category and category != 'all':
-        companies = companies.filter(category=category)
-    
-    # Order by revenue descending
-    companies = companies.order_by("-monthly_revenue")
-    
-    serializer = CompanySerializer(companies, many=True)
-    return Response(serializer.data)
+    granularity = request.GET.get("granularity", "month")
+    if granularity not in GRANULARITIES:
+        return JsonResponse({"error": "granularity must be day, week or month"}, status=400)
+    rows = export.history_rows(granularity, request.GET.get("category"))
+    return _export_response(rows, export.HISTORY_COLUMNS, fmt, f"mrr-history-{granularity}")
 
 @api_view(["GET"])
-def get_company_details(request, company_id):
+def get_company_details(request, company_id=None, slug=None):
     """
-    Get details for a single company.
+    Get details for a single company by id or slug, with its leaderboard rank
+    and the companies ranked around it.
     Visible if show_in_leaderboard is True OR if request.user is the owner.
+    The owner gets every field; everyone else the public record, which hides
+    who is behind an anonymous company.
+    Supports If-None-Match/If-Modified-Since: repeat views return 304 with no body.
     """
+    lookup = {'id': company_id} if company_id is not None else {'slug': slug}
     try:
-        company = Company.objects.get(id=company_id)
+        company = Company.objects.select_related('leaderboard_rank', 'logo_asset', 'founder_photo_asset').get(**lookup)
         
         # Check visibility
         is_owner = False
         if request.user.is_authenticated:
-            if company.added_by == request.user:
+            if company.added_by_id == request.user.id:
                 is_owner = True
-            elif company.added_by is None and company.founder_name == request.user.username:
+            elif company.added_by_id is None and company.founder_name == request.user.username:
                 is_owner = True
         
         if not company.show_in_leaderboard and not is_owner:
             return Response({"error": "Company not found or private"}, status=status.HTTP_404_NOT_FOUND)
-            
-        serializer = CompanySerializer(company)
-        return Response(serializer.data)
+
+        def build():
+            data = CompanySerializer(company).data if is_owner else dict(company.public_data)
+            data['rank'] = rank_summary(company)
+            data['neighbors'] = neighbor_cards(neighbors(company))
+            return data
+
+        # Rank and neighbors change whenever any company changes, so the
+        # whole companies scope is what the response depends on
+        response = public_json_response(
+            request, f"company:{company.pk}:{'owner' if is_owner else 'public'}", build, 'companies',
+            public=company.show_in_leaderboard and not is_owner,
+        )
+        # The same URL answers owners with more fields
+        patch_vary_headers(response, ('Authorization',))
+        return response
         
     except Company.DoesNotExist:
         return Response({"error": "Company not found"}, status=status.HTTP_404_NOT_FOUND)
 
 @api_view(["GET"])
 def company_mrr(request, company_id):
-    # TODO: Implement MRR history if RevenueRecord is restored
-    return Response({"company_id": company_id, "mrr_history": []})
+    """
+    MRR history from the revenue rollups.
+    ?granularity=day|week|month (default month), optional ?from= and ?to= dates (YYYY-MM-DD)
+    """
+    granularity = request.GET.get("granularity", "month")
+    if granularity not in GRANULARITIES:
+        return Response({"error": "granularity must be day, week or month"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start = date.fromisoformat(request.GET["from"]) if request.GET.get("from") else None
+        end = date.fromisoformat(request.GET["to"]) if request.GET.get("to") else None
+    except ValueError:
+        return Response({"error": "Dates must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+    if not Company.objects.filter(id=company_id).exists():
+        return Response({"error": "Company not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        "company_id": company_id,
+        "granularity": granularity,
+        "mrr_history": [
+            {"period": period.isoformat(), "mrr": str(mrr), "min": str(mrr_min), "max": str(mrr_max)}
+            for period, mrr, mrr_min, mrr_max in history(company_id, granularity, start, end)
+        ],
+    })
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def add_revenue(request):
-    # TODO: Implement revenue record if RevenueRecord is restored
-    return Response({"message": "Revenue added", "record_id": None})
+    """
+    Record a self-reported MRR figure in the company's history. It is kept as
+    unverified and changes neither the leaderboard revenue nor the MRR charts.
+    """
+    company = Company.objects.filter(id=request.data.get("company_id"), added_by=request.user).first()
+    if not company:
+        return Response({"error": "Company not found or unauthorized"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        mrr = Decimal(str(request.data.get("mrr")))
+    except ArithmeticError:
+        mrr = None
+    if mrr is None or not mrr.is_finite() or not 0 <= mrr < 10 ** 13:
+        return Response({"error": "mrr must be a non-negative number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    snapshot = record_revenue(company, mrr, "manual", added_by=request.user, verified=False)
+    return Response({"message": "Revenue added", "record_id": snapshot.id})
 
 @api_view(["PUT", "PATCH"])
 @permission_classes([IsAuthenticated])
@@ -476,121 +256,18 @@ def update_company(request, company_id):
     if 'founder_name' in request.data:
         company.founder_name = request.data['founder_name']
     
-    # Handle logo upload
-    if 'logo' in request.FILES:
-        company.logo = request.FILES['logo']
-    
-    # Handle founder photo upload
-    if 'founder_photo' in request.FILES:
-        company.founder_photo = request.FILES['founder_photo']
+    # Handle logo and founder photo uploads (thumbnails are rendered after the response)
+    try:
+        for field in ('logo', 'founder_photo'):
+            if field in request.FILES:
+                images.attach(company, field, request.FILES[field])
+    except images.InvalidImage as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     company.save()
     serializer = CompanySerializer(company)
     return Response(serializer.data)
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def refresh_api_key(request, company_id):
-    """
-    Refresh API key and re-verify revenue.
-    """
-    try:
-        company = Company.objects.get(id=company_id)
-        if company.added_by != request.user:
-            if company.added_by is None and company.founder_name == request.user.username:
-                company.added_by = request.user
-                company.save()
-            else:
-                return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
-    except Company.DoesNotExist:
-        return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
-    
-    # Get integration key
-    integration = IntegrationKey.objects.filter(company=company).first()
-    if not integration:
-        return Response({"error": "No integration found"}, status=status.HTTP_404_NOT_FOUND)
-    
-    # Get new API key from request
-    new_api_key = request.data.get('api_key')
-    if not new_api_key:
-        return Response({"error": "API key required"}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Update the integration key
-    integration.api_key = new_api_key
-    if 'api_secret' in request.data:
-        integration.api_secret = request.data['api_secret']
-    if 'client_id' in request.data:
-        integration.client_id = request.data['client_id']
-    if 'client_secret' in request.data:
-        integration.client_secret = request.data['client_secret']
-    integration.save()
-    
-    # Re-verify revenue based on provider
-    try:
-        if integration.provider == 'stripe':
-            stripe.api_key = new_api_key
-            thirty_days_ago = int((datetime.now() - timedelta(days=30)).timestamp())
-            charges = stripe.Charge.list(created={"gte": thirty_days_ago}, limit=100)
-            total_revenue = sum(charge.amount for charge in charges.data if charge.paid) / 100
-            subscriptions = stripe.Subscription.list(status='active', limit=100)
-            mrr = sum(sub.plan.amount for sub in subscriptions.data if hasattr(sub, 'plan')) / 100
-            monthly_revenue = mrr if mrr > 0 else total_revenue
-            
-        elif integration.provider == 'razorpay':
-            client = razorpay.Client(auth=(new_api_key, integration.api_secret))
-            thirty_days_ago = int((datetime.now() - timedelta(days=30)).timestamp())
-            payments = client.payment.all({'from': thirty_days_ago, 'to': int(datetime.now().timestamp()), 'count': 100})
-            monthly_revenue = sum(payment['amount'] for payment in payments['items'] if payment['status'] == 'captured') / 100
-            
-        elif integration.provider == 'paypal':
-            # PayPal refresh logic
-            auth_response = requests.post(
-                'https://api-m.sandbox.paypal.com/v1/oauth2/token',
-                headers={'Accept': 'application/json'},
-                auth=(integration.client_id, integration.client_secret),
-                data={'grant_type': 'client_credentials'}
-            )
-            if auth_response.status_code == 200:
-                access_token = auth_response.json()['access_token']
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=30)
-                transactions_response = requests.get(
-                    'https://api-m.sandbox.paypal.com/v1/reporting/transactions',
-                    headers={'Authorization': f'Bearer {access_token}'},
-                    params={
-                        'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                        'end_date': end_date.strftime('%Y-%m-%dT%H:%M:%S-0700'),
-                        'page_size': 100
-                    }
-                )
-                if transactions_response.status_code == 200:
-                    transactions = transactions_response.json()
-                    monthly_revenue = sum(
-                        float(txn['transaction_info']['transaction_amount']['value'])
-                        for txn in transactions.get('transaction_details', [])
-                        if txn['transaction_info']['transaction_status'] == 'S'
-                    )
-                else:
-                    monthly_revenue = 0
-            else:
-                return Response({"error": "Invalid PayPal credentials"}, status=status.HTTP_401_UNAUTHORIZED)
-        else:
-            return Response({"error": "Unknown provider"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Update company revenue
-        company.monthly_revenue = Decimal(str(monthly_revenue))
-        company.last_verified_at = datetime.now()
-        company.save()
-        
-        return Response({
-            "message": "Revenue refreshed successfully",
-            "revenue": monthly_revenue,
-            "last_verified_at": company.last_verified_at
-        })
-        
-    except Exception as e:
-        return Response({"error": f"Failed to refresh revenue: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_company(request, company_id):
@@ -612,55 +289,116 @@ def delete_company(request, company_id):
     return Response({"message": "Company deleted successfully"}, status=status.HTTP_200_OK)
 
 
+def request_metrics(request):
+    """
+    Per-view request counts and timings of this worker process, in the
+    Prometheus text format. Open to staff (admin session) and to scrapers
+    sending `Authorization: Bearer <REQUEST_METRICS['TOKEN']>`. A plain
+    Django view: DRF would try to read that token as a JWT.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    token_ok = bool(metrics.TOKEN) and hmac.compare_digest(header.encode(), f"Bearer {metrics.TOKEN}".encode())
+    if not (token_ok or request.user.is_staff):
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    response = HttpResponse(metrics.render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+    response["Cache-Control"] = "no-store"
+    return response
+
+
 # -------------------------------------------------------------------------
 # ADVERTISEMENT SYSTEM
 # -------------------------------------------------------------------------
+from django.db import transaction
+
+from .booking import SlotUnavailable, UnknownSlot, book_ad as book_ad_slot
 from .models import Advertisement
+from .notifications import send_ad_confirmation_email
 from .serializers import AdvertisementSerializer
 
+AD_SLOT_PRICE = 5000  # INR per week, shown on free slots
+MAX_SLOT_RANGE = 366  # Days
+
 @api_view(["GET"])
 def get_ad_slots(request):
     """
     Get status of all ad slots for a specific date (default: today).
+
+    With ?from=YYYY-MM-DD&to=YYYY-MM-DD, also return a slot-by-day occupancy
+    matrix (the booked ad's id, or null, for each day) and each slot's next
+    free day in that range, so the booking UI needs a single request.
     """
+    if 'from' in request.query_params or 'to' in request.query_params:
+        try:
+            start = datetime.strptime(request.query_params.get('from', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(request.query_params.get('to', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({"error": "Invalid date format YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= (end - start).days < MAX_SLOT_RANGE:
+            return Response(
+                {"error": f"'to' must be on or after 'from' and at most {MAX_SLOT_RANGE} days later"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return public_json_response(
+            request, f"ad_slots:{start.isoformat()}:{end.isoformat()}", lambda: _ad_slot_matrix(start, end), 'ads'
+        )
+
     date_str = request.query_params.get('date')
+    as_of = None
     if date_str:
         try:
             target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             return Response({"error": "Invalid date format YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
     else:
-        target_date = datetime.now().date()
-        
-    slots = [
-        'left_1', 'left_2', 'left_3', 'left_4', 'left_5',
-        'right_1', 'right_2', 'right_3', 'right_4', 'right_5'
-    ]
-    
-    result = {}
-    
-    for slot in slots:
-        # Find active ad for this slot and date
-        active_ad = Advertisement.objects.filter(
-            slot_id=slot,
-            start_date__lte=target_date,
-            end_date__gte=target_date,
-            is_active=True
-        ).first()
+        target_date = as_of = datetime.now().date()
         
-        if active_ad:
-            result[slot] = {
-                "status": "booked",
-                "ad": AdvertisementSerializer(active_ad).data
-            }
-        else:
-            # Check availability for advance booking (optional enhancement)
-            result[slot] = {
-                "status": "available",
-                "price": 5000 # Example price INR
-            }
-            
-    return Response(result)
+    return public_json_response(
+        request, f"ad_slots:{target_date.isoformat()}", lambda: _ad_slots_for(target_date), 'ads', as_of=as_of
+    )
+
+def _active_ads(start, end):
+    """All active ads overlapping [start, end] (inclusive), in one query"""
+    return list(
+        Advertisement.objects.filter(is_active=True, start_date__lte=end, end_date__gte=start)
+        .select_related('image_asset').order_by('id')
+    )
+
+def _slot_status(ad, serialized):
+    if ad:
+        return {"status": "booked", "ad": serialized[ad.id]}
+    return {"status": "available", "price": AD_SLOT_PRICE}
+
+def _ad_slots_for(target_date):
+    ads = _active_ads(target_date, target_date)
+    serialized = {ad['id']: ad for ad in AdvertisementSerializer(ads, many=True).data}
+    booked = {}
+    for ad in ads:
+        booked.setdefault(ad.slot_id, ad)  # Lowest id wins if bookings overlap
+    return {slot: _slot_status(booked.get(slot), serialized) for slot, _ in Advertisement.SLOT_CHOICES}
+
+def _ad_slot_matrix(start, end):
+    ads = _active_ads(start, end)
+    serialized = {ad['id']: ad for ad in AdvertisementSerializer(ads, many=True).data}
+    days = (end - start).days + 1
+    slots = {}
+    for slot, _ in Advertisement.SLOT_CHOICES:
+        slot_ads = [ad for ad in ads if ad.slot_id == slot]
+        occupancy = [None] * days
+        for ad in reversed(slot_ads):  # Lowest id wins if bookings overlap
+            first = max(ad.start_date, start)
+            last = min(ad.end_date, end)
+            for offset in range((first - start).days, (last - start).days + 1):
+                occupancy[offset] = ad.id
+        current = next((ad for ad in slot_ads if ad.id == occupancy[0]), None)
+        free = next((offset for offset, ad_id in enumerate(occupancy) if ad_id is None), None)
+        slots[slot] = {
+            **_slot_status(current, serialized),
+            "days": occupancy,
+            "next_available": (start + timedelta(days=free)).isoformat() if free is not None else None,
+        }
+    return {"from": start.isoformat(), "to": end.isoformat(), "slots": slots}
 
 @api_view(["POST"])
 def get_price_estimate(request):
@@ -676,6 +414,38 @@ def get_price_estimate(request):
     
     return Response(price_info)
 
+MAX_PRICE_DURATIONS = 12
+MAX_PRICE_STARTS = 31
+
+@api_view(["GET"])
+def get_price_grid(request):
+    """
+    Prices for all ad slots at once: ?weeks=1,2,4,8 (durations) and
+    ?start=YYYY-MM-DD,... (start dates, default today). Served from the
+    precomputed slot demand, so the booking form can price every option
+    without another request.
+    """
+    try:
+        durations = sorted({int(weeks) for weeks in request.query_params.get('weeks', '1,2,4,8').split(',')})
+        starts = sorted({
+            datetime.strptime(start, '%Y-%m-%d').date()
+            for start in request.query_params.get('start', datetime.now().date().isoformat()).split(',')
+        })
+    except ValueError:
+        return Response({"error": "weeks must be integers and start dates YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= durations[0] <= durations[-1] <= 52 or len(durations) > MAX_PRICE_DURATIONS:
+        return Response(
+            {"error": f"Up to {MAX_PRICE_DURATIONS} durations between 1 and 52 weeks"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(starts) > MAX_PRICE_STARTS:
+        return Response({"error": f"Up to {MAX_PRICE_STARTS} start dates"}, status=status.HTTP_400_BAD_REQUEST)
+
+    from .pricing import price_grid
+    today = datetime.now().date()
+    key = f"ad_prices:{today.isoformat()}:{','.join(map(str, durations))}:{','.join(map(date.isoformat, starts))}"
+    return cached_json_response(key, lambda: price_grid(durations, starts, today))
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def book_ad(request):
@@ -708,67 +478,44 @@ def book_ad(request):
     if start_date < datetime.now().date() or end_date < start_date:
         return Response({"error": "Invalid date range"}, status=status.HTTP_400_BAD_REQUEST)
         
-    # Check overlapping
-    overlap = Advertisement.objects.filter(
-        slot_id=slot_id,
-        is_active=True,
-        start_date__lte=end_date,
-        end_date__gte=start_date
-    ).exists()
-    
-    if overlap:
-        return Response({"error": "Slot already booked for these dates"}, status=status.HTTP_409_CONFLICT)
-        
-    # Create Ad
     payment_id = request.data.get('payment_id')
     amount_paid = request.data.get('amount_paid', 0)
     
-    # Build ad data manually
-    ad_data = {
-        'title': request.data.get('title'),
-        'description': request.data.get('description', ''),
-        'target_url': request.data.get('target_url'),
-        'slot_id': slot_id,
-        'start_date': start_date,
-        'end_date': end_date,
-        'is_active': True,
-    }
-    
-    print("ad_data to create:", ad_data)
+    # Store the image first so a bad upload doesn't leave a booking behind
+    image = {}
+    if 'image' in request.FILES:
+        try:
+            asset = images.store(request.FILES['image'], images.FIELD_PRESETS['image'])
+        except images.InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        image = {'image': asset.original, 'image_asset': asset}
     
-    # Create advertisement directly
     try:
-        ad = Advertisement.objects.create(
-            owner=request.user,
-            title=ad_data['title'],
-            description=ad_data['description'],
-            target_url=ad_data['target_url'],
-            slot_id=ad_data['slot_id'],
-            start_date=ad_data['start_date'],
-            end_date=ad_data['end_date'],
-            payment_id=payment_id,
-            amount_paid=amount_paid,
-            is_active=True
-        )
-        
-        # Handle image if present
-        if 'image' in request.FILES:
-            ad.image = request.FILES['image']
-            ad.save()
-        
-        # Send confirmation email
-        try:
-            from .notifications import send_ad_confirmation_email
+        # The booking and its confirmation email (sent later by `manage.py
+        # send_notifications`) commit together or not at all
+        with transaction.atomic():
+            # Checks for overlapping bookings and creates the ad atomically
+            ad = book_ad_slot(
+                request.user,
+                slot_id,
+                start_date,
+                end_date,
+                title=request.data.get('title'),
+                description=request.data.get('description', ''),
+                target_url=request.data.get('target_url'),
+                payment_id=payment_id,
+                amount_paid=amount_paid,
+                **image,
+            )
             send_ad_confirmation_email(ad)
-            ad.confirmation_email_sent = True
-            ad.save(update_fields=['confirmation_email_sent'])
-        except Exception as email_error:
-            print(f"Email notification failed: {email_error}")
-            # Don't fail the booking if email fails
         
         print("Ad created successfully:", ad.id)
         serializer = AdvertisementSerializer(ad)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+    except UnknownSlot as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except SlotUnavailable as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         print("Ad creation error:", e)
         import traceback
@@ -1,11 +1,10 @@
 import os
 import django
-import random
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
-from revenue.models import Company
+from revenue import importing
 
 companies_data = [
     {
@@ -13,7 +12,7 @@ companies_data = [
         "founder_name": "@sh1",
         "monthly_revenue": 878595.86,
         "mom_growth": 0.0,
-        "category": "E-commerce",
+        "category": "ecommerce",
         "website": "https://gumroad.com"
     },
     {
@@ -21,7 +20,7 @@ companies_data = [
         "founder_name": "@greg_rog",
         "monthly_revenue": 82107.08,
         "mom_growth": 0.0,
-        "category": "SaaS",
+        "category": "saas",
         "website": "https://easy.tools"
     },
     {
@@ -29,7 +28,7 @@ companies_data = [
         "founder_name": "@rohangilkes",
         "monthly_revenue": 21772.98,
         "mom_growth": 8.0,
-        "category": "Marketplace",
+        "category": "ecommerce",
         "website": "https://maidsinblack.com"
     },
     {
@@ -37,7 +36,7 @@ companies_data = [
         "founder_name": "@laurent_vinc",
         "monthly_revenue": 19779.97,
         "mom_growth": 2.0,
-        "category": "Marketing",
+        "category": "agency",
         "website": "https://stackinfluence.com"
     },
     {
@@ -45,7 +44,7 @@ companies_data = [
         "founder_name": "@hawktrin",
         "monthly_revenue": 10277.11,
         "mom_growth": 22.0,
-        "category": "Health",
+        "category": "ecommerce",
         "website": "https://trimrx.com"
     },
     {
@@ -53,7 +52,7 @@ companies_data = [
         "founder_name": "@rom1trs",
         "monthly_revenue": 9565.03,
         "mom_growth": 29.0,
-        "category": "AI",
+        "category": "saas",
         "website": "https://arcads.ai"
     },
     {
@@ -61,17 +60,14 @@ companies_data = [
         "founder_name": "@basedgunnar",
         "monthly_revenue": 9016.41,
         "mom_growth": -1.0,
-        "category": "Infrastructure",
+        "category": "saas",
         "website": "https://hypeproxies.io"
     }
 ]
 
-for data in companies_data:
-    company, created = Company.objects.get_or_create(name=data['name'])
-    company.founder_name = data['founder_name']
-    company.monthly_revenue = data['monthly_revenue']
-    company.mom_growth = data['mom_growth']
-    company.category = data['category']
-    company.website = data['website']
-    company.save()
-    print(f"{'Created' if created else 'Updated'} {company.name}")
+written, skipped = importing.import_companies(
+    enumerate(companies_data, start=1),
+    on_error=lambda number, message: print(f"Skipped row {number}: {message}"),
+)
+importing.finish()
+print(f"Seeded {written} companies")
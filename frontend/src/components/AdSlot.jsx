@@ -1,5 +1,6 @@
 import { useState } from 'react';
 import { ExternalLink, Calendar, Plus } from 'lucide-react';
+import { thumbnailUrl } from '../images';
 
 export default function AdSlot({ slotId, status, adData, onBookClick, price }) {
     const isBooked = status === 'booked';
@@ -7,6 +8,7 @@ export default function AdSlot({ slotId, status, adData, onBookClick, price }) {
     // Dynamic Backend URL for images
     const apiBase = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
     const backendUrl = apiBase.replace('/api', '');
+    const image = adData && thumbnailUrl(adData.image_thumbnails, 640, adData.image);
 
     const handleAdClick = async (e) => {
         if (!isBooked || !adData) return;
@@ -42,9 +44,9 @@ export default function AdSlot({ slotId, status, adData, onBookClick, price }) {
                     onMouseLeave={(e) => e.currentTarget.style.transform = 'translateY(0)'}
                 >
                     <div style={{ position: 'relative', width: '100%', paddingTop: '56.25%' }}> {/* 16:9 Aspect Ratio */}
-                        {adData.image ? (
+                        {image ? (
                             <img
-                                src={adData.image.startsWith('http') ? adData.image : `${backendUrl}${adData.image}`}
+                                src={image.startsWith('http') ? image : `${backendUrl}${image}`}
                                 alt={adData.title}
                                 style={{ position: 'absolute', top: 0, left: 0, width: '100%', height: '100%', objectFit: 'cover' }}
                             />
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { X, Upload, Eye, Calendar as CalendarIcon } from 'lucide-react';
 
-export default function BookAdModal({ isOpen, onClose, slotId, onBook }) {
+export default function BookAdModal({ isOpen, onClose, slotId, nextAvailableDate, onBook }) {
     const [formData, setFormData] = useState({
         title: '',
         description: '',
@@ -13,60 +13,36 @@ export default function BookAdModal({ isOpen, onClose, slotId, onBook }) {
     const [imagePreview, setImagePreview] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
-    const [nextAvailableDate, setNextAvailableDate] = useState(null);
     const [showDatePicker, setShowDatePicker] = useState(false);
     const [priceInfo, setPriceInfo] = useState({ total_price: 5000, final_weekly_rate: 5000, applied_discounts: {} });
 
+    const [priceGrid, setPriceGrid] = useState(null);
+
     const PRICE_PER_WEEK = 5000; // Fallback
 
+    const startDate = formData.customStartDate || new Date().toISOString().split('T')[0];
+
     useEffect(() => {
-        // Fetch dynamic price
-        const fetchPrice = async () => {
+        // Fetch prices for every slot and duration at once; switching duration needs no request
+        const fetchPrices = async () => {
             const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
             try {
-                const res = await fetch(`${base}/revenue/ads/price/`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({
-                        slot_id: slotId,
-                        duration: formData.duration,
-                        start_date: formData.customStartDate || new Date().toISOString().split('T')[0]
-                    })
-                });
+                const res = await fetch(`${base}/revenue/ads/prices/?weeks=1,2,4,8&start=${startDate}`);
                 if (res.ok) {
-                    const data = await res.json();
-                    setPriceInfo(data);
+                    setPriceGrid(await res.json());
                 }
             } catch (err) { console.error(err); }
         };
 
-        if (isOpen) fetchPrice();
-    }, [formData.duration, formData.customStartDate, slotId, isOpen]);
-
-    const totalPrice = priceInfo.total_price;
+        if (isOpen) fetchPrices();
+    }, [startDate, isOpen]);
 
-    if (!isOpen) return null;
     useEffect(() => {
-        if (isOpen && slotId) {
-            fetchNextAvailableDate();
-        }
-    }, [isOpen, slotId]);
+        const price = priceGrid?.[slotId]?.prices?.[startDate]?.[formData.duration];
+        if (price) setPriceInfo(price);
+    }, [priceGrid, slotId, startDate, formData.duration]);
 
-    const fetchNextAvailableDate = async () => {
-        try {
-            const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
-            const res = await fetch(`${base}/revenue/ads/calendar/`);
-            if (res.ok) {
-                const calendar = await res.json();
-                const slotInfo = calendar[slotId];
-                if (slotInfo && slotInfo.next_available) {
-                    setNextAvailableDate(slotInfo.next_available);
-                }
-            }
-        } catch (err) {
-            console.error('Failed to fetch availability:', err);
-        }
-    };
+    const totalPrice = priceInfo.total_price;
 
     if (!isOpen) return null;
 
@@ -0,0 +1,9 @@
+// URL of the smallest WebP thumbnail at least `width` pixels wide (or the
+// largest there is). Falls back to the original upload while the backend is
+// still rendering thumbnails.
+export function thumbnailUrl(thumbnails, width, original) {
+  if (!thumbnails) return original;
+  const widths = Object.keys(thumbnails).map(Number).sort((a, b) => a - b);
+  const best = widths.find(w => w >= width) ?? widths[widths.length - 1];
+  return thumbnails[best]?.webp || original;
+}
@@ -3,6 +3,7 @@ import { useState, useEffect } from 'react';
 import { ArrowLeft, ExternalLink, Edit, Trash2, Code, Share2, HelpCircle, TrendingUp } from 'lucide-react';
 import './CompanyProfile.css';
 import EditCompanyModal from '../components/EditCompanyModal';
+import { thumbnailUrl } from '../images';
 
 export default function CompanyProfile() {
     const { id } = useParams();
@@ -26,7 +27,6 @@ export default function CompanyProfile() {
 
     useEffect(() => {
         fetchCompanyDetails();
-        fetchOtherCompanies();
     }, [id]);
 
     // Fetch current user info from backend
@@ -95,21 +95,19 @@ export default function CompanyProfile() {
         try {
             const token = localStorage.getItem('authToken');
             const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
-            const res = await fetch(`${base}/revenue/companies/`, {
+            // The leaderboard is paginated, so look the company up directly
+            const res = await fetch(`${base}/revenue/companies/${id}/`, {
                 headers: token ? { Authorization: `Bearer ${token}` } : {}
             });
 
             if (res.ok) {
-                const data = await res.json();
-                const list = Array.isArray(data) ? data : data.companies || [];
-
-                // Sort by revenue to calculate rank
-                const sorted = list.filter(c => c.show_in_leaderboard).sort((a, b) => Number(b.monthly_revenue) - Number(a.monthly_revenue));
-                const found = sorted.find(c => c.id === parseInt(id));
+                const found = await res.json();
 
                 if (found) {
-                    const rank = sorted.findIndex(c => c.id === parseInt(id)) + 1;
-                    setCompanyRank(rank);
+                    setCompanyRank(found.rank ? found.rank.overall : null);
+                    // Companies ranked around this one come with the profile
+                    setOtherCompanies((found.neighbors || []).slice(0, 3)
+                        .map(c => ({ ...c, logo: thumbnailUrl(c.logo_thumbnails, 96, c.logo) })));
 
                     setCompany({
                         ...found,
@@ -120,7 +118,8 @@ export default function CompanyProfile() {
                         description: found.description || '',
                         website: found.website || '',
                         twitter_handle: found.twitter_handle || '',
-                        logo: found.logo || null,
+                        logo: thumbnailUrl(found.logo_thumbnails, 160, found.logo) || null,
+                        founder_photo: thumbnailUrl(found.founder_photo_thumbnails, 80, found.founder_photo) || null,
                         founding_date: found.founding_date || null,
                         country: found.country || null,
                         follower_count: found.follower_count || 0,
@@ -172,25 +171,6 @@ export default function CompanyProfile() {
         }
     };
 
-    const fetchOtherCompanies = async () => {
-        try {
-            const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
-            const res = await fetch(`${base}/revenue/companies/`);
-            if (res.ok) {
-                const data = await res.json();
-                const list = Array.isArray(data) ? data : data.companies || [];
-                // Get random 3 companies excluding current one
-                const others = list
-                    .filter(c => c.id !== parseInt(id) && c.show_in_leaderboard)
-                    .sort(() => 0.5 - Math.random())
-                    .slice(0, 3);
-                setOtherCompanies(others);
-            }
-        } catch (err) {
-            console.error('Failed to fetch other companies:', err);
-        }
-    };
-
     const handleUpdate = (updatedCompany) => {
         console.log('📝 handleUpdate called with:', updatedCompany);
 
@@ -203,7 +183,8 @@ export default function CompanyProfile() {
             description: updatedCompany.description || '',
             website: updatedCompany.website || '',
             twitter_handle: updatedCompany.twitter_handle || '',
-            logo: updatedCompany.logo || null,
+            logo: thumbnailUrl(updatedCompany.logo_thumbnails, 160, updatedCompany.logo) || null,
+            founder_photo: thumbnailUrl(updatedCompany.founder_photo_thumbnails, 80, updatedCompany.founder_photo) || null,
             founding_date: updatedCompany.founding_date || null,
             country: updatedCompany.country || null,
             follower_count: updatedCompany.follower_count || 0,
@@ -4,6 +4,40 @@ import { Search, Plus, TrendingUp, Star, Info, Menu, X, Shield, ArrowUp, ArrowDo
 import './Leaderboard.css';
 import AdSlot from '../components/AdSlot';
 import BookAdModal from '../components/BookAdModal';
+import { thumbnailUrl } from '../images';
+
+// Today's slot status plus the next 90 days of bookings, in one request
+const adSlotsUrl = (base) => {
+  const from = new Date();
+  const to = new Date(from.getTime() + 89 * 24 * 60 * 60 * 1000);
+  const day = (d) => d.toISOString().split('T')[0];
+  return `${base}/revenue/ads/slots/?from=${day(from)}&to=${day(to)}`;
+};
+
+const normalizeCompany = (c, i) => ({
+  id: c.id || i,
+  name: c.is_anonymous ? 'Anonymous Company' : (c.name || c.company_name || 'Unknown'),
+  tagline: c.category || 'SaaS',
+  founder: c.is_anonymous ? 'Anonymous' : (c.founder_name || '@founder'),
+  revenue: Number(c.monthly_revenue) || 0,
+  growth: Number(c.mom_growth) || 0,
+  isVerified: c.is_verified || false,
+  isAnonymous: c.is_anonymous || false,
+  logo: thumbnailUrl(c.logo_thumbnails, 80, c.logo) || null  // 40px avatar, sharp on 2x screens
+});
+
+const rankBadge = (rank) => (rank === 1 ? '🏆' : rank === 2 ? '🥈' : rank === 3 ? '🥉' : null);
+
+const withRanks = (list) => list
+  .map((c, i) => ({ ...c, rank: i + 1, badge: rankBadge(i + 1) }));
+
+// Search hits come best match first, so they show the leaderboard rank the
+// server sends with each one rather than their position
+const withLeaderboardRanks = (list, inCategory) => list
+  .map((c, i) => {
+    const rank = inCategory ? c.category_rank : c.rank;
+    return { ...normalizeCompany(c, i), rank, badge: rankBadge(rank) };
+  });
 
 export default function TrustMRRLeaderboard() {
   const [isLoggedIn, setIsLoggedIn] = useState(false);
@@ -13,8 +47,10 @@ export default function TrustMRRLeaderboard() {
   const [signupForm, setSignupForm] = useState({ username: '', email: '', password: '' });
   const [statusMessage, setStatusMessage] = useState({ type: '', text: '' });
   const [companies, setCompanies] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const [selectedFilter, setSelectedFilter] = useState('Revenue');
   const [timeFilter, setTimeFilter] = useState('All time');
 
@@ -41,10 +77,10 @@ export default function TrustMRRLeaderboard() {
     const fetchAdSlots = async () => {
       try {
         const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
-        const res = await fetch(`${base}/revenue/ads/slots/`);
+        const res = await fetch(adSlotsUrl(base));
         if (res.ok) {
           const data = await res.json();
-          setAdSlots(data);
+          setAdSlots(data.slots);
         }
       } catch (err) {
         console.error("Ads fetch error", err);
@@ -87,8 +123,8 @@ export default function TrustMRRLeaderboard() {
 
     showMessage('success', 'Ad booked successfully! It is now live.');
     // Refresh ads
-    const slotsRes = await fetch(`${base}/revenue/ads/slots/`);
-    if (slotsRes.ok) setAdSlots(await slotsRes.json());
+    const slotsRes = await fetch(adSlotsUrl(base));
+    if (slotsRes.ok) setAdSlots((await slotsRes.json()).slots);
   };
 
   useEffect(() => {
@@ -99,6 +135,37 @@ export default function TrustMRRLeaderboard() {
     fetchCompanies(token);
   }, []);
 
+  // Search runs on the server (ranked, over every company, not just the
+  // loaded pages); wait for a pause in typing before asking
+  useEffect(() => {
+    const q = searchTerm.trim();
+    if (!q) {
+      setSearchResults(null);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
+        const params = new URLSearchParams({ q });
+        if (selectedCategory !== 'all') params.set('category', selectedCategory);
+        const res = await fetch(`${base}/revenue/companies/search/?${params}`, { signal: controller.signal });
+        if (res.ok) {
+          const data = await res.json();
+          setSearchResults(withLeaderboardRanks(data.companies, selectedCategory !== 'all'));
+        }
+      } catch (err) {
+        if (err.name !== 'AbortError') console.error('Search failed', err);
+      }
+    }, 200);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm, selectedCategory]);
+
+  const visibleCompanies = searchResults || companies;
+
   const showMessage = (type, text) => {
     setStatusMessage({ type, text });
     setTimeout(() => setStatusMessage({ type: '', text: '' }), 4000);
@@ -154,13 +221,16 @@ export default function TrustMRRLeaderboard() {
     }
   };
 
-  const fetchCompanies = async (token, category = 'all') => {
+  const fetchCompanies = async (token, category = 'all', cursor = null) => {
     console.log('🔍 Fetching companies with category:', category);
-    setLoading(true);
+    if (!cursor) setLoading(true);
     try {
       const base = import.meta.env.VITE_API_BASE || 'http://localhost:8000/api';
-      const categoryParam = category && category !== 'all' ? `?category=${category}` : '';
-      const url = `${base}/revenue/companies/${categoryParam}`;
+      const params = new URLSearchParams();
+      if (category && category !== 'all') params.set('category', category);
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      const url = `${base}/revenue/companies/${query ? `?${query}` : ''}`;
       console.log('📡 API URL:', url);
 
       const res = await fetch(url, {
@@ -178,22 +248,13 @@ export default function TrustMRRLeaderboard() {
       console.log('📊 Number of companies received:', data.length);
 
       const list = Array.isArray(data) ? data : data.companies || [];
-      const normalized = list.map((c, i) => ({
-        id: c.id || i,
-        name: c.is_anonymous ? 'Anonymous Company' : (c.name || c.company_name || 'Unknown'),
-        tagline: c.category || 'SaaS',
-        founder: c.is_anonymous ? 'Anonymous' : (c.founder_name || '@founder'),
-        revenue: Number(c.monthly_revenue) || 0,
-        growth: Number(c.mom_growth) || 0,
-        isVerified: c.is_verified || false,
-        isAnonymous: c.is_anonymous || false,
-        logo: c.logo || null
-      })).sort((a, b) => b.revenue - a.revenue)
-        .map((c, i) => ({ ...c, rank: i + 1, badge: i === 0 ? '🏆' : i === 1 ? '🥈' : i === 2 ? '🥉' : null }));
+      setNextCursor(data.next_cursor || null);
+      const normalized = list.map(normalizeCompany);
 
       console.log('📋 Normalized companies:', normalized);
       console.log('🎯 Setting', normalized.length, 'companies to state');
-      setCompanies(normalized);
+      // Pages arrive already sorted by revenue; later pages append to the list
+      setCompanies(prev => withRanks(cursor ? [...prev, ...normalized] : normalized));
     } catch (err) {
       console.error('❌ Failed to fetch companies:', err);
     } finally {
@@ -509,12 +570,10 @@ export default function TrustMRRLeaderboard() {
           <div className="table-body">
             {loading ? (
               <div style={{ padding: '20px', textAlign: 'center', color: '#888' }}>Loading...</div>
-            ) : companies.length === 0 ? (
+            ) : visibleCompanies.length === 0 ? (
               <div style={{ padding: '20px', textAlign: 'center', color: '#888' }}>No companies found.</div>
             ) : (
-              companies
-                .filter(c => c.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                  c.founder.toLowerCase().includes(searchTerm.toLowerCase()))
+              visibleCompanies
                 .map((company) => (
                   <Link key={company.id} to={`/company/${company.id}`} className="table-row" style={{ textDecoration: 'none', color: 'inherit' }}>
                     <div className="rank">{company.badge || company.rank}</div>
@@ -553,6 +612,14 @@ export default function TrustMRRLeaderboard() {
                   </Link>
                 ))
             )}
+            {!loading && !searchResults && nextCursor && (
+              <button
+                onClick={() => fetchCompanies(localStorage.getItem('authToken'), selectedCategory, nextCursor)}
+                style={{ width: '100%', padding: '12px', background: 'transparent', border: '1px solid #333', color: '#ccc', cursor: 'pointer' }}
+              >
+                Load more
+              </button>
+            )}
           </div>
         </div>
 
@@ -969,6 +1036,7 @@ export default function TrustMRRLeaderboard() {
         isOpen={adBookingState.isOpen}
         onClose={() => setAdBookingState({ isOpen: false, slotId: null })}
         slotId={adBookingState.slotId}
+        nextAvailableDate={adSlots[adBookingState.slotId]?.next_available}
         onBook={handleAdBookingSubmit}
       />
 